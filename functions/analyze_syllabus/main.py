@@ -12,7 +12,7 @@ import os
 # Add parent directory to path for common module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from common.moodle_client import MoodleClient
+from common.clients import get_moodle_client
 from common.ai_service import AIService
 from common.config import Config
 
@@ -50,7 +50,7 @@ def analyze_syllabus(request: Request):
         
         # Initialize clients
         config = Config.from_env()
-        moodle = MoodleClient(api_url="https://moodle.example.com", token="mock-token")
+        moodle = get_moodle_client()
         ai_service = AIService()
         
         # 1. Fetch course details
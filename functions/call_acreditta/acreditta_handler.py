@@ -4,34 +4,90 @@ Manages communication with the Acreditta digital badge platform.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any
+import itertools
+from typing import Dict, Any, List, Optional, Sequence
 import logging
+import time
 import sys
 import os
 
 # Add parent directory to path for common module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from common import BadgeIssueRequest, BadgeIssueResponse
+from common import (
+    BadgeIssueRequest,
+    BadgeIssueResponse,
+    BadgeIssueResult,
+    RateLimiter,
+    TTLCache,
+    RetryPolicy,
+    CircuitBreaker,
+    CircuitOpenError,
+    idempotency_key,
+    parse_retry_after,
+)
 
 logger = logging.getLogger(__name__)
 
+# Statuses meaning Acreditta does not offer the batch endpoint
+BATCH_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+# Verification results are cached; "not found" for a shorter time since a
+# badge being issued right now will exist soon
+VERIFICATION_TTL_SECONDS = 300.0
+VERIFICATION_NEGATIVE_TTL_SECONDS = 60.0
+
+# The verification cache counters are logged every this many lookups
+VERIFICATION_METRICS_LOG_EVERY = int(os.environ.get("VERIFICATION_METRICS_LOG_EVERY", "100"))
+
 
 class AcredittaAPIHandler:
     """Handler for Acreditta API interactions."""
     
-    def __init__(self, api_url: str, api_key: str):
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        max_connections: int = 10,
+        batch_size: int = 100,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        verification_cache: Optional[Any] = None
+    ):
         """
         Initialize Acreditta API handler.
         
         Args:
             api_url: Base URL for Acreditta API
             api_key: API key for authentication
+            max_connections: Size of the keep-alive connection pool; bounds
+                the useful concurrency of issue_badges
+            batch_size: Badges per call to the batch endpoint (0 disables it)
+            retry_policy: Retries on 429/5xx and connection errors
+            circuit_breaker: Breaker shared by every call to Acreditta
+            verification_cache: Cache of verify_badge results, e.g. a
+                TTLCache (per instance, the default) or a FirestoreCache
+                (shared by every instance)
         """
         self.api_url = api_url.rstrip('/')
         self.api_key = api_key
+        self.batch_size = batch_size
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker("acreditta")
+        self.verification_cache = (
+            verification_cache if verification_cache is not None
+            else TTLCache(VERIFICATION_TTL_SECONDS)
+        )
+        self._verifications = itertools.count(1)
+        # None = not probed yet; set on the first bulk issuance
+        self.batch_supported: Optional[bool] = None if batch_size > 0 else False
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json',
@@ -50,11 +106,206 @@ class AcredittaAPIHandler:
             
         Raises:
             requests.HTTPError: If API request fails
+            CircuitOpenError: If Acreditta is failing and calls are suspended
         """
         endpoint = f"{self.api_url}/badges/issue"
         
-        # Prepare payload for Acreditta API
-        payload = {
+        logger.info(f"Calling Acreditta API: {endpoint}")
+        
+        try:
+            response = self._send(
+                "POST", endpoint,
+                json=self._issue_payload(request),
+                timeout=30,
+                key=self._idempotency_key(request)
+            )
+            response.raise_for_status()
+            return self._issue_response(response.json())
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Acreditta API error: {str(e)}")
+            raise
+    
+    def issue_badges(
+        self,
+        badge_requests: Sequence[BadgeIssueRequest],
+        max_workers: int = 8,
+        rate_limit: Optional[float] = None
+    ) -> List[BadgeIssueResult]:
+        """
+        Issue many badges at once.
+        
+        Uses Acreditta's batch endpoint when available; otherwise issues the
+        badges with concurrent single calls. A failure only affects its own
+        badge.
+        
+        Args:
+            badge_requests: Badges to issue
+            max_workers: Maximum concurrent calls to Acreditta
+            rate_limit: Maximum calls per second (None = unlimited)
+            
+        Returns:
+            One BadgeIssueResult per request, in the same order
+        """
+        results: List[Optional[BadgeIssueResult]] = [None] * len(badge_requests)
+        limiter = RateLimiter(rate_limit, burst=max_workers) if rate_limit else None
+        pending = list(range(len(badge_requests)))
+        
+        if self.batch_supported is not False and pending:
+            chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            pending = []
+            for chunk in chunks:
+                if self.batch_supported is False:
+                    pending.extend(chunk)
+                    continue
+                if limiter:
+                    limiter.acquire()
+                chunk_results = self._issue_batch([badge_requests[i] for i in chunk])
+                if chunk_results is None:
+                    pending.extend(chunk)
+                    continue
+                for i, result in zip(chunk, chunk_results):
+                    results[i] = result
+        
+        if pending:
+            def issue_one(i: int) -> None:
+                if limiter:
+                    limiter.acquire()
+                results[i] = self._issue_result(badge_requests[i])
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+                list(pool.map(issue_one, pending))
+        
+        failed = sum(1 for r in results if r.error)
+        logger.info(f"Bulk issuance finished: {len(results) - failed} issued, {failed} failed")
+        return results
+    
+    def _issue_result(self, request: BadgeIssueRequest) -> BadgeIssueResult:
+        """Issue one badge, capturing any error in the result."""
+        try:
+            response = self.issue_badge(request)
+            return BadgeIssueResult(student_id=request.student_id, rule_id=request.rule_id, response=response)
+        except Exception as e:
+            return BadgeIssueResult(student_id=request.student_id, rule_id=request.rule_id, error=str(e))
+    
+    def _issue_batch(self, badge_requests: List[BadgeIssueRequest]) -> Optional[List[BadgeIssueResult]]:
+        """
+        Issue a chunk of badges with one call to the batch endpoint.
+        
+        Returns:
+            Per-badge results, or None if the endpoint is not available (the
+            caller then falls back to single calls)
+        """
+        endpoint = f"{self.api_url}/badges/issue/batch"
+        payload = {"badges": [self._issue_payload(r) for r in badge_requests]}
+        
+        logger.info(f"Calling Acreditta API: {endpoint} ({len(badge_requests)} badges)")
+        
+        key = idempotency_key(*(b["idempotency_key"] for b in payload["badges"]))
+        
+        try:
+            response = self._send("POST", endpoint, json=payload, timeout=60, key=key)
+            if response.status_code in BATCH_UNSUPPORTED_STATUSES:
+                logger.info("Acreditta batch endpoint not available, using single calls")
+                self.batch_supported = False
+                return None
+            response.raise_for_status()
+            items = response.json().get("results", [])
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            logger.error(f"Acreditta batch API error: {str(e)}")
+            return [
+                BadgeIssueResult(student_id=r.student_id, rule_id=r.rule_id, error=str(e))
+                for r in badge_requests
+            ]
+        
+        self.batch_supported = True
+        results = []
+        for i, request in enumerate(badge_requests):
+            item = items[i] if i < len(items) else {"error": "Missing result in batch response"}
+            if item.get("error"):
+                results.append(BadgeIssueResult(
+                    student_id=request.student_id, rule_id=request.rule_id, error=str(item["error"])
+                ))
+            else:
+                results.append(BadgeIssueResult(
+                    student_id=request.student_id, rule_id=request.rule_id,
+                    response=self._issue_response(item)
+                ))
+        return results
+    
+    def _send(
+        self,
+        method: str,
+        url: str,
+        timeout: float,
+        key: Optional[str] = None,
+        **kwargs: Any
+    ) -> requests.Response:
+        """
+        Send a request through the circuit breaker, retrying transient failures.
+        
+        Connection errors, timeouts and retryable statuses (429/5xx) are
+        retried with jittered exponential backoff, honoring Retry-After.
+        A 429 means "slow down" rather than "down", so it does not count
+        towards opening the circuit.
+        
+        Args:
+            method: HTTP method
+            url: Full endpoint URL
+            timeout: Per-attempt timeout in seconds
+            key: Idempotency key, identical on every attempt
+            **kwargs: Passed through to requests
+            
+        Returns:
+            The last response; the caller checks its status
+            
+        Raises:
+            requests.RequestException: If every attempt failed to connect
+            CircuitOpenError: If Acreditta is failing and calls are suspended
+        """
+        headers = {"Idempotency-Key": key} if key else None
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            self.circuit_breaker.allow()
+            attempt += 1
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.circuit_breaker.record_failure()
+                if not policy.should_retry(attempt):
+                    raise
+                delay = policy.delay(attempt)
+                logger.warning(f"Acreditta call failed ({str(e)}), retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except Exception:
+                self.circuit_breaker.record_failure()
+                raise
+            
+            status = response.status_code
+            if status >= 500:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            if not policy.should_retry(attempt, status):
+                return response
+            
+            delay = policy.delay(attempt, parse_retry_after(response.headers.get("Retry-After")))
+            logger.warning(f"Acreditta returned {status}, retry {attempt} in {delay:.2f}s")
+            response.close()
+            time.sleep(delay)
+    
+    @staticmethod
+    def _idempotency_key(request: BadgeIssueRequest) -> str:
+        """Key identifying one badge award, so retries never issue it twice."""
+        return idempotency_key(request.student_id, request.rule_id, request.evaluation_id)
+    
+    @classmethod
+    def _issue_payload(cls, request: BadgeIssueRequest) -> Dict[str, Any]:
+        """Build the Acreditta payload for one badge."""
+        return {
+            "idempotency_key": cls._idempotency_key(request),
             "recipient": {
                 "identifier": request.student_id,
                 "type": "student_id"
@@ -71,45 +322,69 @@ class AcredittaAPIHandler:
             },
             "metadata": request.metadata or {}
         }
-        
-        logger.info(f"Calling Acreditta API: {endpoint}")
-        
-        try:
-            response = self.session.post(
-                endpoint,
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Map Acreditta response to our model
-            return BadgeIssueResponse(
-                badge_id=data.get("badge_id", data.get("id")),
-                badge_url=data.get("badge_url", data.get("url")),
-                issued_at=datetime.fromisoformat(data.get("issued_at", datetime.now().isoformat())),
-                status=data.get("status", "issued")
-            )
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Acreditta API error: {str(e)}")
-            raise
     
-    def verify_badge(self, badge_id: str) -> Dict[str, Any]:
+    @staticmethod
+    def _issue_response(data: Dict[str, Any]) -> BadgeIssueResponse:
+        """Map an Acreditta badge to our model."""
+        return BadgeIssueResponse(
+            badge_id=data.get("badge_id", data.get("id")),
+            badge_url=data.get("badge_url", data.get("url")),
+            issued_at=datetime.fromisoformat(data.get("issued_at", datetime.now().isoformat())),
+            status=data.get("status", "issued")
+        )
+    
+    def verify_badge(self, badge_id: str, refresh: bool = False) -> Dict[str, Any]:
         """
         Verify a badge's authenticity.
         
+        Results are cached for VERIFICATION_TTL_SECONDS, and unknown badges
+        for VERIFICATION_NEGATIVE_TTL_SECONDS. Revoking a badge through this
+        handler drops its cached result. The cache counters are logged every
+        VERIFICATION_METRICS_LOG_EVERY lookups.
+        
         Args:
             badge_id: Badge identifier
+            refresh: Ask Acreditta even if a cached result exists
             
         Returns:
-            Badge verification information
+            Badge verification information; {"badge_id": ..., "valid": False,
+            "status": "not_found"} if Acreditta does not know the badge
+        """
+        result = self.verification_cache.get_or_load(
+            badge_id,
+            lambda: self._fetch_verification(badge_id),
+            refresh=refresh,
+            ttl_seconds=lambda result: (
+                VERIFICATION_NEGATIVE_TTL_SECONDS if result.get("status") == "not_found"
+                else VERIFICATION_TTL_SECONDS
+            )
+        )
+        
+        if VERIFICATION_METRICS_LOG_EVERY > 0 and next(self._verifications) % VERIFICATION_METRICS_LOG_EVERY == 0:
+            logger.info(f"Verification cache: {self.verification_metrics()}")
+        return result
+    
+    def verification_metrics(self) -> Dict[str, Any]:
         """
+        Return hit/miss counters of the verification cache.
+        
+        The counters are this instance's lookups, also with the shared
+        Firestore backend; sum the logged values across instances for the
+        hit rate of the shared store.
+        """
+        return dict(
+            self.verification_cache.stats(),
+            backend=type(self.verification_cache).__name__
+        )
+    
+    def _fetch_verification(self, badge_id: str) -> Dict[str, Any]:
+        """Ask Acreditta to verify a badge (no caching)."""
         endpoint = f"{self.api_url}/badges/{badge_id}/verify"
         
         try:
-            response = self.session.get(endpoint, timeout=10)
+            response = self._send("GET", endpoint, timeout=10)
+            if response.status_code == 404:
+                return {"badge_id": badge_id, "valid": False, "status": "not_found"}
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -132,8 +407,12 @@ class AcredittaAPIHandler:
         payload = {"reason": reason}
         
         try:
-            response = self.session.post(endpoint, json=payload, timeout=10)
+            response = self._send(
+                "POST", endpoint, json=payload, timeout=10,
+                key=idempotency_key("revoke", badge_id)
+            )
             response.raise_for_status()
+            self.verification_cache.invalidate(badge_id)
             return True
         except requests.exceptions.RequestException as e:
             logger.error(f"Badge revocation error: {str(e)}")
@@ -8,6 +8,8 @@ from flask import Request, jsonify
 import logging
 import sys
 import os
+import requests
+from typing import Any, List, Optional, Tuple
 
 # Add parent directory to path for common module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -16,14 +18,89 @@ from common import (
     Config,
     BadgeIssueRequest,
     BadgeIssueResponse,
+    BadgeIssueResult,
+    CircuitOpenError,
+    FirestoreCache,
+    IssuanceDedupe,
+    TTLCache,
+    get_issuance_dedupe,
     get_secret,
+    get_or_create,
+    get_firestore_db,
 )
-from acreditta_handler import AcredittaAPIHandler
+from acreditta_handler import AcredittaAPIHandler, VERIFICATION_TTL_SECONDS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Acreditta responses that mean the API key is no longer valid
+AUTH_FAILURE_STATUSES = (401, 403)
+
+# Bulk issuance limits: badges per call, concurrent requests to Acreditta
+# and Acreditta calls per second (0 = unlimited)
+MAX_BATCH_SIZE = int(os.environ.get("ACREDITTA_MAX_BATCH_SIZE", "2000"))
+MAX_WORKERS = int(os.environ.get("ACREDITTA_MAX_WORKERS", "8"))
+RATE_LIMIT = float(os.environ.get("ACREDITTA_RATE_LIMIT", "0"))
+
+# Requests an instance serves at once (max_instance_request_concurrency).
+# Each one may hold an Acreditta connection, so the kept-alive pool must
+# cover them as well as the workers of a bulk call.
+FUNCTION_CONCURRENCY = int(os.environ.get("FUNCTION_CONCURRENCY", "1"))
+MAX_CONNECTIONS = int(os.environ.get(
+    "ACREDITTA_MAX_CONNECTIONS",
+    max(MAX_WORKERS, FUNCTION_CONCURRENCY)
+))
+
+# Where badge verification results are cached: "memory" (per instance) or
+# "firestore" (shared by every instance, in VERIFY_CACHE_COLLECTION)
+VERIFY_CACHE_BACKEND = os.environ.get("VERIFY_CACHE_BACKEND", "memory")
+VERIFY_CACHE_COLLECTION = os.environ.get("VERIFY_CACHE_COLLECTION", "cache_verificacion")
+
+
+def get_verification_cache():
+    """Get the shared badge verification cache for the configured backend."""
+    if VERIFY_CACHE_BACKEND == "firestore":
+        config = Config.from_env()
+        return get_or_create(
+            ("acreditta_verify_cache", "firestore", config.project_id, VERIFY_CACHE_COLLECTION),
+            lambda: FirestoreCache(
+                get_firestore_db(config.project_id).collection(VERIFY_CACHE_COLLECTION),
+                ttl_seconds=VERIFICATION_TTL_SECONDS
+            )
+        )
+    return get_or_create(
+        ("acreditta_verify_cache", "memory"),
+        lambda: TTLCache(VERIFICATION_TTL_SECONDS)
+    )
+
+
+def get_acreditta_handler(refresh_secret: bool = False) -> AcredittaAPIHandler:
+    """
+    Get the shared Acreditta handler for the current API key.
+    
+    Args:
+        refresh_secret: Re-read the API key from Secret Manager (e.g. after
+            an authentication failure caused by a rotated key)
+    
+    Returns:
+        AcredittaAPIHandler keeping its HTTP session warm across invocations
+    """
+    api_key = get_secret(
+        os.environ.get("ACREDITTA_SECRET_ID", "acreditta-api-key"),
+        refresh=refresh_secret
+    )
+    api_url = os.environ.get("ACREDITTA_API_URL", "https://api.acreditta.com/v1")
+    return get_or_create(
+        ("acreditta", api_url, api_key),
+        lambda: AcredittaAPIHandler(
+            api_url=api_url,
+            api_key=api_key,
+            max_connections=MAX_CONNECTIONS,
+            verification_cache=get_verification_cache()
+        )
+    )
+
 
 @functions_framework.http
 def call_acreditta(request: Request):
@@ -39,9 +116,12 @@ def call_acreditta(request: Request):
             - evaluation_id: str
             - score: float
             - rule_id: str
+        or, in batch mode, a list of such objects (either the body itself
+        or under a "badges" key).
     
     Returns:
-        JSON response with BadgeIssueResponse
+        JSON response with BadgeIssueResponse, or {"results": [...]} with one
+        BadgeIssueResult per input badge in batch mode
     """
     try:
         # Parse request
@@ -49,29 +129,147 @@ def call_acreditta(request: Request):
         if not request_json:
             return jsonify({"error": "Invalid JSON body"}), 400
         
+        if isinstance(request_json, list) or "badges" in request_json:
+            badges = request_json if isinstance(request_json, list) else request_json["badges"]
+            if not isinstance(badges, list):
+                return jsonify({"error": "Validation error: 'badges' must be a list"}), 400
+            if len(badges) > MAX_BATCH_SIZE:
+                return jsonify({"error": f"Validation error: batch exceeds {MAX_BATCH_SIZE} badges"}), 400
+            
+            logger.info(f"Issuing batch of {len(badges)} badges")
+            results = issue_batch(badges)
+            return jsonify({"results": [r.model_dump(mode="json") for r in results]}), 200
+        
         logger.info(f"Issuing badge for request: {request_json}")
         
         # Validate input using Pydantic
         badge_request = BadgeIssueRequest(**request_json)
         
-        # Get Acreditta API credentials from Secret Manager
-        config = Config.from_env()
-        api_key = get_secret(os.environ.get("ACREDITTA_SECRET_ID", "acreditta-api-key"))
-        api_url = os.environ.get("ACREDITTA_API_URL", "https://api.acreditta.com/v1")
-        
-        # Initialize Acreditta handler
-        acreditta = AcredittaAPIHandler(api_url=api_url, api_key=api_key)
-        
-        # Issue badge
-        badge_response = acreditta.issue_badge(badge_request)
+        badge_response = issue_badge(badge_request)
         
         logger.info(f"Badge issued successfully: {badge_response.badge_id}")
         
         return jsonify(badge_response.model_dump(mode="json")), 200
         
+    except CircuitOpenError as e:
+        logger.error(f"Acreditta unavailable: {str(e)}")
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(int(e.retry_after) + 1)}
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         return jsonify({"error": f"Validation error: {str(e)}"}), 400
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+def issue_badge(badge_request: BadgeIssueRequest) -> BadgeIssueResponse:
+    """
+    Issue one badge and settle its issuance claim.
+    
+    Args:
+        badge_request: Validated badge request
+    
+    Returns:
+        BadgeIssueResponse from Acreditta
+    
+    Raises:
+        CircuitOpenError: If Acreditta is considered unavailable
+        requests.RequestException: If the issuance failed
+    """
+    # Acreditta handler with the API key from Secret Manager (cached)
+    acreditta = get_acreditta_handler()
+    
+    # Issue badge, retrying once with a fresh key if it was rejected
+    try:
+        try:
+            badge_response = acreditta.issue_badge(badge_request)
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code not in AUTH_FAILURE_STATUSES:
+                raise
+            logger.warning("Acreditta rejected the API key, refreshing it from Secret Manager")
+            acreditta = get_acreditta_handler(refresh_secret=True)
+            badge_response = acreditta.issue_badge(badge_request)
+    except Exception:
+        settle_issuances([(badge_request, None)])
+        raise
+    settle_issuances([(badge_request, badge_response.badge_id)])
+    return badge_response
+
+
+def issue_batch(badges: List[Any]) -> List[BadgeIssueResult]:
+    """
+    Issue a batch of badges concurrently.
+    
+    Malformed entries and per-badge failures produce a BadgeIssueResult with
+    ``error`` set instead of failing the whole batch.
+    
+    Args:
+        badges: Raw badge request payloads
+    
+    Returns:
+        One BadgeIssueResult per input, in input order
+    """
+    results: List[BadgeIssueResult] = [None] * len(badges)
+    valid = []
+    for i, raw in enumerate(badges):
+        try:
+            valid.append((i, BadgeIssueRequest(**raw)))
+        except (TypeError, ValueError) as e:
+            raw = raw if isinstance(raw, dict) else {}
+            results[i] = BadgeIssueResult(
+                student_id=str(raw.get("student_id", "")),
+                rule_id=str(raw.get("rule_id", "")),
+                error=f"Validation error: {str(e)}"
+            )
+    
+    if valid:
+        acreditta = get_acreditta_handler()
+        issued = acreditta.issue_badges(
+            [badge for _, badge in valid],
+            max_workers=MAX_WORKERS,
+            rate_limit=RATE_LIMIT or None
+        )
+        for (i, _), result in zip(valid, issued):
+            results[i] = result
+        settle_issuances([
+            (badge, result.response.badge_id if result.response else None)
+            for (_, badge), result in zip(valid, issued)
+        ])
+    
+    return results
+
+
+def settle_issuances(outcomes: List[Tuple[BadgeIssueRequest, Optional[str]]]) -> None:
+    """
+    Settle the issuance claims taken by validate_rule.
+    
+    A successful issuance marks its claim issued, so redelivered events are
+    duplicates from then on; a failed one releases it, so they may retry.
+    Errors are logged only: an unsettled claim expires after its lease.
+    
+    Args:
+        outcomes: (badge request, issued badge ID or None if it failed)
+    """
+    dedupe = get_issuance_dedupe()
+    if dedupe is None:
+        return
+    issued = {}
+    for badge_request, badge_id in outcomes:
+        key = IssuanceDedupe.key(
+            badge_request.student_id,
+            badge_request.course_id,
+            badge_request.evaluation_id,
+            badge_request.rule_id
+        )
+        if badge_id is not None:
+            issued[key] = badge_id
+            continue
+        try:
+            dedupe.release(key)
+        except Exception as e:
+            logger.warning(f"Could not release issuance claim for student {badge_request.student_id}: {str(e)}")
+    if issued:
+        try:
+            dedupe.mark_issued_many(issued)
+        except Exception as e:
+            logger.warning(f"Could not mark {len(issued)} issuance claims as issued: {str(e)}")
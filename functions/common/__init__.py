@@ -1,66 +1,169 @@
-"""Common utilities package."""
-
-from .config import Config, SecretManager, get_secret
-from .models import (
-    MoodleEvent,
-    ValidationRequest,
-    ValidationResult,
-    BadgeIssueRequest,
-    BadgeIssueResponse,
-    SISUpdateRequest,
-    SISUpdateResponse,
-    EmissionRule,
-    AuditEvent,
-    BadgeAlignment,
-    BadgeEvidence,
-)
-from .database import FirestoreClient
-from .pedagogical_models import (
-    Taxonomy, Competency, LearningPath, PathNode, 
-    EvidenceMapping, LearningObjectMetadata, AdvancementRule, Condition,
-    TaxonomyType, CompetencyLevel, RuleOperator, SimulationResult
-)
-from .pedagogical_db import PedagogicalDBClient
-from .rule_evaluator import RuleEvaluator
-from .moodle_client import MoodleClient
-from .lti_handler import LTIHandler
-from .sis_client import SISClient
-from .evidence_verifier import EvidenceVerifier
-from .badge_service import BadgeService
-
-__all__ = [
-    "Config",
-    "SecretManager",
-    "get_secret",
-    "MoodleEvent",
-    "ValidationRequest",
-    "ValidationResult",
-    "BadgeIssueRequest",
-    "BadgeIssueResponse",
-    "SISUpdateRequest",
-    "SISUpdateResponse",
-    "EmissionRule",
-    "AuditEvent",
-    "BadgeAlignment",
-    "BadgeEvidence",
-    "FirestoreClient",
-    "Taxonomy",
-    "Competency",
-    "LearningPath",
-    "PathNode",
-    "EvidenceMapping",
-    "LearningObjectMetadata",
-    "AdvancementRule",
-    "Condition",
-    "TaxonomyType",
-    "CompetencyLevel",
-    "RuleOperator",
-    "SimulationResult",
-    "PedagogicalDBClient",
-    "RuleEvaluator",
-    "MoodleClient",
-    "LTIHandler",
-    "SISClient",
-    "EvidenceVerifier",
-    "BadgeService",
-]
+"""
+Common utilities package.
+
+Submodules are imported lazily on first attribute access (PEP 562), so each
+Cloud Function only pays the import cost of the parts it actually uses.
+"""
+
+import importlib
+from typing import Any, Dict, List
+
+# Public name -> submodule defining it
+_EXPORTS: Dict[str, str] = {
+    # config
+    "Config": ".config",
+    "SecretManager": ".config",
+    "get_secret": ".config",
+    "invalidate_secret": ".config",
+
+    # cache
+    "TTLCache": ".cache",
+    "FirestoreCache": ".cache",
+
+    # throttling
+    "RateLimiter": ".throttling",
+
+    # resilience
+    "RetryPolicy": ".resilience",
+    "CircuitBreaker": ".resilience",
+    "CircuitOpenError": ".resilience",
+    "idempotency_key": ".resilience",
+    "parse_retry_after": ".resilience",
+
+    # models
+    "MoodleEvent": ".models",
+    "ValidationRequest": ".models",
+    "ValidationResult": ".models",
+    "BadgeIssueRequest": ".models",
+    "BadgeIssueResponse": ".models",
+    "BadgeIssueResult": ".models",
+    "SISUpdateRequest": ".models",
+    "SISUpdateResponse": ".models",
+    "SISUpdateResult": ".models",
+    "EmissionRule": ".models",
+    "AuditEvent": ".models",
+    "BadgeAlignment": ".models",
+    "BadgeEvidence": ".models",
+
+    # database
+    "FirestoreClient": ".database",
+    "AUDIT_COMMIT_TIMEOUT": ".database",
+
+    # rule_index
+    "RuleIndex": ".rule_index",
+    "CourseRules": ".rule_index",
+
+    # pedagogical_models
+    "Taxonomy": ".pedagogical_models",
+    "Competency": ".pedagogical_models",
+    "LearningPath": ".pedagogical_models",
+    "PathNode": ".pedagogical_models",
+    "EvidenceMapping": ".pedagogical_models",
+    "LearningObjectMetadata": ".pedagogical_models",
+    "AdvancementRule": ".pedagogical_models",
+    "Condition": ".pedagogical_models",
+    "TaxonomyType": ".pedagogical_models",
+    "CompetencyLevel": ".pedagogical_models",
+    "RuleOperator": ".pedagogical_models",
+    "SimulationResult": ".pedagogical_models",
+    "EvidenceType": ".pedagogical_models",
+
+    # pedagogical_db
+    "PedagogicalDBClient": ".pedagogical_db",
+
+    # rule_evaluator
+    "RuleEvaluator": ".rule_evaluator",
+    "EvaluationStats": ".rule_evaluator",
+    "LazyFacts": ".rule_evaluator",
+
+    # rule_cost
+    "CostModel": ".rule_cost",
+    "DEFAULT_COST_MODEL": ".rule_cost",
+
+    # rule_dependency_index
+    "RuleDependencyIndex": ".rule_dependency_index",
+    "DependentRule": ".rule_dependency_index",
+    "rule_fields": ".rule_dependency_index",
+    "event_fields": ".rule_dependency_index",
+
+    # rule_compiler
+    "RuleCompiler": ".rule_compiler",
+    "compile_rule": ".rule_compiler",
+    "compile_path": ".rule_compiler",
+
+    # moodle_client
+    "MoodleClient": ".moodle_client",
+
+    # lti_handler
+    "LTIHandler": ".lti_handler",
+
+    # sis_client
+    "SISClient": ".sis_client",
+    "compile_criteria": ".sis_client",
+
+    # evidence_verifier
+    "EvidenceVerifier": ".evidence_verifier",
+
+    # badge_service
+    "BadgeService": ".badge_service",
+
+    # outbox
+    "OutboxMessage": ".outbox",
+    "OutboxStore": ".outbox",
+    "InMemoryOutboxStore": ".outbox",
+    "SQLiteOutboxStore": ".outbox",
+    "FirestoreOutboxStore": ".outbox",
+    "OutboxWorker": ".outbox",
+    "PermanentError": ".outbox",
+
+    # batching
+    "MicroBatcher": ".batching",
+    "BatcherFullError": ".batching",
+
+    # student_cache
+    "StudentCache": ".student_cache",
+    "publish_student_changes": ".student_cache",
+
+    # audit_writer
+    "AuditWriter": ".audit_writer",
+
+    # dedupe
+    "IssuanceDedupe": ".dedupe",
+
+    # db_pool
+    "ConnectionPool": ".db_pool",
+    "PoolTimeoutError": ".db_pool",
+
+    # pubsub_consumer
+    "PubSubBatchConsumer": ".pubsub_consumer",
+    "parse_json_message": ".pubsub_consumer",
+
+    # clients
+    "get_or_create": ".clients",
+    "reset_clients": ".clients",
+    "get_firestore_db": ".clients",
+    "get_firestore_client": ".clients",
+    "get_pedagogical_db": ".clients",
+    "get_secret_manager": ".clients",
+    "get_moodle_client": ".clients",
+    "get_outbox_store": ".clients",
+    "get_student_cache": ".clients",
+    "get_issuance_dedupe": ".clients",
+    "get_pubsub_subscriber": ".clients",
+    "get_pubsub_publisher": ".clients",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -8,7 +8,7 @@ import logging
 from typing import Optional, Dict, Any, List
 import google.generativeai as genai
 from .pedagogical_models import LearningObjectMetadata, MetadataStandard
-from .moodle_client import MoodleCourse
+from .lms_client import LMSCourse as MoodleCourse
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,151 @@
+"""
+Buffered, asynchronous writer for audit events.
+Events are acknowledged as soon as they are buffered and written to
+Firestore in batched commits (up to 500 writes per RPC) by a background
+thread, flushed on size or time and on interpreter shutdown.
+"""
+
+import atexit
+import logging
+import time
+import weakref
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .batching import MicroBatcher
+from .resilience import RetryPolicy
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects commits with more than 500 writes
+MAX_COMMIT_WRITES = 500
+
+# Retries of a failed commit before its events are given up (and logged)
+DEFAULT_AUDIT_RETRY_POLICY = RetryPolicy(max_attempts=5, base_delay=0.2, max_delay=5.0)
+
+# Longest time shutdown waits for buffered events
+SHUTDOWN_FLUSH_SECONDS = 10.0
+
+# Writers flushed at interpreter exit (gunicorn workers exit normally on SIGTERM)
+_writers: "weakref.WeakSet[AuditWriter]" = weakref.WeakSet()
+
+
+class AuditWriter:
+    """
+    Buffers audit documents and commits them to a collection in batches.
+
+    A batch is committed when it holds ``batch_size`` events or its oldest
+    event has waited ``flush_interval`` seconds. At most ``max_buffer``
+    events wait at once: beyond that ``write`` blocks (backpressure) for up
+    to ``block_timeout`` seconds. A commit that keeps failing after the
+    retry policy is logged with its full documents, so no event is silently
+    lost.
+    """
+
+    def __init__(
+        self,
+        db: "firestore.Client",
+        collection: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.2,
+        max_buffer: int = 5000,
+        block_timeout: Optional[float] = 5.0,
+        retry_policy: RetryPolicy = DEFAULT_AUDIT_RETRY_POLICY
+    ):
+        """
+        Initialize the writer.
+
+        Args:
+            db: Firestore client
+            collection: Collection receiving the documents
+            batch_size: Events per commit (at most 500)
+            flush_interval: Longest time an event waits for its batch, in seconds
+            max_buffer: Events that may wait before write blocks
+            block_timeout: Longest time write blocks on a full buffer
+                (forever if None)
+            retry_policy: Backoff between commit attempts
+        """
+        if not 1 <= batch_size <= MAX_COMMIT_WRITES:
+            raise ValueError(f"batch_size must be between 1 and {MAX_COMMIT_WRITES}")
+        self.db = db
+        self.collection = collection
+        self.block_timeout = block_timeout
+        self.retry_policy = retry_policy
+        self.failed = 0
+        self._batcher = MicroBatcher(
+            self._commit,
+            max_batch_size=batch_size,
+            max_wait_seconds=flush_interval,
+            name=f"audit-writer-{collection}",
+            max_pending=max_buffer
+        )
+        _writers.add(self)
+
+    def write(self, doc_id: str, data: Dict[str, Any]) -> Future:
+        """
+        Buffer one document for writing.
+
+        Returns:
+            Future resolved with ``doc_id`` once the document is committed
+
+        Raises:
+            BatcherFullError: If the buffer stayed full for ``block_timeout``
+        """
+        return self._batcher.submit((doc_id, data), timeout=self.block_timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every buffered document is committed (or given up).
+
+        Returns:
+            True if the buffer was emptied within ``timeout``
+        """
+        return self._batcher.drain(timeout)
+
+    def close(self) -> None:
+        """Commit what is buffered and stop the background thread."""
+        self._batcher.close()
+        _writers.discard(self)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return commit counters for metrics."""
+        return dict(self._batcher.stats(), failed=self.failed)
+
+    def _commit(self, docs: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        collection = self.db.collection(self.collection)
+        attempt = 1
+        while True:
+            batch = self.db.batch()
+            for doc_id, data in docs:
+                batch.set(collection.document(doc_id), data)
+            try:
+                batch.commit()
+                return [doc_id for doc_id, _ in docs]
+            except Exception as e:
+                if not self.retry_policy.should_retry(attempt):
+                    self.failed += len(docs)
+                    # The log entry is the record of last resort
+                    logger.error(
+                        f"Audit commit of {len(docs)} events failed after {attempt} attempts: "
+                        f"{str(e)}; events: {docs}"
+                    )
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                logger.warning(f"Audit commit failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+
+def _flush_all() -> None:
+    for writer in list(_writers):
+        try:
+            writer.flush(SHUTDOWN_FLUSH_SECONDS)
+            writer.close()
+        except Exception as e:
+            logger.error(f"Could not flush audit events on shutdown: {str(e)}")
+
+
+atexit.register(_flush_all)
@@ -0,0 +1,209 @@
+"""
+Micro-batching of concurrent calls.
+Items submitted by concurrent requests of one instance are collected and
+handed to a single flush function when the batch is full or the oldest item
+has waited long enough, turning many round trips into one.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BatcherFullError(RuntimeError):
+    """Raised when a bounded batcher stays full past the submit timeout."""
+
+
+class MicroBatcher:
+    """
+    Thread-safe collector flushing on size or time.
+
+    ``flush_fn`` receives the pending items and must return one result per
+    item, in order; each submitter gets its own result (or the exception
+    raised by ``flush_fn``) through the Future returned by ``submit``.
+
+    With ``max_pending`` the batcher applies backpressure: ``submit`` blocks
+    while that many items are waiting for a flush.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 100,
+        max_wait_seconds: float = 0.02,
+        name: str = "batcher",
+        max_pending: Optional[int] = None
+    ):
+        """
+        Initialize the batcher. The flusher thread starts on first submit.
+
+        Args:
+            flush_fn: Callable processing a list of items, returning their results
+            max_batch_size: Items that trigger an immediate flush
+            max_wait_seconds: Longest time an item waits for its batch to fill
+            name: Name used in logs and for the flusher thread
+            max_pending: Items that may wait for a flush before submit blocks
+                (unbounded if None)
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_pending is not None and max_pending < max_batch_size:
+            raise ValueError("max_pending must be at least max_batch_size")
+        self.flush_fn = flush_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.name = name
+        self.max_pending = max_pending
+        self._pending: List[Tuple[Any, Future]] = []
+        # Submitted items whose batch has not finished flushing
+        self._unresolved = 0
+        self._oldest = 0.0
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.items = 0
+        self.blocked_seconds = 0.0
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Future:
+        """
+        Queue an item for the next batch.
+
+        Args:
+            item: Item to pass to ``flush_fn``
+            timeout: Longest time to block while the batcher is full
+                (forever if None)
+
+        Returns:
+            Future resolved with the item's result once its batch is flushed
+
+        Raises:
+            BatcherFullError: If the batcher stayed full for ``timeout``
+        """
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            if self.max_pending is not None and len(self._pending) >= self.max_pending:
+                started = time.monotonic()
+                deadline = None if timeout is None else started + timeout
+                while len(self._pending) >= self.max_pending and not self._closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise BatcherFullError(
+                            f"{self.name} has {len(self._pending)} items waiting"
+                        )
+                    self._cond.wait(remaining)
+                self.blocked_seconds += time.monotonic() - started
+                if self._closed:
+                    raise RuntimeError(f"{self.name} is closed")
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((item, future))
+            self._unresolved += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+            self._cond.notify_all()
+        return future
+
+    def flush(self) -> None:
+        """Flush the pending items now, in the calling thread."""
+        with self._cond:
+            batch, self._pending = self._pending, []
+        self._flush(batch)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every item submitted so far has been flushed.
+
+        Args:
+            timeout: Longest time to wait (forever if None)
+
+        Returns:
+            True if nothing is left unresolved
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # Do not wait for the batch to fill up or age
+            self._oldest = 0.0
+            self._cond.notify_all()
+            while self._unresolved:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self) -> None:
+        """Flush what is pending and stop the flusher thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        """Batches and items flushed, items waiting and time submitters spent blocked."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "pending": len(self._pending),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._pending) >= self.max_batch_size:
+                        break
+                    if self._pending:
+                        remaining = self._oldest + self.max_wait_seconds - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+                batch = self._pending[:self.max_batch_size]
+                self._pending = self._pending[self.max_batch_size:]
+                # Room for blocked submitters
+                self._cond.notify_all()
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[Any, Future]]) -> None:
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            self._resolve(batch)
+        finally:
+            with self._cond:
+                self._unresolved -= len(batch)
+                self._cond.notify_all()
+
+    def _resolve(self, batch: List[Tuple[Any, Future]]) -> None:
+        try:
+            results = self.flush_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{self.name} flush returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            logger.error(f"{self.name} flush of {len(batch)} items failed: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,299 @@
+"""
+Caching utilities for CCA Cloud Functions.
+Provides a thread-safe in-process TTL cache with optional LRU bounding and
+single-flight loading (concurrent misses for the same key share one upstream
+fetch), and a Firestore-backed cache with the same interface shared by every
+instance.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable, Optional, Union
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+_MISSING = object()
+
+# Entry lifetime: fixed seconds, or a function of the loaded value
+TTL = Union[float, Callable[[Any], float]]
+
+
+class _Flight:
+    """An upstream fetch in progress, shared by every caller of the same key."""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """
+    Thread-safe cache whose entries expire ``ttl_seconds`` after being set.
+
+    With ``max_size`` the cache is also an LRU: storing a new entry beyond
+    the bound evicts the least recently used one.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: Optional[int] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl_seconds: Default entry lifetime; 0 disables caching
+            max_size: Maximum number of entries (unbounded if None)
+        """
+        if max_size is not None and max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        # Bumped by invalidate() so a load racing with it is not stored
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for metrics."""
+        return _stats(self.hits, self.misses, size=len(self._entries), evictions=self.evictions)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for ``key`` or ``default`` if missing/expired."""
+        with self._lock:
+            value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Store a value.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl_seconds: Lifetime of this entry (defaults to the cache TTL)
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def invalidate(self, key: Hashable = _MISSING) -> None:
+        """Drop one entry, or every entry if no key is given."""
+        with self._lock:
+            self._version += 1
+            if key is _MISSING:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def invalidate_many(self, keys: Iterable[Hashable]) -> int:
+        """
+        Drop the given entries in one locked pass.
+
+        Returns:
+            Number of entries dropped
+        """
+        dropped = 0
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                if self._entries.pop(key, _MISSING) is not _MISSING:
+                    dropped += 1
+        return dropped
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Drop every entry whose key satisfies ``predicate``.
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            self._version += 1
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        refresh: bool = False,
+        ttl_seconds: Optional[TTL] = None
+    ) -> Any:
+        """
+        Return the cached value, loading it once on a miss.
+
+        Concurrent callers that miss on the same key wait for a single call
+        to ``loader`` and share its result or exception. A value loaded while
+        the cache was invalidated is returned but not stored.
+
+        Args:
+            key: Cache key
+            loader: Zero-argument callable fetching the value upstream
+            refresh: Ignore any cached value and fetch again
+            ttl_seconds: Lifetime of the loaded entry (defaults to the cache
+                TTL), or a function computing it from the loaded value
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        with self._lock:
+            if not refresh:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight(self._version)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            ttl = _resolve_ttl(ttl_seconds, flight.value)
+            ttl = self.ttl_seconds if ttl is None else ttl
+            with self._lock:
+                if ttl > 0 and flight.version == self._version:
+                    self._store(key, flight.value, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        if self.max_size is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        if self.max_size is not None:
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+class FirestoreCache:
+    """
+    Cache stored in a Firestore collection, shared by every instance.
+
+    Same interface as TTLCache (without single-flight across instances).
+    Each entry is a document {"value": ..., "expires_at": timestamp}; set a
+    Firestore TTL policy on ``expires_at`` to have expired entries deleted.
+    Values must be Firestore-serializable (dicts, lists, scalars).
+    """
+
+    def __init__(self, collection: "firestore.CollectionReference", ttl_seconds: float):
+        """
+        Initialize the cache.
+
+        Args:
+            collection: Collection holding the entries
+            ttl_seconds: Default entry lifetime; 0 disables caching
+        """
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters (of this instance) for metrics."""
+        return _stats(self.hits, self.misses)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for ``key`` or ``default`` if missing/expired."""
+        doc = self.collection.document(self._doc_id(key)).get()
+        data = doc.to_dict() if doc.exists else None
+        if not data or data["expires_at"] <= datetime.now(timezone.utc):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return data["value"]
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value (see TTLCache.set)."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        self.collection.document(self._doc_id(key)).set({
+            "key": str(key),
+            "value": value,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl),
+        })
+
+    def invalidate(self, key: Hashable = _MISSING) -> None:
+        """Drop one entry, or every entry if no key is given."""
+        if key is not _MISSING:
+            self.collection.document(self._doc_id(key)).delete()
+            return
+        for doc in self.collection.stream():
+            doc.reference.delete()
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        refresh: bool = False,
+        ttl_seconds: Optional[TTL] = None
+    ) -> Any:
+        """Return the cached value, loading and storing it on a miss (see TTLCache.get_or_load)."""
+        if not refresh:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        value = loader()
+        self.set(key, value, _resolve_ttl(ttl_seconds, value))
+        return value
+
+    @staticmethod
+    def _doc_id(key: Hashable) -> str:
+        # Document IDs cannot contain "/"; hashing also bounds their length
+        return hashlib.sha256(str(key).encode()).hexdigest()
+
+
+def _resolve_ttl(ttl_seconds: Optional[TTL], value: Any) -> Optional[float]:
+    return ttl_seconds(value) if callable(ttl_seconds) else ttl_seconds
+
+
+def _stats(hits: int, misses: int, **extra: Any) -> Dict[str, Any]:
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+        **extra,
+    }
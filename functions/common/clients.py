@@ -0,0 +1,209 @@
+"""
+Process-wide client registry for CCA Cloud Functions.
+Creates Firestore, Secret Manager and LMS clients lazily, once per instance,
+and reuses them across invocations so warm requests skip channel setup.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+from .config import Config, SecretManager
+from .rule_index import reset_rule_indexes
+
+# Client modules are imported inside the getters so that a function only
+# loads the SDKs of the clients it actually asks for.
+if TYPE_CHECKING:
+    from google.cloud import firestore, pubsub_v1
+    from .database import FirestoreClient
+    from .pedagogical_db import PedagogicalDBClient
+    from .moodle_client import MoodleClient
+    from .outbox import OutboxStore
+    from .student_cache import StudentCache
+    from .dedupe import IssuanceDedupe
+
+_clients: Dict[Tuple, Any] = {}
+_lock = threading.RLock()
+
+
+def get_or_create(key: Tuple, factory: Callable[[], Any]) -> Any:
+    """
+    Return the client registered under ``key``, creating it on first use.
+
+    Args:
+        key: Hashable identity of the client (kind plus its settings)
+        factory: Zero-argument callable building the client
+
+    Returns:
+        The shared client instance
+    """
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+        return client
+
+
+def reset_clients() -> None:
+    """
+    Forget every registered client.
+
+    Called automatically in the child after ``fork()``: gRPC channels and
+    snapshot listeners must not be shared across processes, so the child
+    builds its own clients and rule indexes.
+    """
+    global _lock
+    _lock = threading.RLock()
+    _clients.clear()
+    reset_rule_indexes()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_clients)
+
+
+def get_firestore_db(project_id: str) -> "firestore.Client":
+    """Get the shared raw Firestore client (one gRPC channel) for a project."""
+    from google.cloud import firestore
+
+    return get_or_create(
+        ("firestore", project_id),
+        lambda: firestore.Client(project=project_id)
+    )
+
+
+def get_firestore_client(config: Optional[Config] = None) -> "FirestoreClient":
+    """Get the shared FirestoreClient for the given configuration."""
+    from .database import FirestoreClient
+
+    config = config or Config.from_env()
+    key = (
+        "cca_firestore",
+        config.project_id,
+        config.firestore_collection_rules,
+        config.firestore_collection_events,
+    )
+    return get_or_create(
+        key,
+        lambda: FirestoreClient(config, db=get_firestore_db(config.project_id))
+    )
+
+
+def get_pedagogical_db(config: Optional[Config] = None) -> "PedagogicalDBClient":
+    """Get the shared PedagogicalDBClient for the given configuration."""
+    from .pedagogical_db import PedagogicalDBClient
+
+    config = config or Config.from_env()
+    return get_or_create(
+        ("pedagogical_db", config.project_id),
+        lambda: PedagogicalDBClient(config, db=get_firestore_db(config.project_id))
+    )
+
+
+def get_pubsub_subscriber() -> "pubsub_v1.SubscriberClient":
+    """Get the shared Pub/Sub subscriber client."""
+    from google.cloud import pubsub_v1
+
+    return get_or_create(("pubsub_subscriber",), pubsub_v1.SubscriberClient)
+
+
+def get_pubsub_publisher() -> "pubsub_v1.PublisherClient":
+    """Get the shared Pub/Sub publisher client."""
+    from google.cloud import pubsub_v1
+
+    return get_or_create(("pubsub_publisher",), pubsub_v1.PublisherClient)
+
+
+def get_secret_manager(project_id: str) -> SecretManager:
+    """Get the shared SecretManager for a project."""
+    return get_or_create(
+        ("secret_manager", project_id),
+        lambda: SecretManager(project_id)
+    )
+
+
+def get_student_cache(config: Optional[Config] = None) -> "StudentCache":
+    """
+    Get the shared cache of student attributes and profiles.
+
+    With ``config.student_cache_listen`` the cache also follows the change
+    markers written by update_sis, so other instances drop a changed
+    student immediately instead of after the TTL.
+    """
+    from .student_cache import StudentCache
+
+    config = config or Config.from_env()
+
+    def create() -> "StudentCache":
+        cache = StudentCache(config.student_cache_ttl_seconds, config.student_cache_max_size)
+        if config.student_cache_listen and config.student_cache_ttl_seconds > 0:
+            cache.watch(
+                get_firestore_db(config.project_id).collection(
+                    config.firestore_collection_student_changes
+                )
+            )
+        return cache
+
+    return get_or_create(("student_cache", config.project_id), create)
+
+
+def get_issuance_dedupe(config: Optional[Config] = None) -> Optional["IssuanceDedupe"]:
+    """Get the shared issuance deduplicator, or None if ``config.dedupe_enabled`` is off."""
+    from .dedupe import IssuanceDedupe
+
+    config = config or Config.from_env()
+    if not config.dedupe_enabled:
+        return None
+    return get_or_create(
+        ("issuance_dedupe", config.project_id, config.firestore_collection_dedupe),
+        lambda: IssuanceDedupe(
+            get_firestore_db(config.project_id),
+            config.firestore_collection_dedupe,
+            lease_seconds=config.dedupe_lease_seconds,
+            cache_size=config.dedupe_cache_size
+        )
+    )
+
+
+def get_moodle_client(
+    api_url: str = "https://moodle.example.com",
+    token: str = "mock-token"
+) -> "MoodleClient":
+    """Get the shared MoodleClient for an API URL and token."""
+    from .moodle_client import MoodleClient
+
+    return get_or_create(
+        ("moodle", api_url, token),
+        lambda: MoodleClient(api_url=api_url, token=token, student_cache=get_student_cache())
+    )
+
+
+def get_outbox_store(config: Optional[Config] = None) -> "OutboxStore":
+    """
+    Get the shared outbox store for the configured backend.
+
+    ``config.outbox_backend`` selects "firestore" (default), "sqlite"
+    (``config.outbox_sqlite_path``) or "memory" (local testing only).
+    """
+    from .outbox import FirestoreOutboxStore, InMemoryOutboxStore, SQLiteOutboxStore
+
+    config = config or Config.from_env()
+    backend = config.outbox_backend
+    if backend == "memory":
+        return get_or_create(("outbox", "memory"), InMemoryOutboxStore)
+    if backend == "sqlite":
+        return get_or_create(
+            ("outbox", "sqlite", config.outbox_sqlite_path),
+            lambda: SQLiteOutboxStore(config.outbox_sqlite_path)
+        )
+    if backend == "firestore":
+        return get_or_create(
+            ("outbox", "firestore", config.project_id, config.firestore_collection_outbox),
+            lambda: FirestoreOutboxStore(
+                get_firestore_db(config.project_id), config.firestore_collection_outbox
+            )
+        )
+    raise ValueError(f"Unknown outbox backend: {backend}")
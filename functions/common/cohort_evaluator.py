@@ -0,0 +1,203 @@
+"""
+Vectorized evaluation of advancement rules over a whole cohort.
+Facts are given as columns (one array per field path) and rules are evaluated
+as boolean mask operations with NumPy instead of one RuleEvaluator call per
+student.
+
+Not imported by the package __init__ so that only callers that need NumPy
+pay for it; import it as ``common.cohort_evaluator``.
+"""
+
+from typing import Any, Dict, Mapping, Optional, Union
+
+import numpy as np
+
+from .pedagogical_models import AdvancementRule, Condition, RuleOperator
+from .rule_compiler import OPERATORS
+from .rule_cost import CostModel
+
+# Operators that NumPy can apply to a whole non-object column at once
+_VECTOR_OPERATORS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+# Column dtype kinds a target may be compared with in one NumPy call: numbers
+# against numeric columns, strings against string columns
+_NUMERIC_KINDS = "biuf"
+_STRING_KINDS = "US"
+
+
+def _vectorizable(values: np.ndarray, target: Any) -> bool:
+    """
+    Whether a whole column can be compared with ``target`` by NumPy.
+
+    Mixed types (e.g. a str column against 5) go to the per-row scalar
+    operator instead: NumPy raises for them while RuleEvaluator returns False
+    for ``==`` (True for ``!=``).
+    """
+    kind = values.dtype.kind
+    if isinstance(target, (bool, int, float, np.number, np.bool_)):
+        return kind in _NUMERIC_KINDS
+    if isinstance(target, str):
+        return kind in _STRING_KINDS
+    return False
+
+
+def _flatten(columns: Mapping[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in columns.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, Mapping):
+            flat.update(_flatten(value, path + "."))
+        else:
+            flat[path] = value
+    return flat
+
+
+class CohortEvaluator:
+    """
+    Evaluates rules against columnar facts for many students at once.
+
+    Results match RuleEvaluator.evaluate row by row: a missing value (column
+    absent, ``None`` in an object column, or a masked entry of a
+    ``numpy.ma.MaskedArray``) makes its condition False.
+    """
+
+    def __init__(self, columns: Mapping[str, Any], size: Optional[int] = None):
+        """
+        Initialize the evaluator.
+
+        Args:
+            columns: Field path -> array of values, e.g. {"score": [...],
+                "attribute.becado": [...]}. Nested dicts of arrays such as
+                {"attribute": {"becado": [...]}} are flattened to paths.
+            size: Number of students; inferred from the columns if omitted.
+
+        Raises:
+            ValueError: If the columns have different lengths.
+        """
+        self._values: Dict[str, np.ndarray] = {}
+        self._present: Dict[str, np.ndarray] = {}
+
+        for path, column in _flatten(columns).items():
+            if isinstance(column, np.ma.MaskedArray):
+                present = ~np.ma.getmaskarray(column)
+                values = column.filled(column.fill_value) if column.dtype != object else column.data
+            else:
+                values = np.asarray(column)
+                if values.dtype == object:
+                    present = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+                else:
+                    present = np.ones(len(values), dtype=bool)
+
+            if size is None:
+                size = len(values)
+            elif len(values) != size:
+                raise ValueError(f"Column '{path}' has {len(values)} rows, expected {size}")
+
+            self._values[path] = values
+            self._present[path] = present
+
+        self.size = size or 0
+
+    def mask(
+        self,
+        rule: Union[AdvancementRule, Condition],
+        cost_model: Optional[CostModel] = None
+    ) -> np.ndarray:
+        """
+        Evaluate a rule or condition for every student.
+
+        Args:
+            rule: The rule or condition to evaluate.
+            cost_model: Optional cost model; cheaper children are evaluated first.
+
+        Returns:
+            Boolean array with one entry per student.
+        """
+        if isinstance(rule, Condition):
+            return self._condition_mask(rule)
+
+        if not isinstance(rule, AdvancementRule):
+            return np.zeros(self.size, dtype=bool)
+
+        conditions = rule.conditions
+        if not conditions:
+            return np.ones(self.size, dtype=bool)  # Empty rule is considered met
+        if cost_model is not None:
+            conditions = cost_model.order(conditions)
+
+        if rule.logic_operator == RuleOperator.AND:
+            result = np.ones(self.size, dtype=bool)
+            for c in conditions:
+                result &= self.mask(c, cost_model)
+                if not result.any():
+                    break
+            return result
+
+        matched = np.zeros(self.size, dtype=bool)
+        for c in conditions:
+            matched |= self.mask(c, cost_model)
+            if matched.all():
+                break
+
+        if rule.logic_operator == RuleOperator.OR:
+            return matched
+        if rule.logic_operator == RuleOperator.NOT:
+            return ~matched  # Simplified NOT logic
+
+        return np.zeros(self.size, dtype=bool)
+
+    def matching_indices(
+        self,
+        rule: Union[AdvancementRule, Condition],
+        cost_model: Optional[CostModel] = None
+    ) -> np.ndarray:
+        """Return the row indices of the students that satisfy the rule."""
+        return np.flatnonzero(self.mask(rule, cost_model))
+
+    def _condition_mask(self, condition: Condition) -> np.ndarray:
+        op = OPERATORS.get(condition.operator)
+        values = self._values.get(condition.field)
+        if op is None or values is None:
+            return np.zeros(self.size, dtype=bool)
+
+        present = self._present[condition.field]
+        target = condition.value
+        vector_op = _VECTOR_OPERATORS.get(condition.operator)
+
+        if vector_op is not None and _vectorizable(values, target):
+            return vector_op(values, target) & present
+
+        # Object columns, mixed types and "contains": apply the scalar operator
+        # to the present rows as Python values (NumPy scalars would broadcast)
+        result = np.zeros(self.size, dtype=bool)
+        rows = np.flatnonzero(present)
+        result[rows] = np.fromiter(
+            (bool(op(v, target)) for v in values[rows].tolist()), dtype=bool, count=len(rows)
+        )
+        return result
+
+
+def evaluate_cohort(
+    rule: Union[AdvancementRule, Condition],
+    columns: Mapping[str, Any],
+    cost_model: Optional[CostModel] = None
+) -> np.ndarray:
+    """
+    Return the indices of the students whose columnar facts satisfy a rule.
+
+    Args:
+        rule: The rule or condition to evaluate.
+        columns: Field path -> array of values (see CohortEvaluator).
+        cost_model: Optional cost model; cheaper children are evaluated first.
+
+    Returns:
+        Sorted array of matching row indices.
+    """
+    return CohortEvaluator(columns).matching_indices(rule, cost_model)
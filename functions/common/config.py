@@ -6,7 +6,7 @@ Handles environment variables and Secret Manager integration.
 import os
 from dataclasses import dataclass
 from typing import Optional
-from google.cloud import secretmanager
+from .cache import TTLCache
 
 
 @dataclass
@@ -16,6 +16,24 @@ class Config:
     environment: str
     firestore_collection_rules: str = "reglas_emision"
     firestore_collection_events: str = "registro_evento"
+    rule_cache_ttl_seconds: float = 30.0
+    rule_cache_listen: bool = False
+    secret_cache_ttl_seconds: float = 300.0
+    outbox_backend: str = "firestore"
+    firestore_collection_outbox: str = "outbox_emision"
+    outbox_sqlite_path: str = "outbox.db"
+    student_cache_ttl_seconds: float = 60.0
+    student_cache_max_size: int = 10000
+    student_cache_listen: bool = False
+    firestore_collection_student_changes: str = "cambios_estudiante"
+    audit_async: bool = True
+    audit_batch_size: int = 100
+    audit_flush_interval_ms: float = 20.0
+    audit_max_buffer: int = 5000
+    dedupe_enabled: bool = True
+    firestore_collection_dedupe: str = "emisiones_dedupe"
+    dedupe_lease_seconds: float = 900.0
+    dedupe_cache_size: int = 100000
     
     @classmethod
     def from_env(cls) -> "Config":
@@ -23,6 +41,21 @@ class Config:
         return cls(
             project_id=os.environ.get("GCP_PROJECT_ID", ""),
             environment=os.environ.get("ENVIRONMENT", "dev"),
+            rule_cache_ttl_seconds=float(os.environ.get("RULE_CACHE_TTL_SECONDS", "30")),
+            rule_cache_listen=os.environ.get("RULE_CACHE_LISTEN", "false").lower() == "true",
+            secret_cache_ttl_seconds=float(os.environ.get("SECRET_CACHE_TTL_SECONDS", "300")),
+            outbox_backend=os.environ.get("OUTBOX_BACKEND", "firestore"),
+            outbox_sqlite_path=os.environ.get("OUTBOX_SQLITE_PATH", "outbox.db"),
+            student_cache_ttl_seconds=float(os.environ.get("STUDENT_CACHE_TTL_SECONDS", "60")),
+            student_cache_max_size=int(os.environ.get("STUDENT_CACHE_MAX_SIZE", "10000")),
+            student_cache_listen=os.environ.get("STUDENT_CACHE_LISTEN", "false").lower() == "true",
+            audit_async=os.environ.get("AUDIT_ASYNC", "true").lower() == "true",
+            audit_batch_size=int(os.environ.get("AUDIT_BATCH_SIZE", "100")),
+            audit_flush_interval_ms=float(os.environ.get("AUDIT_FLUSH_INTERVAL_MS", "20")),
+            audit_max_buffer=int(os.environ.get("AUDIT_MAX_BUFFER", "5000")),
+            dedupe_enabled=os.environ.get("DEDUPE_ENABLED", "true").lower() == "true",
+            dedupe_lease_seconds=float(os.environ.get("DEDUPE_LEASE_SECONDS", "900")),
+            dedupe_cache_size=int(os.environ.get("DEDUPE_CACHE_SIZE", "100000")),
         )
 
 
@@ -30,6 +63,9 @@ class SecretManager:
     """Helper class for accessing secrets from Google Secret Manager."""
     
     def __init__(self, project_id: str):
+        # Imported here so that functions needing only Config skip the gRPC client
+        from google.cloud import secretmanager
+        
         self.project_id = project_id
         self.client = secretmanager.SecretManagerServiceClient()
     
@@ -49,16 +85,45 @@ class SecretManager:
         return response.payload.data.decode("UTF-8")
 
 
-def get_secret(secret_id: str) -> str:
+# Secret values cached per instance; concurrent misses share one fetch
+_secret_cache = TTLCache(ttl_seconds=300.0)
+
+
+def get_secret(secret_id: str, refresh: bool = False) -> str:
     """
     Convenience function to get a secret value.
     
+    Values are cached in-process for SECRET_CACHE_TTL_SECONDS. Pass
+    ``refresh=True`` after an authentication failure to bypass the cache
+    and pick up a rotated secret.
+    
     Args:
         secret_id: The ID of the secret
+        refresh: Fetch from Secret Manager even if a cached value exists
         
     Returns:
         The secret value as a string
     """
+    # Imported here because the client registry imports this module
+    from .clients import get_secret_manager
+    
     config = Config.from_env()
-    sm = SecretManager(config.project_id)
-    return sm.get_secret(secret_id)
+    return _secret_cache.get_or_load(
+        (config.project_id, secret_id),
+        lambda: get_secret_manager(config.project_id).get_secret(secret_id),
+        refresh=refresh,
+        ttl_seconds=config.secret_cache_ttl_seconds,
+    )
+
+
+def invalidate_secret(secret_id: Optional[str] = None) -> None:
+    """
+    Drop cached secret values.
+    
+    Args:
+        secret_id: Secret to drop (all secrets if not provided)
+    """
+    if secret_id is None:
+        _secret_cache.invalidate()
+        return
+    _secret_cache.invalidate((Config.from_env().project_id, secret_id))
@@ -2,27 +2,51 @@
 Firestore database utilities for CCA system.
 """
 
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from google.cloud import firestore
+from .audit_writer import AuditWriter
 from .config import Config
 from .models import EmissionRule, AuditEvent
+from .rule_index import CourseRules, RuleIndex, get_rule_index
+
+# Longest time log_event waits for the batch holding its event to commit
+AUDIT_COMMIT_TIMEOUT = 30.0
 
 
 class FirestoreClient:
     """Firestore database client for CCA operations."""
     
-    def __init__(self, config: Optional[Config] = None):
+    def __init__(self, config: Optional[Config] = None, db: Optional[firestore.Client] = None):
         """
         Initialize Firestore client.
         
         Args:
             config: Application configuration (loads from env if not provided)
+            db: Existing Firestore client to reuse (a new one is created if not provided)
         """
         self.config = config or Config.from_env()
-        self.db = firestore.Client(project=self.config.project_id)
+        self.db = db or firestore.Client(project=self.config.project_id)
         self.rules_collection = self.config.firestore_collection_rules
         self.events_collection = self.config.firestore_collection_events
+        self.rule_index: RuleIndex = get_rule_index(
+            self.config.project_id,
+            self.rules_collection,
+            self.config.rule_cache_ttl_seconds,
+        )
+        if self.config.rule_cache_listen and self.rule_index.enabled:
+            self.rule_index.watch(self.db.collection(self.rules_collection))
+        # Audit events are buffered and committed in batches off the request path
+        self.audit_writer: Optional[AuditWriter] = None
+        if self.config.audit_async:
+            self.audit_writer = AuditWriter(
+                self.db,
+                self.events_collection,
+                batch_size=self.config.audit_batch_size,
+                flush_interval=self.config.audit_flush_interval_ms / 1000,
+                max_buffer=self.config.audit_max_buffer
+            )
     
     def get_matching_rule(
         self,
@@ -41,50 +65,130 @@ class FirestoreClient:
         Returns:
             Matching EmissionRule or None if no match found
         """
-        # Query for active rules matching course and evaluation
+        if self.rule_index.enabled:
+            return self.get_course_rules(course_id).match(evaluation_id, score)
+        
+        # Without the rule index, let Firestore do the matching. Rules without
+        # evaluation_id apply to all evaluations in the course, so the best
+        # evaluation-bound and the best course-wide rule are fetched and the
+        # higher threshold wins (the evaluation-bound one on ties).
+        specific = self._query_best_rule(course_id, evaluation_id, score)
+        generic = self._query_best_rule(course_id, None, score)
+        
+        if specific is None:
+            return generic
+        if generic is None or specific.min_score >= generic.min_score:
+            return specific
+        return generic
+    
+    def _query_best_rule(
+        self,
+        course_id: str,
+        evaluation_id: Optional[str],
+        score: float
+    ) -> Optional[EmissionRule]:
+        """
+        Fetch the highest-threshold active rule met by a score.
+        
+        Served by the composite index on (active, course_id, evaluation_id,
+        min_score desc, __name__ desc) defined in the Terraform.
+        """
         query = (
             self.db.collection(self.rules_collection)
             .where("active", "==", True)
             .where("course_id", "==", course_id)
+            .where("evaluation_id", "==", evaluation_id)
+            .where("min_score", "<=", score)
+            .order_by("min_score", direction=firestore.Query.DESCENDING)
+            .order_by("__name__", direction=firestore.Query.DESCENDING)
+            .limit(1)
         )
+        for doc in query.stream():
+            return self._rule_from_doc(doc)
+        return None
+    
+    def get_course_rules(self, course_id: str) -> CourseRules:
+        """
+        Get the active emission rules of a course, served from the rule index.
         
-        # If evaluation_id is specified in the rule, it must match
-        # Otherwise, the rule applies to all evaluations in the course
-        rules = query.stream()
+        Rules are fetched from Firestore only when the course is not cached
+        or its entry has expired.
         
-        for doc in rules:
-            rule_data = doc.to_dict()
-            
-            # Check if evaluation matches (if specified in rule)
-            if rule_data.get("evaluation_id") and rule_data["evaluation_id"] != evaluation_id:
-                continue
+        Args:
+            course_id: Course identifier
             
-            # Check if score meets minimum requirement
-            if score >= rule_data.get("min_score", 0):
-                # Convert Firestore document to EmissionRule
-                return EmissionRule(
-                    rule_id=doc.id,
-                    course_id=rule_data["course_id"],
-                    evaluation_id=rule_data.get("evaluation_id"),
-                    min_score=rule_data["min_score"],
-                    badge_template_id=rule_data["badge_template_id"],
-                    badge_title=rule_data["badge_title"],
-                    active=rule_data["active"],
-                    created_at=rule_data.get("created_at", datetime.now()),
-                    updated_at=rule_data.get("updated_at", datetime.now()),
-                )
+        Returns:
+            CourseRules for the course
+        """
+        if self.rule_index.enabled:
+            cached = self.rule_index.get(course_id)
+            if cached is not None:
+                return cached
         
-        return None
+        version = self.rule_index.version
+        
+        # Query for active rules of the course. Rules without evaluation_id
+        # apply to all evaluations in the course.
+        query = (
+            self.db.collection(self.rules_collection)
+            .where("active", "==", True)
+            .where("course_id", "==", course_id)
+        )
+        rules = [self._rule_from_doc(doc) for doc in query.stream()]
+        
+        if not self.rule_index.enabled:
+            return CourseRules(course_id, rules)
+        return self.rule_index.store(course_id, rules, version)
+    
+    @staticmethod
+    def _rule_from_doc(doc) -> EmissionRule:
+        """Convert a Firestore rule document to an EmissionRule."""
+        rule_data = doc.to_dict()
+        return EmissionRule(
+            rule_id=doc.id,
+            course_id=rule_data["course_id"],
+            evaluation_id=rule_data.get("evaluation_id"),
+            min_score=rule_data.get("min_score", 0),
+            badge_template_id=rule_data["badge_template_id"],
+            badge_title=rule_data["badge_title"],
+            active=rule_data["active"],
+            created_at=rule_data.get("created_at", datetime.now()),
+            updated_at=rule_data.get("updated_at", datetime.now()),
+        )
     
     def log_event(self, event: AuditEvent) -> str:
         """
-        Log an audit event to Firestore.
+        Log an audit event to Firestore and wait until it is committed.
+        
+        With the audit writer enabled (the default) the event is committed
+        in a batch together with those of concurrent requests.
         
         Args:
             event: AuditEvent to log
             
         Returns:
             Document ID of the logged event
+            
+        Raises:
+            Exception: If the commit failed (after the writer's retries) or
+                did not finish within AUDIT_COMMIT_TIMEOUT
+        """
+        return self.log_event_async(event).result(timeout=AUDIT_COMMIT_TIMEOUT)
+    
+    def log_event_async(self, event: AuditEvent) -> Future:
+        """
+        Log an audit event to Firestore without waiting for the commit.
+        
+        Callers logging several events submit them all, then wait for each
+        future, so the events share commits. Wait before responding: after
+        the response, Cloud Functions may stop giving the instance CPU.
+        
+        Args:
+            event: AuditEvent to log
+            
+        Returns:
+            Future resolved with the document ID once the event is committed
+            (or failed with the commit error)
         """
         event_dict = event.model_dump(mode="json")
         
@@ -92,10 +196,31 @@ class FirestoreClient:
         if isinstance(event_dict.get("timestamp"), str):
             event_dict["timestamp"] = firestore.SERVER_TIMESTAMP
         
-        doc_ref = self.db.collection(self.events_collection).document(event.event_id)
-        doc_ref.set(event_dict)
+        if self.audit_writer is not None:
+            return self.audit_writer.write(event.event_id, event_dict)
         
-        return doc_ref.id
+        future: Future = Future()
+        try:
+            doc_ref = self.db.collection(self.events_collection).document(event.event_id)
+            doc_ref.set(event_dict)
+            future.set_result(doc_ref.id)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def flush_events(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until buffered audit events are committed.
+        
+        Args:
+            timeout: Longest time to wait in seconds (forever if None)
+            
+        Returns:
+            True if no event is left buffered
+        """
+        if self.audit_writer is None:
+            return True
+        return self.audit_writer.flush(timeout)
     
     def create_rule(self, rule: EmissionRule) -> str:
         """
@@ -110,6 +235,7 @@ class FirestoreClient:
         rule_dict = rule.model_dump(mode="json")
         doc_ref = self.db.collection(self.rules_collection).document(rule.rule_id)
         doc_ref.set(rule_dict)
+        self.rule_index.invalidate(course_id=rule.course_id, rule_id=rule.rule_id)
         return doc_ref.id
     
     def get_rule(self, rule_id: str) -> Optional[EmissionRule]:
@@ -0,0 +1,227 @@
+"""
+Thread-safe pool of DB-API connections.
+Keeps connections to a database open across invocations of a warm instance,
+so requests skip the connection handshake, and checks idle connections
+before handing them out again.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no connection becomes available in time."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connections created by a factory.
+
+    Connections idle for more than ``health_check_after`` seconds are
+    pinged before reuse, and connections older than ``max_lifetime`` are
+    replaced, so a connection dropped by the server is never handed out.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 5,
+        acquire_timeout: float = 30.0,
+        health_check_after: float = 30.0,
+        max_lifetime: float = 1800.0,
+        ping_sql: str = "SELECT 1"
+    ):
+        """
+        Initialize the pool. Connections are opened lazily, up to ``min_size``
+        on first use.
+
+        Args:
+            factory: Zero-argument callable opening a new DB-API connection
+            min_size: Connections kept open once the pool is in use
+            max_size: Maximum connections open at once
+            acquire_timeout: Seconds to wait for a free connection
+            health_check_after: Idle seconds after which a connection is pinged
+            max_lifetime: Seconds after which a connection is replaced
+            ping_sql: Query used as health check
+        """
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 1 <= max_size and min_size <= max_size")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self.ping_sql = ping_sql
+        # Idle connections as (connection, created_at, returned_at), most recent last
+        self._idle: List[Tuple[Any, float, float]] = []
+        self._created_at: Dict[int, float] = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        """Connections currently open (idle or in use)."""
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        """Connections currently idle."""
+        return len(self._idle)
+
+    def warm(self) -> None:
+        """Open connections until ``min_size`` are open."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self.release(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Borrow a connection.
+
+        Commits when the block succeeds and rolls back when it raises; the
+        connection then goes back to the pool (or is discarded if broken).
+
+        Yields:
+            An open DB-API connection
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                self.discard(conn)
+            else:
+                self.release(conn)
+            raise
+        self.release(conn)
+
+    def acquire(self) -> Any:
+        """
+        Take a healthy connection, opening one if the pool is not full.
+
+        Raises:
+            PoolTimeoutError: If the pool stays exhausted for ``acquire_timeout``
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if self._closed:
+                        raise PoolTimeoutError("Connection pool is closed")
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"No connection available after {self.acquire_timeout:g}s "
+                            f"({self.max_size} in use)"
+                        )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    conn = None
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                if self._size < self.min_size:
+                    threading.Thread(target=self._warm_quietly, daemon=True).start()
+                return conn
+
+            now = time.monotonic()
+            if now - created_at >= self.max_lifetime:
+                self.discard(conn)
+                continue
+            if now - returned_at >= self.health_check_after and not self._ping(conn):
+                logger.warning("Discarding broken pooled connection")
+                self.discard(conn)
+                continue
+            return conn
+
+    def release(self, conn: Any) -> None:
+        """Return a borrowed connection to the pool."""
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+                return
+            created_at = self._created_at.get(id(conn), time.monotonic())
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn: Any) -> None:
+        """Close a borrowed connection instead of returning it (e.g. it is broken)."""
+        with self._cond:
+            self._size -= 1
+            self._created_at.pop(id(conn), None)
+            self._cond.notify()
+        self._close_quietly(conn)
+
+    def close(self) -> None:
+        """Close every idle connection; borrowed ones are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def _open(self) -> Any:
+        conn = self.factory()
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _ping(self, conn: Any) -> bool:
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.ping_sql)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _warm_quietly(self) -> None:
+        try:
+            self.warm()
+        except Exception as e:
+            logger.warning(f"Could not open spare pooled connection: {str(e)}")
+
+    def _close_quietly(self, conn: Any) -> None:
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
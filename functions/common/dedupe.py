@@ -0,0 +1,175 @@
+"""
+Issuance deduplication for the CCA system.
+Moodle re-sends grade events on regrades and webhook retries, and Pub/Sub
+delivers at least once. Each (student, course, evaluation, rule) may claim
+one issuance: the claim is a Firestore document created only if absent, and
+keys already issued are remembered in a per-instance LRU so most duplicates
+are answered from memory.
+"""
+
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .cache import TTLCache
+from .resilience import idempotency_key
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+logger = logging.getLogger(__name__)
+
+# Claim statuses
+CLAIMED = "claimed"
+ISSUED = "issued"
+
+
+class IssuanceDedupe:
+    """
+    Create-if-absent claims on issuance keys.
+
+    A claim is held for ``lease_seconds``: if the issuance fails and the
+    claim is neither released nor marked issued, a redelivered event may
+    take it over after the lease, so a failure never blocks the badge for
+    good. Issued keys are final and cached locally.
+    """
+
+    def __init__(
+        self,
+        db: "firestore.Client",
+        collection: str = "emisiones_dedupe",
+        lease_seconds: float = 900.0,
+        cache_size: int = 100000,
+        cache_ttl_seconds: float = 3600.0
+    ):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            db: Firestore client
+            collection: Collection holding one document per issuance key
+            lease_seconds: How long a claim blocks duplicates before it is
+                considered abandoned
+            cache_size: Issued keys remembered by this instance
+            cache_ttl_seconds: How long an issued key is remembered
+        """
+        self.db = db
+        self.collection = db.collection(collection)
+        self.lease_seconds = lease_seconds
+        self.issued = TTLCache(cache_ttl_seconds, max_size=cache_size)
+        self.claims = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def key(student_id: str, course_id: str, evaluation_id: str, rule_id: str) -> str:
+        """Issuance key of a (student, course, evaluation, rule)."""
+        return idempotency_key("issuance", student_id, course_id, evaluation_id, rule_id)
+
+    def claim(self, key: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Claim an issuance.
+
+        Args:
+            key: Issuance key (see ``key``)
+            metadata: Extra fields stored on a new claim (e.g. student_id)
+
+        Returns:
+            None if the caller now holds the claim, otherwise the existing
+            record (status "issued", or "claimed" by an issuance in progress)
+        """
+        from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+        cached = self.issued.get(key)
+        if cached is not None:
+            self.duplicates += 1
+            return cached
+
+        ref = self.collection.document(key)
+        for _ in range(3):
+            now = time.time()
+            record = {
+                **(metadata or {}),
+                "status": CLAIMED,
+                "claimed_at": now,
+                "lease_until": now + self.lease_seconds,
+            }
+            try:
+                ref.create(record)
+                self.claims += 1
+                return None
+            except AlreadyExists:
+                pass
+
+            snapshot = ref.get()
+            if not snapshot.exists:
+                continue  # Released in between; try to create it again
+            existing = snapshot.to_dict()
+            if existing.get("status") == ISSUED:
+                self.issued.set(key, existing)
+                self.duplicates += 1
+                return existing
+            if existing.get("lease_until", 0) > now:
+                self.duplicates += 1
+                return existing
+
+            # Abandoned claim: take it over unless someone else just did
+            try:
+                ref.update(
+                    {"status": CLAIMED, "claimed_at": now, "lease_until": record["lease_until"]},
+                    option=self.db.write_option(last_update_time=snapshot.update_time)
+                )
+                logger.info(f"Took over abandoned issuance claim {key}")
+                self.claims += 1
+                return None
+            except FailedPrecondition:
+                continue
+
+        self.duplicates += 1
+        snapshot = ref.get()
+        return snapshot.to_dict() if snapshot.exists else {"status": CLAIMED}
+
+    def mark_issued(self, key: str, badge_id: Optional[str] = None) -> None:
+        """Record that the issuance happened; later claims are duplicates."""
+        self.mark_issued_many({key: badge_id})
+
+    def mark_issued_many(self, badge_ids: Dict[str, Optional[str]]) -> None:
+        """
+        Record many issuances with batched writes.
+
+        Args:
+            badge_ids: Issuance key -> issued badge ID
+        """
+        now = time.time()
+        items = list(badge_ids.items())
+        # Firestore batches hold at most 500 writes
+        for start in range(0, len(items), 500):
+            batch = self.db.batch()
+            for key, badge_id in items[start:start + 500]:
+                record = {"status": ISSUED, "issued_at": now, "badge_id": badge_id}
+                batch.set(self.collection.document(key), record, merge=True)
+            batch.commit()
+        for key, badge_id in items:
+            self.issued.set(key, {"status": ISSUED, "issued_at": now, "badge_id": badge_id})
+
+    def release(self, key: str) -> bool:
+        """
+        Drop a claim whose issuance failed, so a retry may claim it at once.
+
+        Returns:
+            True if a pending claim was dropped (issued records are kept)
+        """
+        from google.api_core.exceptions import FailedPrecondition
+
+        ref = self.collection.document(key)
+        snapshot = ref.get()
+        if not snapshot.exists or snapshot.to_dict().get("status") != CLAIMED:
+            return False
+        try:
+            ref.delete(option=self.db.write_option(last_update_time=snapshot.update_time))
+            return True
+        except FailedPrecondition:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return claim/duplicate counters and the local cache stats."""
+        return {"claims": self.claims, "duplicates": self.duplicates, "cache": self.issued.stats()}
@@ -34,6 +34,8 @@ class ValidationResult(BaseModel):
     badge_template_id: Optional[str] = Field(None, description="Badge template to issue")
     badge_title: Optional[str] = Field(None, description="Badge title")
     reason: Optional[str] = Field(None, description="Validation reason/message")
+    error: Optional[str] = Field(None, description="Per-event error in batch mode")
+    duplicate: bool = Field(False, description="The matched badge was already issued or is being issued")
 
 
 class BadgeAlignment(BaseModel):
@@ -75,6 +77,14 @@ class BadgeIssueResponse(BaseModel):
     status: str = Field(..., description="Issuance status")
 
 
+class BadgeIssueResult(BaseModel):
+    """Outcome of one badge in a bulk issuance."""
+    student_id: str
+    rule_id: str
+    response: Optional[BadgeIssueResponse] = Field(None, description="Issued badge, if successful")
+    error: Optional[str] = Field(None, description="Error message, if issuance failed")
+
+
 class SISUpdateRequest(BaseModel):
     """Request to update SIS and log event."""
     student_id: str
@@ -97,6 +107,15 @@ class SISUpdateResponse(BaseModel):
     message: Optional[str] = Field(None, description="Status message")
 
 
+class SISUpdateResult(BaseModel):
+    """Outcome of one update in a bulk SIS update."""
+    student_id: str
+    badge_id: str
+    updated: bool = Field(False, description="Whether the SIS recorded the badge")
+    event_id: Optional[str] = Field(None, description="Audit event ID, if logged")
+    error: Optional[str] = Field(None, description="Error message, if the update failed")
+
+
 class EmissionRule(BaseModel):
     """Badge emission rule stored in Firestore."""
     rule_id: str
@@ -3,14 +3,18 @@ Mock Moodle API client for CID platform.
 In a real scenario, this would use the Moodle REST API.
 """
 
+from typing import Dict, Any, Optional
 from .lms_client import LMSClient, LMSResource, LMSCourse
+from .student_cache import StudentCache
 
 class MoodleClient(LMSClient):
     """Mock client for Moodle interaction."""
     
-    def __init__(self, api_url: str, token: str):
+    def __init__(self, api_url: str, token: str, student_cache: Optional[StudentCache] = None):
         self.api_url = api_url
         self.token = token
+        # Serves repeated attribute lookups of the same student (optional)
+        self.student_cache = student_cache
 
     def get_course_details(self, course_id: str) -> LMSCourse:
         """
@@ -41,7 +45,20 @@ class MoodleClient(LMSClient):
             resources=[]
         )
 
-    def get_student_attributes(self, student_id: str) -> Dict[str, Any]:
+    def get_student_attributes(self, student_id: str, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Fetch student attributes, through the student cache if there is one.
+        """
+        if self.student_cache is None:
+            return self._fetch_student_attributes(student_id)
+        return self.student_cache.get_attributes(
+            student_id,
+            lambda: self._fetch_student_attributes(student_id),
+            source=self.api_url,
+            refresh=refresh
+        )
+
+    def _fetch_student_attributes(self, student_id: str) -> Dict[str, Any]:
         """
         Mock implementation of fetching student attributes.
         """
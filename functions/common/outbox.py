@@ -0,0 +1,548 @@
+"""
+Durable outbox for badge issuance.
+A validated issuance is persisted once (keyed by its idempotency key) and
+workers drain it later: each message is leased, handled, and then completed,
+retried with backoff, or dead-lettered. Stores are pluggable: in-memory and
+SQLite for local testing, Firestore in production.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from .resilience import RetryPolicy
+from .throttling import RateLimiter
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+logger = logging.getLogger(__name__)
+
+# Message statuses
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+STATUSES = (PENDING, LEASED, DONE, DEAD)
+
+# Outbox retries are spread over minutes: Acreditta or the SIS may be down
+# for a while, and nobody is waiting on the result
+DEFAULT_OUTBOX_RETRY_POLICY = RetryPolicy(max_attempts=8, base_delay=10.0, max_delay=900.0)
+
+
+@dataclass
+class OutboxMessage:
+    """A unit of work in the outbox."""
+    id: str
+    payload: Dict[str, Any]
+    state: Dict[str, Any] = field(default_factory=dict)  # Progress checkpoints kept across attempts
+    status: str = PENDING
+    attempts: int = 0
+    available_at: float = 0.0
+    leased_until: float = 0.0
+    lease_id: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+
+class PermanentError(Exception):
+    """Raised by a handler for failures that retrying cannot fix (dead-letter at once)."""
+
+
+class OutboxStore(ABC):
+    """
+    Persistence for outbox messages.
+
+    ``lease`` hands each available message to a single worker for
+    ``lease_seconds``; if the worker does not complete, retry or dead-letter
+    it in time, the message becomes available again. Those three calls only
+    apply while the caller still holds the lease, and return False otherwise.
+    """
+
+    @abstractmethod
+    def enqueue(self, key: str, payload: Dict[str, Any]) -> bool:
+        """
+        Persist a message once.
+
+        Args:
+            key: Idempotency key; becomes the message ID
+            payload: Message body
+
+        Returns:
+            True if the message was added, False if the key already existed
+        """
+
+    @abstractmethod
+    def lease(self, limit: int, lease_seconds: float) -> List[OutboxMessage]:
+        """Lease up to ``limit`` available messages, oldest first."""
+
+    @abstractmethod
+    def complete(self, message: OutboxMessage) -> bool:
+        """Mark a leased message as done."""
+
+    @abstractmethod
+    def retry(self, message: OutboxMessage, error: str, delay: float) -> bool:
+        """Release a leased message for another attempt after ``delay`` seconds."""
+
+    @abstractmethod
+    def dead_letter(self, message: OutboxMessage, error: str) -> bool:
+        """Move a leased message to the dead letters."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[OutboxMessage]:
+        """Return a message by ID."""
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Return the number of messages per status."""
+
+    @abstractmethod
+    def requeue(self, key: str) -> bool:
+        """Make a dead-lettered message pending again, with its attempts reset."""
+
+
+def _available(message: OutboxMessage, now: float) -> bool:
+    if message.status == PENDING:
+        return message.available_at <= now
+    return message.status == LEASED and message.leased_until <= now
+
+
+class InMemoryOutboxStore(OutboxStore):
+    """Process-local store for tests and local runs."""
+
+    def __init__(self):
+        self._messages: Dict[str, OutboxMessage] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, key: str, payload: Dict[str, Any]) -> bool:
+        now = time.time()
+        with self._lock:
+            if key in self._messages:
+                return False
+            self._messages[key] = OutboxMessage(
+                id=key, payload=dict(payload), available_at=now, created_at=now, updated_at=now
+            )
+            return True
+
+    def lease(self, limit: int, lease_seconds: float) -> List[OutboxMessage]:
+        now = time.time()
+        with self._lock:
+            available = sorted(
+                (m for m in self._messages.values() if _available(m, now)),
+                key=lambda m: (m.available_at, m.created_at)
+            )[:limit]
+            for m in available:
+                m.status = LEASED
+                m.attempts += 1
+                m.leased_until = now + lease_seconds
+                m.lease_id = uuid.uuid4().hex
+                m.updated_at = now
+            return [replace(m, payload=dict(m.payload), state=dict(m.state)) for m in available]
+
+    def _finish(self, message: OutboxMessage, **changes: Any) -> bool:
+        with self._lock:
+            current = self._messages.get(message.id)
+            if current is None or current.status != LEASED or current.lease_id != message.lease_id:
+                return False
+            for name, value in changes.items():
+                setattr(current, name, value)
+            current.state = dict(message.state)
+            current.lease_id = None
+            current.updated_at = time.time()
+            return True
+
+    def complete(self, message: OutboxMessage) -> bool:
+        return self._finish(message, status=DONE, last_error=None)
+
+    def retry(self, message: OutboxMessage, error: str, delay: float) -> bool:
+        return self._finish(message, status=PENDING, last_error=error, available_at=time.time() + delay)
+
+    def dead_letter(self, message: OutboxMessage, error: str) -> bool:
+        return self._finish(message, status=DEAD, last_error=error)
+
+    def get(self, key: str) -> Optional[OutboxMessage]:
+        with self._lock:
+            message = self._messages.get(key)
+            return replace(message) if message else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict.fromkeys(STATUSES, 0)
+            for m in self._messages.values():
+                counts[m.status] += 1
+            return counts
+
+    def requeue(self, key: str) -> bool:
+        with self._lock:
+            message = self._messages.get(key)
+            if message is None or message.status != DEAD:
+                return False
+            message.status = PENDING
+            message.attempts = 0
+            message.available_at = message.updated_at = time.time()
+            return True
+
+
+class SQLiteOutboxStore(OutboxStore):
+    """
+    Store in a SQLite file, shared by every process on the machine.
+
+    Leasing runs in an IMMEDIATE transaction, so concurrent workers never
+    lease the same message.
+    """
+
+    _COLUMNS = (
+        "id", "payload", "state", "status", "attempts", "available_at",
+        "leased_until", "lease_id", "last_error", "created_at", "updated_at"
+    )
+
+    def __init__(self, path: str = "outbox.db"):
+        """
+        Initialize the store, creating the table if needed.
+
+        Args:
+            path: Database file (":memory:" for a private in-memory database)
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    leased_until REAL NOT NULL DEFAULT 0,
+                    lease_id TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_available ON outbox (status, available_at)"
+            )
+
+    def _row_to_message(self, row: tuple) -> OutboxMessage:
+        data = dict(zip(self._COLUMNS, row))
+        data["payload"] = json.loads(data["payload"])
+        data["state"] = json.loads(data["state"])
+        return OutboxMessage(**data)
+
+    def enqueue(self, key: str, payload: Dict[str, Any]) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (id, payload, status, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(payload, default=str), PENDING, now, now, now)
+            )
+            return cursor.rowcount == 1
+
+    def lease(self, limit: int, lease_seconds: float) -> List[OutboxMessage]:
+        now = time.time()
+        columns = ", ".join(self._COLUMNS)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM outbox "
+                    "WHERE (status = ? AND available_at <= ?) OR (status = ? AND leased_until <= ?) "
+                    "ORDER BY available_at, created_at LIMIT ?",
+                    (PENDING, now, LEASED, now, limit)
+                ).fetchall()
+                messages = []
+                for row in rows:
+                    message = self._row_to_message(row)
+                    message.status = LEASED
+                    message.attempts += 1
+                    message.leased_until = now + lease_seconds
+                    message.lease_id = uuid.uuid4().hex
+                    message.updated_at = now
+                    self._conn.execute(
+                        "UPDATE outbox SET status = ?, attempts = ?, leased_until = ?, lease_id = ?, "
+                        "updated_at = ? WHERE id = ?",
+                        (LEASED, message.attempts, message.leased_until, message.lease_id, now, message.id)
+                    )
+                    messages.append(message)
+                self._conn.execute("COMMIT")
+                return messages
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _finish(self, message: OutboxMessage, status: str, error: Optional[str], available_at: float) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET status = ?, state = ?, last_error = ?, available_at = ?, "
+                "lease_id = NULL, updated_at = ? WHERE id = ? AND status = ? AND lease_id = ?",
+                (status, json.dumps(message.state, default=str), error, available_at, time.time(),
+                 message.id, LEASED, message.lease_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, message: OutboxMessage) -> bool:
+        return self._finish(message, DONE, None, message.available_at)
+
+    def retry(self, message: OutboxMessage, error: str, delay: float) -> bool:
+        return self._finish(message, PENDING, error, time.time() + delay)
+
+    def dead_letter(self, message: OutboxMessage, error: str) -> bool:
+        return self._finish(message, DEAD, error, message.available_at)
+
+    def get(self, key: str) -> Optional[OutboxMessage]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM outbox WHERE id = ?", (key,)
+            ).fetchone()
+        return self._row_to_message(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        with self._lock:
+            for status, count in self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"):
+                counts[status] = count
+        return counts
+
+    def requeue(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = 0, available_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (PENDING, now, now, key, DEAD)
+            )
+            return cursor.rowcount == 1
+
+
+class FirestoreOutboxStore(OutboxStore):
+    """
+    Store in a Firestore collection, shared by every instance.
+
+    Leases and lease-guarded updates are conditional writes on the
+    document's update time, so two workers never both win a message.
+    """
+
+    def __init__(self, db: "firestore.Client", collection: str = "outbox_emision"):
+        """
+        Initialize the store.
+
+        Args:
+            db: Firestore client
+            collection: Collection holding the messages
+        """
+        self.db = db
+        self.collection = db.collection(collection)
+
+    @staticmethod
+    def _to_message(snapshot: Any) -> OutboxMessage:
+        data = snapshot.to_dict()
+        return OutboxMessage(
+            id=snapshot.id,
+            **{k: data[k] for k in OutboxMessage.__dataclass_fields__ if k != "id" and k in data}
+        )
+
+    def enqueue(self, key: str, payload: Dict[str, Any]) -> bool:
+        from google.api_core.exceptions import AlreadyExists
+
+        now = time.time()
+        message = OutboxMessage(id=key, payload=payload, available_at=now, created_at=now, updated_at=now)
+        data = {k: v for k, v in message.__dict__.items() if k != "id"}
+        try:
+            self.collection.document(key).create(data)
+            return True
+        except AlreadyExists:
+            return False
+
+    def lease(self, limit: int, lease_seconds: float) -> List[OutboxMessage]:
+        from google.api_core.exceptions import FailedPrecondition
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        now = time.time()
+        candidates = list(
+            self.collection.where(filter=FieldFilter("status", "==", PENDING))
+            .where(filter=FieldFilter("available_at", "<=", now))
+            .order_by("available_at").limit(limit).stream()
+        )
+        if len(candidates) < limit:
+            candidates += list(
+                self.collection.where(filter=FieldFilter("status", "==", LEASED))
+                .where(filter=FieldFilter("leased_until", "<=", now))
+                .order_by("leased_until").limit(limit - len(candidates)).stream()
+            )
+
+        leased = []
+        for snapshot in candidates:
+            message = self._to_message(snapshot)
+            message.status = LEASED
+            message.attempts += 1
+            message.leased_until = now + lease_seconds
+            message.lease_id = uuid.uuid4().hex
+            message.updated_at = now
+            try:
+                snapshot.reference.update(
+                    {
+                        "status": LEASED,
+                        "attempts": message.attempts,
+                        "leased_until": message.leased_until,
+                        "lease_id": message.lease_id,
+                        "updated_at": now,
+                    },
+                    option=self.db.write_option(last_update_time=snapshot.update_time)
+                )
+            except FailedPrecondition:
+                continue  # Another worker leased it first
+            leased.append(message)
+        return leased
+
+    def _finish(self, message: OutboxMessage, changes: Dict[str, Any]) -> bool:
+        from google.api_core.exceptions import FailedPrecondition
+
+        ref = self.collection.document(message.id)
+        snapshot = ref.get()
+        data = snapshot.to_dict() if snapshot.exists else None
+        if not data or data.get("status") != LEASED or data.get("lease_id") != message.lease_id:
+            return False
+        try:
+            ref.update(
+                {**changes, "state": message.state, "lease_id": None, "updated_at": time.time()},
+                option=self.db.write_option(last_update_time=snapshot.update_time)
+            )
+            return True
+        except FailedPrecondition:
+            return False
+
+    def complete(self, message: OutboxMessage) -> bool:
+        return self._finish(message, {"status": DONE, "last_error": None})
+
+    def retry(self, message: OutboxMessage, error: str, delay: float) -> bool:
+        return self._finish(message, {"status": PENDING, "last_error": error, "available_at": time.time() + delay})
+
+    def dead_letter(self, message: OutboxMessage, error: str) -> bool:
+        return self._finish(message, {"status": DEAD, "last_error": error})
+
+    def get(self, key: str) -> Optional[OutboxMessage]:
+        snapshot = self.collection.document(key).get()
+        return self._to_message(snapshot) if snapshot.exists else None
+
+    def counts(self) -> Dict[str, int]:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        counts = {}
+        for status in STATUSES:
+            result = self.collection.where(filter=FieldFilter("status", "==", status)).count().get()
+            counts[status] = int(result[0][0].value)
+        return counts
+
+    def requeue(self, key: str) -> bool:
+        ref = self.collection.document(key)
+        snapshot = ref.get()
+        if not snapshot.exists or snapshot.to_dict().get("status") != DEAD:
+            return False
+        now = time.time()
+        ref.update({"status": PENDING, "attempts": 0, "available_at": now, "updated_at": now})
+        return True
+
+
+class OutboxWorker:
+    """Leases outbox messages and runs a handler on each."""
+
+    def __init__(
+        self,
+        store: OutboxStore,
+        handler: Callable[[OutboxMessage], None],
+        retry_policy: Optional[RetryPolicy] = None,
+        lease_seconds: float = 120.0,
+        batch_size: int = 10,
+        max_workers: int = 4,
+        rate_limit: Optional[float] = None
+    ):
+        """
+        Initialize the worker.
+
+        Args:
+            store: Outbox store to drain
+            handler: Processes one message; raises to fail it (PermanentError
+                to dead-letter it at once). It may record progress in
+                ``message.state``, which is saved on retry.
+            retry_policy: Attempts and backoff per message
+            lease_seconds: How long a leased message is reserved for this worker
+            batch_size: Messages leased per round
+            max_workers: Messages handled concurrently
+            rate_limit: Messages started per second (None = unlimited)
+        """
+        self.store = store
+        self.handler = handler
+        self.retry_policy = retry_policy or DEFAULT_OUTBOX_RETRY_POLICY
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate_limit, burst=max_workers) if rate_limit else None
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Lease one batch and process it.
+
+        Returns:
+            Counters: leased, completed, retried, dead, lost (lease expired
+            before the outcome could be saved)
+        """
+        stats = {"leased": 0, "completed": 0, "retried": 0, "dead": 0, "lost": 0}
+        messages = self.store.lease(self.batch_size, self.lease_seconds)
+        stats["leased"] = len(messages)
+        if not messages:
+            return stats
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(messages))) as pool:
+            for outcome in pool.map(self._process, messages):
+                stats[outcome] += 1
+        return stats
+
+    def drain(self, max_seconds: Optional[float] = None) -> Dict[str, int]:
+        """
+        Process batches until nothing is available or the time budget runs out.
+
+        Args:
+            max_seconds: Stop leasing new batches after this many seconds
+
+        Returns:
+            Counters summed over every batch
+        """
+        totals = {"leased": 0, "completed": 0, "retried": 0, "dead": 0, "lost": 0}
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        while deadline is None or time.monotonic() < deadline:
+            stats = self.run_once()
+            for name, value in stats.items():
+                totals[name] += value
+            if not stats["leased"]:
+                break
+        logger.info(f"Outbox drain finished: {totals}")
+        return totals
+
+    def _process(self, message: OutboxMessage) -> str:
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        try:
+            self.handler(message)
+        except PermanentError as e:
+            logger.error(f"Outbox message {message.id} failed permanently: {str(e)}")
+            return "dead" if self.store.dead_letter(message, str(e)) else "lost"
+        except Exception as e:
+            if not self.retry_policy.should_retry(message.attempts):
+                logger.error(f"Outbox message {message.id} dead-lettered after {message.attempts} attempts: {str(e)}")
+                return "dead" if self.store.dead_letter(message, str(e)) else "lost"
+            delay = self.retry_policy.delay(message.attempts)
+            logger.warning(f"Outbox message {message.id} failed ({str(e)}), retry in {delay:.0f}s")
+            return "retried" if self.store.retry(message, str(e), delay) else "lost"
+        return "completed" if self.store.complete(message) else "lost"
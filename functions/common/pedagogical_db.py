@@ -14,9 +14,9 @@ from .pedagogical_models import (
 class PedagogicalDBClient:
     """Firestore database client for Pedagogical operations."""
     
-    def __init__(self, config: Optional[Config] = None):
+    def __init__(self, config: Optional[Config] = None, db: Optional[firestore.Client] = None):
         self.config = config or Config.from_env()
-        self.db = firestore.Client(project=self.config.project_id)
+        self.db = db or firestore.Client(project=self.config.project_id)
         
         # Collection names
         self.taxonomies_col = "pedagogical_taxonomies"
@@ -65,6 +65,12 @@ class PedagogicalDBClient:
             return None
         return LearningPath(**doc.to_dict())
 
+    def list_learning_paths(self, status: Optional[str] = None) -> List[LearningPath]:
+        query = self.db.collection(self.paths_col)
+        if status:
+            query = query.where("status", "==", status)
+        return [LearningPath(**doc.to_dict()) for doc in query.stream()]
+
     # Evidence Mapping Operations
     def create_evidence_mapping(self, mapping: EvidenceMapping) -> str:
         doc_ref = self.db.collection(self.evidence_col).document(mapping.id)
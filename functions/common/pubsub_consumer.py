@@ -0,0 +1,226 @@
+"""
+Batched consumer of a Pub/Sub pull subscription.
+Messages are pulled up to ``max_messages`` at a time and handed to a batch
+handler, then acknowledged one by one: handled messages are acked, those
+to retry are nacked for redelivery, and messages that cannot be parsed are
+published to a dead-letter topic (then acked) without holding up the rest
+of the batch.
+"""
+
+import json
+import logging
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from google.cloud import pubsub_v1
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of a message
+ACKED = "acked"
+NACKED = "nacked"
+DEAD_LETTERED = "dead_lettered"
+
+# Longest time a dead-letter publish may take before the message is nacked
+DEAD_LETTER_PUBLISH_TIMEOUT = 30.0
+
+
+def parse_json_message(message: "pubsub_v1.types.PubsubMessage") -> Dict[str, Any]:
+    """
+    Decode a message carrying a JSON object.
+
+    Raises:
+        ValueError: If the data is not a JSON object
+    """
+    try:
+        payload = json.loads(message.data.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Message data is not JSON: {str(e)}")
+    if not isinstance(payload, dict):
+        raise ValueError("Message data must be a JSON object")
+    return payload
+
+
+class PubSubBatchConsumer:
+    """
+    Pulls, handles and acknowledges messages in batches.
+
+    ``parse`` turns one message (its data, ID and attributes) into the item
+    passed to the handler, raising ValueError (or pydantic's
+    ValidationError) if the message is invalid. ``handler`` receives the
+    parsed items of a batch and returns one bool per item: True to ack it,
+    False to nack it (Pub/Sub redelivers it, and after the subscription's
+    max delivery attempts moves it to its dead-letter topic). If the
+    handler raises, the whole batch is nacked.
+    """
+
+    def __init__(
+        self,
+        subscriber: "pubsub_v1.SubscriberClient",
+        subscription: str,
+        handler: Callable[[List[Any]], List[bool]],
+        parse: Callable[["pubsub_v1.types.PubsubMessage"], Any] = parse_json_message,
+        publisher: Optional["pubsub_v1.PublisherClient"] = None,
+        dead_letter_topic: Optional[str] = None,
+        max_messages: int = 100,
+        pull_timeout: float = 10.0
+    ):
+        """
+        Initialize the consumer.
+
+        Args:
+            subscriber: Pub/Sub subscriber client
+            subscription: Full subscription path (projects/.../subscriptions/...)
+            handler: Callable handling a batch of parsed items
+            parse: Callable turning a message into an item
+            publisher: Pub/Sub publisher client, required for dead-lettering
+            dead_letter_topic: Full topic path receiving invalid messages
+                (if not set, they are nacked and left to the subscription's
+                dead-letter policy)
+            max_messages: Messages pulled per batch
+            pull_timeout: Longest time a pull waits for messages, in seconds
+        """
+        if dead_letter_topic and publisher is None:
+            raise ValueError("A publisher is required to dead-letter messages")
+        self.subscriber = subscriber
+        self.subscription = subscription
+        self.handler = handler
+        self.parse = parse
+        self.publisher = publisher
+        self.dead_letter_topic = dead_letter_topic
+        self.max_messages = max_messages
+        self.pull_timeout = pull_timeout
+        self.outcomes: Counter = Counter()
+        self.batches = 0
+
+    def drain(self, max_seconds: float, batch_budget: float = 0.0) -> Dict[str, Any]:
+        """
+        Consume batches until the subscription is empty or time runs out.
+
+        A batch is only pulled if the time left covers the pull plus
+        ``batch_budget`` or the longest batch consumed so far, whichever is
+        longer, so a batch pulled near the end is not cut off mid-way
+        (its messages neither acked nor nacked).
+
+        Args:
+            max_seconds: Time budget of the whole drain
+            batch_budget: Time allowed to handle one batch, in seconds
+
+        Returns:
+            Counters of this drain (see stats)
+        """
+        deadline = time.monotonic() + max_seconds
+        longest = batch_budget
+        before = self.stats()
+        while deadline - time.monotonic() >= self.pull_timeout + longest:
+            started = time.monotonic()
+            if not self.consume_batch():
+                break
+            longest = max(longest, time.monotonic() - started)
+        after = self.stats()
+        return {
+            "batches": after["batches"] - before["batches"],
+            **{k: after[k] - before[k] for k in (ACKED, NACKED, DEAD_LETTERED)},
+        }
+
+    def consume_batch(self) -> int:
+        """
+        Pull one batch, handle it and acknowledge each message.
+
+        Returns:
+            Number of messages received (0 when the subscription is empty)
+        """
+        from google.api_core.exceptions import DeadlineExceeded
+
+        try:
+            response = self.subscriber.pull(
+                request={"subscription": self.subscription, "max_messages": self.max_messages},
+                timeout=self.pull_timeout
+            )
+        except DeadlineExceeded:
+            return 0
+        received = list(response.received_messages)
+        if not received:
+            return 0
+        self.batches += 1
+
+        items, item_ack_ids, invalid = [], [], []
+        for message in received:
+            try:
+                items.append(self.parse(message.message))
+                item_ack_ids.append(message.ack_id)
+            except ValueError as e:  # pydantic's ValidationError is a ValueError
+                invalid.append((message, str(e)))
+
+        ack_ids, nack_ids = [], []
+        if items:
+            try:
+                done = self.handler(items)
+                if len(done) != len(items):
+                    raise RuntimeError(f"Handler returned {len(done)} results for {len(items)} messages")
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} messages failed, nacking it: {str(e)}", exc_info=True)
+                done = [False] * len(items)
+            for ack_id, ok in zip(item_ack_ids, done):
+                (ack_ids if ok else nack_ids).append(ack_id)
+        self.outcomes[ACKED] += len(ack_ids)
+
+        dead, failed = self._dead_letter(invalid)
+        ack_ids.extend(dead)
+        nack_ids.extend(failed)
+        self.outcomes[DEAD_LETTERED] += len(dead)
+        self.outcomes[NACKED] += len(nack_ids)
+
+        if ack_ids:
+            self.subscriber.acknowledge(request={"subscription": self.subscription, "ack_ids": ack_ids})
+        if nack_ids:
+            self.subscriber.modify_ack_deadline(request={
+                "subscription": self.subscription,
+                "ack_ids": nack_ids,
+                "ack_deadline_seconds": 0,
+            })
+        logger.info(
+            f"Consumed {len(received)} messages: {len(ack_ids) - len(dead)} acked, "
+            f"{len(nack_ids)} nacked, {len(dead)} dead-lettered"
+        )
+        return len(received)
+
+    def stats(self) -> Dict[str, int]:
+        """Batches pulled and messages acked, nacked and dead-lettered so far."""
+        return {"batches": self.batches, **{k: self.outcomes[k] for k in (ACKED, NACKED, DEAD_LETTERED)}}
+
+    def _dead_letter(self, invalid: List[Tuple[Any, str]]) -> Tuple[List[str], List[str]]:
+        """
+        Publish invalid messages to the dead-letter topic.
+
+        Returns:
+            (ack IDs of published messages, ack IDs to nack)
+        """
+        if not invalid:
+            return [], []
+        if not self.dead_letter_topic:
+            for message, error in invalid:
+                logger.warning(f"Invalid message {message.message.message_id}: {error}")
+            return [], [message.ack_id for message, _ in invalid]
+
+        futures = []
+        for message, error in invalid:
+            logger.warning(f"Dead-lettering invalid message {message.message.message_id}: {error}")
+            futures.append(self.publisher.publish(
+                self.dead_letter_topic,
+                message.message.data,
+                error=error[:1024],
+                source_subscription=self.subscription,
+                source_message_id=message.message.message_id
+            ))
+        published, failed = [], []
+        for (message, _), future in zip(invalid, futures):
+            try:
+                future.result(timeout=DEAD_LETTER_PUBLISH_TIMEOUT)
+                published.append(message.ack_id)
+            except Exception as e:
+                logger.error(f"Could not dead-letter message {message.message.message_id}: {str(e)}")
+                failed.append(message.ack_id)
+        return published, failed
@@ -0,0 +1,234 @@
+"""
+Compiler for advancement rules.
+Turns an AdvancementRule tree into nested Python closures once, so repeated
+evaluations skip the isinstance dispatch, field splitting and operator lookup
+done by RuleEvaluator.evaluate.
+"""
+
+import hashlib
+import operator
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from .pedagogical_models import AdvancementRule, Condition, LearningPath, RuleOperator
+from .rule_cost import CostModel
+
+CompiledRule = Callable[[Dict[str, Any]], bool]
+
+# Operator name -> callable(fact_value, target). "contains" checks target in value.
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "contains": operator.contains,
+}
+
+
+def _never(facts: Dict[str, Any]) -> bool:
+    return False
+
+
+def _always(facts: Dict[str, Any]) -> bool:
+    return True
+
+
+def _compile_condition(condition: Condition) -> CompiledRule:
+    op = OPERATORS.get(condition.operator)
+    if op is None:
+        return _never
+
+    target = condition.value
+    path = tuple(condition.field.split('.'))
+
+    if len(path) == 1:
+        key = path[0]
+
+        def check(facts: Dict[str, Any]) -> bool:
+            val = facts.get(key)
+            if val is None:
+                return False
+            return op(val, target)
+
+        return check
+
+    def check_nested(facts: Dict[str, Any]) -> bool:
+        val = facts
+        for part in path:
+            if isinstance(val, dict):
+                val = val.get(part)
+            else:
+                return False
+        if val is None:
+            return False
+        return op(val, target)
+
+    return check_nested
+
+
+def _compile(rule: Union[AdvancementRule, Condition], cost_model: Optional[CostModel]) -> CompiledRule:
+    if isinstance(rule, Condition):
+        return _compile_condition(rule)
+
+    if not isinstance(rule, AdvancementRule):
+        return _never
+
+    conditions = rule.conditions
+    if cost_model is not None:
+        conditions = cost_model.order(conditions)
+    children = tuple(_compile(c, cost_model) for c in conditions)
+    if not children:
+        return _always  # Empty rule is considered met
+
+    if rule.logic_operator == RuleOperator.AND:
+        return lambda facts: all(c(facts) for c in children)
+    if rule.logic_operator == RuleOperator.OR:
+        return lambda facts: any(c(facts) for c in children)
+    if rule.logic_operator == RuleOperator.NOT:
+        return lambda facts: not any(c(facts) for c in children)  # Simplified NOT logic
+
+    return _never
+
+
+class RuleCompiler:
+    """
+    Compiles rules to closures and caches them by rule id and content hash.
+
+    Compiling the same rule object again skips the hash: closures are also
+    remembered per object for as long as it lives, so rules must not be
+    changed in place once compiled. Learning paths are compiled as a whole
+    and cached by path id and ``updated_at`` (see compile_path).
+    """
+
+    def __init__(self, max_size: int = 1024, max_paths: int = 64):
+        self.max_size = max_size
+        self.max_paths = max_paths
+        self._cache: "OrderedDict[Tuple, CompiledRule]" = OrderedDict()
+        # id(rule) -> (weak reference to the rule, cost token, closure)
+        self._by_object: Dict[int, Tuple[weakref.ref, Any, CompiledRule]] = {}
+        self._paths: "OrderedDict[Tuple, Dict[str, CompiledRule]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(rule: Union[AdvancementRule, Condition]) -> Tuple[str, str]:
+        """Return the (rule id, content hash) key of a rule."""
+        digest = hashlib.sha256(rule.model_dump_json().encode("utf-8")).hexdigest()
+        return getattr(rule, "id", ""), digest
+
+    def compile(
+        self,
+        rule: Union[AdvancementRule, Condition],
+        cost_model: Optional[CostModel] = None
+    ) -> CompiledRule:
+        """
+        Compile a rule or condition, reusing a cached closure when possible.
+
+        Args:
+            rule: The rule or condition to compile.
+            cost_model: Optional cost model used to order children cheapest first.
+
+        Returns:
+            A callable taking a facts dictionary and returning True if the
+            rule is met, with the same semantics as RuleEvaluator.evaluate.
+        """
+        token = cost_model.cache_token if cost_model else None
+        entry = self._by_object.get(id(rule))
+        if entry is not None and entry[0]() is rule and entry[1] == token:
+            return entry[2]
+
+        key = self.cache_key(rule) + (token,)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+        if compiled is None:
+            compiled = _compile(rule, cost_model)
+            with self._lock:
+                self._cache[key] = compiled
+                if len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+
+        self._remember(rule, token, compiled)
+        return compiled
+
+    def compile_path(
+        self,
+        path: LearningPath,
+        cost_model: Optional[CostModel] = None
+    ) -> Dict[str, CompiledRule]:
+        """
+        Compile the requirements of every node of a learning path.
+
+        The closures are cached by path id and ``updated_at``, so a path
+        loaded again is not recompiled until it is saved with a new
+        ``updated_at``.
+
+        Args:
+            path: Learning path whose node requirements are compiled.
+            cost_model: Optional cost model used to order children cheapest first.
+
+        Returns:
+            Node ID -> compiled requirements, for the nodes that have them
+        """
+        key = (path.id, path.updated_at, cost_model.cache_token if cost_model else None)
+        with self._lock:
+            compiled = self._paths.get(key)
+            if compiled is not None:
+                self._paths.move_to_end(key)
+                return compiled
+
+        compiled = {
+            node.id: _compile(node.requirements, cost_model)
+            for node in path.nodes
+            if node.requirements
+        }
+
+        with self._lock:
+            self._paths[key] = compiled
+            if len(self._paths) > self.max_paths:
+                self._paths.popitem(last=False)
+        return compiled
+
+    def _remember(self, rule: Union[AdvancementRule, Condition], token: Any, compiled: CompiledRule) -> None:
+        """Remember the closure of a rule object until the object is freed."""
+        rule_id = id(rule)
+
+        def forget(ref: weakref.ref) -> None:
+            entry = self._by_object.get(rule_id)
+            if entry is not None and entry[0] is ref:
+                self._by_object.pop(rule_id, None)
+
+        self._by_object[rule_id] = (weakref.ref(rule, forget), token, compiled)
+
+    def clear(self) -> None:
+        """Drop all compiled rules and paths."""
+        with self._lock:
+            self._cache.clear()
+            self._by_object.clear()
+            self._paths.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+_default_compiler = RuleCompiler()
+
+
+def compile_rule(
+    rule: Union[AdvancementRule, Condition],
+    cost_model: Optional[CostModel] = None
+) -> CompiledRule:
+    """Compile a rule with the process-wide RuleCompiler."""
+    return _default_compiler.compile(rule, cost_model)
+
+
+def compile_path(
+    path: LearningPath,
+    cost_model: Optional[CostModel] = None
+) -> Dict[str, CompiledRule]:
+    """Compile the node requirements of a path with the process-wide RuleCompiler."""
+    return _default_compiler.compile_path(path, cost_model)
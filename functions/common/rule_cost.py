@@ -0,0 +1,62 @@
+"""
+Cost model for advancement rule evaluation.
+Lets cheap local-fact conditions run before expensive ones (e.g. facts that
+must be fetched from the SIS or LMS) so short-circuiting skips the latter.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .pedagogical_models import AdvancementRule, Condition
+
+
+class CostModel:
+    """Estimates the cost of evaluating conditions by their field path."""
+
+    def __init__(self, field_costs: Optional[Dict[str, float]] = None, default_cost: float = 1.0):
+        """
+        Initialize the cost model.
+
+        Args:
+            field_costs: Cost per field path prefix, e.g. {"attribute": 10.0}
+                applies to "attribute.becado". The longest matching prefix wins.
+            default_cost: Cost of conditions whose field matches no prefix
+        """
+        self.field_costs = dict(field_costs or {})
+        self.default_cost = default_cost
+        self._field_cache: Dict[str, float] = {}
+
+    @property
+    def cache_token(self) -> Tuple:
+        """Hashable fingerprint used to key compiled rules."""
+        return (tuple(sorted(self.field_costs.items())), self.default_cost)
+
+    def field_cost(self, field: str) -> float:
+        """Return the cost of reading a field path."""
+        cost = self._field_cache.get(field)
+        if cost is not None:
+            return cost
+
+        cost = self.default_cost
+        best = -1
+        for prefix, prefix_cost in self.field_costs.items():
+            if (field == prefix or field.startswith(prefix + ".")) and len(prefix) > best:
+                cost, best = prefix_cost, len(prefix)
+
+        self._field_cache[field] = cost
+        return cost
+
+    def cost(self, rule: Union[AdvancementRule, Condition]) -> float:
+        """Return the worst-case cost of evaluating a rule or condition."""
+        if isinstance(rule, Condition):
+            return self.field_cost(rule.field)
+        return sum(self.cost(c) for c in rule.conditions)
+
+    def order(
+        self, conditions: Sequence[Union[AdvancementRule, Condition]]
+    ) -> List[Union[AdvancementRule, Condition]]:
+        """Return conditions sorted cheapest first (stable for equal costs)."""
+        return sorted(conditions, key=self.cost)
+
+
+# Student attributes come from the LMS/SIS; everything else is local to the event
+DEFAULT_COST_MODEL = CostModel({"attribute": 10.0})
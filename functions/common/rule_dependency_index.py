@@ -0,0 +1,207 @@
+"""
+Reverse index from fact fields to the advancement rules that read them.
+Lets event handlers evaluate only the rules affected by the fields an event
+changed (e.g. "score", "activity_score_q1", "attribute.becado") instead of
+every rule on a path.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from .pedagogical_models import AdvancementRule, Condition, LearningPath
+from .rule_compiler import CompiledRule, compile_rule
+from .rule_cost import CostModel
+
+
+@dataclass
+class DependentRule:
+    """A rule registered in the index together with where it came from."""
+    rule: AdvancementRule
+    course_id: Optional[str] = None  # None = applies to every course
+    path_id: Optional[str] = None
+    node_id: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    check: Optional[CompiledRule] = field(default=None, repr=False)
+
+    @property
+    def key(self) -> Tuple[Optional[str], Optional[str], str]:
+        """Identity of the entry within the index."""
+        return (self.path_id, self.node_id, self.rule.id)
+
+
+def rule_fields(rule: Union[AdvancementRule, Condition]) -> Set[str]:
+    """Return the field paths referenced by a rule's conditions."""
+    if isinstance(rule, Condition):
+        return {rule.field}
+    fields: Set[str] = set()
+    for c in rule.conditions:
+        fields |= rule_fields(c)
+    return fields
+
+
+def event_fields(evaluation_id: str) -> Set[str]:
+    """Return the fact fields changed by a Moodle grade event."""
+    return {
+        "score",
+        f"activity_score_{evaluation_id}",
+        f"activity_completed_{evaluation_id}",
+    }
+
+
+def _ancestors(path: str) -> List[str]:
+    parts = path.split('.')
+    return ['.'.join(parts[:i]) for i in range(1, len(parts))]
+
+
+class RuleDependencyIndex:
+    """Maps (course, field path) to the rules whose conditions read that field."""
+
+    def __init__(self, cost_model: Optional[CostModel] = None):
+        """
+        Initialize the index.
+
+        Args:
+            cost_model: Cost model used when compiling registered rules
+        """
+        self.cost_model = cost_model
+        self._by_field: Dict[Tuple[Optional[str], str], Dict[tuple, DependentRule]] = {}
+        self._descendants: Dict[str, Set[str]] = {}
+        self._entries: Dict[tuple, Tuple[DependentRule, Set[str]]] = {}
+        self._order: Dict[tuple, int] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_rule(
+        self,
+        rule: AdvancementRule,
+        course_id: Optional[str] = None,
+        path_id: Optional[str] = None,
+        node_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> DependentRule:
+        """
+        Register a rule, replacing any previous entry with the same identity.
+
+        Args:
+            rule: Rule to register
+            course_id: Course the rule applies to (None = every course)
+            path_id: Learning path the rule belongs to, if any
+            node_id: Path node the rule guards, if any
+            metadata: Free-form data returned with the rule (e.g. badge info)
+
+        Returns:
+            The registered DependentRule, with ``check`` set to the compiled rule
+        """
+        dependent = DependentRule(
+            rule, course_id, path_id, node_id, dict(metadata or {}),
+            check=compile_rule(rule, self.cost_model)
+        )
+        fields = rule_fields(rule)
+
+        with self._lock:
+            self._remove(dependent.key)
+            self._entries[dependent.key] = (dependent, fields)
+            self._order[dependent.key] = self._seq
+            self._seq += 1
+            for f in fields:
+                self._by_field.setdefault((course_id, f), {})[dependent.key] = dependent
+                for ancestor in _ancestors(f):
+                    self._descendants.setdefault(ancestor, set()).add(f)
+        return dependent
+
+    def add_path(self, path: LearningPath) -> int:
+        """
+        Register the requirements of every node of a learning path.
+
+        Nodes are indexed under their reference_id, which is the course_id
+        fact used when the node is evaluated.
+
+        Args:
+            path: Learning path to index
+
+        Returns:
+            Number of rules registered
+        """
+        count = 0
+        for node in path.nodes:
+            if node.requirements is None:
+                continue
+            self.add_rule(
+                node.requirements,
+                course_id=node.reference_id,
+                path_id=path.id,
+                node_id=node.id,
+            )
+            count += 1
+        return count
+
+    def remove_path(self, path_id: str, keep: Optional[Set[tuple]] = None) -> None:
+        """
+        Drop every rule registered for a learning path.
+
+        Args:
+            path_id: Learning path whose rules are dropped
+            keep: Entry keys (see DependentRule.key) to leave in place, e.g.
+                the rules just re-registered for a reloaded path
+        """
+        keep = keep or set()
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path_id and k not in keep]:
+                self._remove(key)
+
+    def path_ids(self) -> Set[str]:
+        """Return the learning paths that have rules in the index."""
+        with self._lock:
+            return {k[0] for k in self._entries if k[0] is not None}
+
+    def remove_rule(self, rule_id: str) -> None:
+        """Drop every entry of a rule."""
+        with self._lock:
+            for key in [k for k in self._entries if k[2] == rule_id]:
+                self._remove(key)
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        dependent, fields = entry
+        self._order.pop(key, None)
+        for f in fields:
+            bucket = self._by_field.get((dependent.course_id, f))
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._by_field[(dependent.course_id, f)]
+
+    def affected(self, course_id: Optional[str], changed_fields: Iterable[str]) -> List[DependentRule]:
+        """
+        Return the rules that read any of the changed fields.
+
+        A change to "attribute" affects rules reading "attribute.becado" and
+        vice versa. Rules registered without a course are always candidates.
+
+        Args:
+            course_id: Course the change belongs to
+            changed_fields: Field paths whose value changed
+
+        Returns:
+            Affected rules in registration order, without duplicates
+        """
+        candidates: Set[str] = set()
+        for f in changed_fields:
+            candidates.add(f)
+            candidates.update(_ancestors(f))
+            candidates.update(self._descendants.get(f, ()))
+
+        courses = (course_id, None) if course_id is not None else (None,)
+        found: Dict[tuple, DependentRule] = {}
+        with self._lock:
+            for course in courses:
+                for f in candidates:
+                    found.update(self._by_field.get((course, f), {}))
+            order = self._order
+            return sorted(found.values(), key=lambda d: order[d.key])
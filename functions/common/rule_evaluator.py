@@ -3,42 +3,157 @@ Logic evaluator for complex advancement rules.
 Supports boolean logic (AND, OR, NOT) and various operators.
 """
 
-from typing import Any, Dict, Union
-from .pedagogical_models import AdvancementRule, Condition, RuleOperator
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Union
+from .pedagogical_models import AdvancementRule, Condition, LearningPath, RuleOperator
+from .rule_compiler import CompiledRule, compile_path, compile_rule
+from .rule_cost import CostModel
+
+
+@dataclass
+class EvaluationStats:
+    """Counters collected while evaluating rules."""
+    conditions_evaluated: int = 0
+    conditions_skipped: int = 0
+
+
+class LazyFacts(dict):
+    """
+    Facts dictionary whose expensive entries are loaded on first access.
+    
+    Loaders are only called when a condition actually reads the fact, so a
+    short-circuited rule never pays for a SIS/LMS lookup it does not need.
+    """
+    
+    def __init__(self, facts: Dict[str, Any], loaders: Dict[str, Callable[[], Any]]):
+        super().__init__(facts)
+        self._loaders = dict(loaders)
+    
+    def _load(self, key: str) -> None:
+        loader = self._loaders.pop(key, None)
+        if loader is not None:
+            self[key] = loader()
+    
+    def get(self, key, default=None):
+        if key in self._loaders:
+            self._load(key)
+        return super().get(key, default)
+    
+    def __getitem__(self, key):
+        if key in self._loaders:
+            self._load(key)
+        return super().__getitem__(key)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._loaders or super().__contains__(key)
+
+
+def count_conditions(rule: Union[AdvancementRule, Condition]) -> int:
+    """Count the leaf conditions of a rule."""
+    if isinstance(rule, Condition):
+        return 1
+    return sum(count_conditions(c) for c in rule.conditions)
+
 
 class RuleEvaluator:
     """Evaluates complex advancement rules against a set of facts."""
     
     @staticmethod
-    def evaluate(rule: Union[AdvancementRule, Condition], facts: Dict[str, Any]) -> bool:
+    def evaluate(
+        rule: Union[AdvancementRule, Condition],
+        facts: Dict[str, Any],
+        cost_model: Optional[CostModel] = None,
+        stats: Optional[EvaluationStats] = None
+    ) -> bool:
         """
         Recursively evaluate a rule or condition against the provided facts.
         
+        Evaluation short-circuits: an AND stops at the first unmet condition,
+        OR and NOT stop at the first met one.
+        
         Args:
             rule: The rule or condition to evaluate.
             facts: A dictionary of facts (e.g., student attributes, scores).
+            cost_model: Optional cost model; cheaper conditions run first.
+            stats: Optional counters of evaluated and skipped conditions.
             
         Returns:
             True if the rule/condition is met, False otherwise.
         """
         if isinstance(rule, Condition):
+            if stats is not None:
+                stats.conditions_evaluated += 1
             return RuleEvaluator._evaluate_condition(rule, facts)
         
         if isinstance(rule, AdvancementRule):
-            results = [RuleEvaluator.evaluate(c, facts) for c in rule.conditions]
-            
-            if not results:
+            conditions = rule.conditions
+            if not conditions:
                 return True  # Empty rule is considered met
             
+            if cost_model is not None:
+                conditions = cost_model.order(conditions)
+            
+            # Value of a child that decides the whole rule
+            stop_on = rule.logic_operator != RuleOperator.AND
+            decided = False
+            for i, c in enumerate(conditions):
+                if RuleEvaluator.evaluate(c, facts, cost_model, stats) == stop_on:
+                    decided = True
+                    if stats is not None:
+                        stats.conditions_skipped += sum(
+                            count_conditions(rest) for rest in conditions[i + 1:]
+                        )
+                    break
+            
             if rule.logic_operator == RuleOperator.AND:
-                return all(results)
+                return not decided
             elif rule.logic_operator == RuleOperator.OR:
-                return any(results)
+                return decided
             elif rule.logic_operator == RuleOperator.NOT:
-                return not any(results)  # Simplified NOT logic
+                return not decided  # Simplified NOT logic
                 
         return False
 
+    @staticmethod
+    def compile(
+        rule: Union[AdvancementRule, Condition],
+        cost_model: Optional[CostModel] = None
+    ) -> CompiledRule:
+        """
+        Compile a rule or condition into a cached callable.
+        
+        Prefer this over evaluate() when the same rule is checked against
+        many sets of facts. Compiled rules short-circuit but keep no stats.
+        
+        Args:
+            rule: The rule or condition to compile.
+            cost_model: Optional cost model; children are ordered at compile time.
+            
+        Returns:
+            A callable taking the facts dictionary and returning a bool.
+        """
+        return compile_rule(rule, cost_model)
+
+    @staticmethod
+    def compile_path(
+        path: LearningPath,
+        cost_model: Optional[CostModel] = None
+    ) -> Dict[str, CompiledRule]:
+        """
+        Compile the requirements of every node of a learning path.
+        
+        Closures are cached per path version (id and updated_at), so a path
+        simulated again only pays for the calls.
+        
+        Args:
+            path: The learning path to compile.
+            cost_model: Optional cost model; children are ordered at compile time.
+            
+        Returns:
+            Node ID -> compiled requirements, for the nodes that have them.
+        """
+        return compile_path(path, cost_model)
+
     @staticmethod
     def _evaluate_condition(condition: Condition, facts: Dict[str, Any]) -> bool:
         """Evaluate a single condition."""
@@ -0,0 +1,204 @@
+"""
+In-process index of emission rules for the CCA system.
+Keeps the active rules of each course in memory so that rule matching is a
+dictionary hit plus a bisect instead of a Firestore query per event.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .models import EmissionRule
+
+logger = logging.getLogger(__name__)
+
+
+class CourseRules:
+    """Active emission rules of a single course, indexed by evaluation."""
+
+    def __init__(self, course_id: str, rules: Iterable[EmissionRule]):
+        self.course_id = course_id
+        self.loaded_at = time.monotonic()
+        # evaluation_id (None = any evaluation) -> rules sorted by min_score
+        self._thresholds: Dict[Optional[str], List[float]] = {}
+        self._rules: Dict[Optional[str], List[EmissionRule]] = {}
+
+        buckets: Dict[Optional[str], List[EmissionRule]] = {}
+        for rule in rules:
+            buckets.setdefault(rule.evaluation_id or None, []).append(rule)
+
+        for evaluation_id, bucket in buckets.items():
+            # Ties on min_score are resolved by rule_id so the winner is stable
+            bucket.sort(key=lambda r: (r.min_score, r.rule_id))
+            self._thresholds[evaluation_id] = [r.min_score for r in bucket]
+            self._rules[evaluation_id] = bucket
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._rules.values())
+
+    def __iter__(self):
+        for bucket in self._rules.values():
+            yield from bucket
+
+    def _best(self, evaluation_id: Optional[str], score: float) -> Optional[EmissionRule]:
+        thresholds = self._thresholds.get(evaluation_id)
+        if not thresholds:
+            return None
+        pos = bisect.bisect_right(thresholds, score)
+        return self._rules[evaluation_id][pos - 1] if pos else None
+
+    def match(self, evaluation_id: str, score: float) -> Optional[EmissionRule]:
+        """
+        Find the rule that applies to an evaluation and score.
+
+        The rule with the highest ``min_score`` not above ``score`` wins. On
+        equal thresholds a rule bound to the evaluation beats a course-wide one.
+
+        Args:
+            evaluation_id: Evaluation identifier
+            score: Student score
+
+        Returns:
+            Matching EmissionRule or None if no match found
+        """
+        specific = self._best(evaluation_id, score) if evaluation_id else None
+        generic = self._best(None, score)
+
+        if specific is None:
+            return generic
+        if generic is None or specific.min_score >= generic.min_score:
+            return specific
+        return generic
+
+
+class RuleIndex:
+    """
+    Per-instance cache of CourseRules with versioned invalidation.
+
+    Entries expire after ``ttl_seconds``. Invalidations bump a version counter
+    so that a load that raced with an invalidation is never stored.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self._courses: Dict[str, CourseRules] = {}
+        self._rule_courses: Dict[str, str] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self._watch = None
+
+    @property
+    def version(self) -> int:
+        """Current invalidation version."""
+        return self._version
+
+    @property
+    def enabled(self) -> bool:
+        """Whether lookups should go through the index at all."""
+        return self.ttl_seconds > 0
+
+    def get(self, course_id: str) -> Optional[CourseRules]:
+        """Return the cached rules for a course, or None if missing or stale."""
+        entry = self._courses.get(course_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.loaded_at > self.ttl_seconds:
+            return None
+        return entry
+
+    def store(self, course_id: str, rules: Iterable[EmissionRule], version: int) -> CourseRules:
+        """
+        Index the rules of a course.
+
+        Args:
+            course_id: Course identifier
+            rules: Active rules of the course
+            version: Value of ``version`` read before the rules were fetched
+
+        Returns:
+            The indexed CourseRules (stored only if no invalidation happened)
+        """
+        entry = CourseRules(course_id, rules)
+        with self._lock:
+            if version == self._version:
+                self._courses[course_id] = entry
+                for rule in entry:
+                    self._rule_courses[rule.rule_id] = course_id
+        return entry
+
+    def invalidate(self, course_id: Optional[str] = None, rule_id: Optional[str] = None) -> None:
+        """
+        Drop cached rules.
+
+        Args:
+            course_id: Course to drop (all courses if neither argument is given)
+            rule_id: Rule whose previous course must also be dropped
+        """
+        with self._lock:
+            self._version += 1
+            if course_id is None and rule_id is None:
+                self._courses.clear()
+                self._rule_courses.clear()
+                return
+            if course_id is not None:
+                self._courses.pop(course_id, None)
+            if rule_id is not None:
+                previous = self._rule_courses.pop(rule_id, None)
+                if previous is not None:
+                    self._courses.pop(previous, None)
+
+    def watch(self, query: Any) -> None:
+        """
+        Keep the index fresh with a Firestore snapshot listener.
+
+        Args:
+            query: Firestore query over the rules collection
+        """
+        if self._watch is not None:
+            return
+        self._watch = query.on_snapshot(self._on_snapshot)
+        logger.info("Rule index snapshot listener started")
+
+    def unwatch(self) -> None:
+        """Stop the snapshot listener, if any."""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        for change in changes:
+            rule_data = change.document.to_dict() or {}
+            self.invalidate(course_id=rule_data.get("course_id"), rule_id=change.document.id)
+
+
+_indexes: Dict[Tuple[str, str], RuleIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_rule_index(project_id: str, collection: str, ttl_seconds: float) -> RuleIndex:
+    """
+    Get the process-wide rule index for a rules collection.
+
+    Args:
+        project_id: GCP project ID
+        collection: Rules collection name
+        ttl_seconds: Entry lifetime used when the index is first created
+
+    Returns:
+        Shared RuleIndex instance
+    """
+    key = (project_id, collection)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = RuleIndex(ttl_seconds)
+        return index
+
+
+def reset_rule_indexes() -> None:
+    """Forget every shared rule index (and its snapshot listener)."""
+    global _indexes_lock
+    _indexes_lock = threading.Lock()
+    _indexes.clear()
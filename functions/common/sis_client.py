@@ -3,9 +3,46 @@ SIS (Student Information System) Client for CID platform.
 Handles retrieval and filtering of student demographic and academic data.
 """
 
-from typing import Dict, Any, Optional, List
+import itertools
+from typing import Dict, Any, Iterator, Optional, List, Tuple, Union
 from pydantic import BaseModel
 
+from .pedagogical_models import AdvancementRule, Condition, RuleOperator
+from .student_cache import StudentCache
+
+# Criteria field -> SIS column. Only these fields can be filtered on, so
+# user-supplied criteria never reach the SQL text.
+FIELD_COLUMNS: Dict[str, str] = {
+    "student_id": "student_id",
+    "age": "age",
+    "grade": "grade",
+    "gpa": "gpa",
+    "scholarship_status": "scholarship_status",
+    "program": "program",
+    # Attribute names used by the LMS clients and in rule conditions
+    "edad": "age",
+    "grado": "grade",
+    "promedio": "gpa",
+    "becado": "scholarship_status",
+    "programa": "program",
+}
+
+# Comparison operators (same names as rule conditions) -> SQL
+SQL_OPERATORS: Dict[str, str] = {
+    "==": "=",
+    "!=": "<>",
+    ">": ">",
+    ">=": ">=",
+    "<": "<",
+    "<=": "<=",
+}
+
+Criteria = Union[Dict[str, Any], AdvancementRule, Condition]
+
+# Names for PostgreSQL server-side cursors
+_cursor_ids = itertools.count(1)
+
+
 class StudentProfile(BaseModel):
     id: str
     first_name: str
@@ -16,14 +53,137 @@ class StudentProfile(BaseModel):
     scholarship_status: bool = False
     attributes: Dict[str, Any] = {}
 
+
+def _column(field: str) -> str:
+    name = field[len("attribute."):] if field.startswith("attribute.") else field
+    column = FIELD_COLUMNS.get(name)
+    if column is None:
+        raise ValueError(f"Unsupported SIS criteria field: {field}")
+    return column
+
+
+def _condition_sql(field: str, op: str, value: Any, driver: str) -> Tuple[str, List[Any]]:
+    column = _column(field)
+    # A missing value makes the condition false (not unknown), as in
+    # RuleEvaluator, so NOT over it still matches
+    if op == "contains" and driver == "sqlite":
+        # SQLite's LIKE ignores ASCII case; "contains" is case-sensitive
+        return f"({column} IS NOT NULL AND instr({column}, %s) > 0)", [str(value)]
+    if op == "contains":
+        escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"({column} IS NOT NULL AND {column} LIKE %s ESCAPE '\\')", [f"%{escaped}%"]
+    if op == "in":
+        values = list(value)
+        if not values:
+            return "1 = 0", []
+        placeholders = ", ".join(["%s"] * len(values))
+        return f"({column} IS NOT NULL AND {column} IN ({placeholders}))", values
+    sql_op = SQL_OPERATORS.get(op)
+    if sql_op is None:
+        raise ValueError(f"Unsupported SIS criteria operator: {op}")
+    return f"({column} IS NOT NULL AND {column} {sql_op} %s)", [value]
+
+
+def compile_criteria(criteria: Criteria, driver: str = "postgresql") -> Tuple[str, List[Any]]:
+    """
+    Translate criteria into a parameterized SQL WHERE clause.
+
+    Criteria are either an AdvancementRule/Condition tree, evaluated with the
+    same AND/OR/NOT semantics as RuleEvaluator, or a dict ANDing its entries:
+    ``{"becado": True, "gpa": {">": 8.5}, "program": ["A", "B"]}`` (a scalar
+    means equality, a list means membership, a dict maps operators to values).
+
+    Args:
+        criteria: Dict, AdvancementRule or Condition
+        driver: "postgresql" or "sqlite", the database running the clause
+
+    Returns:
+        (where_sql, params) with %s placeholders
+
+    Raises:
+        ValueError: If a field or operator is not supported
+    """
+    if isinstance(criteria, Condition):
+        return _condition_sql(criteria.field, criteria.operator, criteria.value, driver)
+
+    if isinstance(criteria, AdvancementRule):
+        if not criteria.conditions:
+            return "1 = 1", []
+        parts, params = [], []
+        for child in criteria.conditions:
+            sql, child_params = compile_criteria(child, driver)
+            parts.append(sql)
+            params.extend(child_params)
+        if criteria.logic_operator == RuleOperator.AND:
+            return "(" + " AND ".join(parts) + ")", params
+        joined = "(" + " OR ".join(parts) + ")"
+        if criteria.logic_operator == RuleOperator.NOT:
+            # RuleEvaluator treats NOT as "none of the conditions hold"
+            return f"NOT {joined}", params
+        return joined, params
+
+    if not isinstance(criteria, dict):
+        raise ValueError(f"Unsupported SIS criteria: {type(criteria).__name__}")
+    if not criteria:
+        return "1 = 1", []
+    parts, params = [], []
+    for field, spec in criteria.items():
+        if isinstance(spec, dict):
+            checks = spec.items()
+        elif isinstance(spec, (list, tuple, set)):
+            checks = [("in", spec)]
+        else:
+            checks = [("==", spec)]
+        for op, value in checks:
+            sql, condition_params = _condition_sql(field, op, value, driver)
+            parts.append(sql)
+            params.extend(condition_params)
+    return "(" + " AND ".join(parts) + ")", params
+
+
 class SISClient:
     """Client to interact with the school's SIS."""
-    
-    def __init__(self, api_url: str, api_key: str):
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        pool: Optional[Any] = None,
+        driver: str = "postgresql",
+        student_cache: Optional[StudentCache] = None
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            api_url: SIS API base URL
+            api_key: SIS API key
+            pool: ConnectionPool to the SIS database (e.g. SISConnector.pool),
+                required by filter_students_by_criteria
+            driver: "postgresql" or "sqlite", the database behind ``pool``
+            student_cache: Cache serving repeated profile lookups (optional)
+        """
         self.api_url = api_url
         self.api_key = api_key
+        self.pool = pool
+        self.driver = driver
+        self.student_cache = student_cache
 
-    def get_student_profile(self, student_id: str) -> Optional[StudentProfile]:
+    def get_student_profile(self, student_id: str, refresh: bool = False) -> Optional[StudentProfile]:
+        """
+        Fetch full student profile from SIS, through the student cache if
+        there is one.
+        """
+        if self.student_cache is None:
+            return self._fetch_student_profile(student_id)
+        return self.student_cache.get_profile(
+            student_id,
+            lambda: self._fetch_student_profile(student_id),
+            source=self.api_url,
+            refresh=refresh
+        )
+
+    def _fetch_student_profile(self, student_id: str) -> Optional[StudentProfile]:
         """
         Fetch full student profile from SIS.
         """
@@ -41,10 +201,54 @@ class SISClient:
             )
         return None
 
-    def filter_students_by_criteria(self, criteria: Dict[str, Any]) -> List[str]:
+    def filter_students_by_criteria(
+        self,
+        criteria: Criteria,
+        batch_size: int = 1000
+    ) -> Iterator[str]:
         """
-        Filter students based on pedagogical criteria (e.g., age > 18, gpa > 8.5).
+        Stream the ids of the students matching pedagogical criteria
+        (e.g., becado and gpa > 8.5), filtered in the SIS database.
+
+        Rows are fetched ``batch_size`` at a time (through a server-side
+        cursor on PostgreSQL), so a large cohort is never held in memory.
+        The generator keeps a pooled connection until it is exhausted or
+        closed.
+
+        Args:
+            criteria: Dict, AdvancementRule or Condition (see compile_criteria)
+            batch_size: Rows fetched per round trip
+
+        Yields:
+            Student ids, ordered by id
+
+        Raises:
+            ValueError: If the criteria use an unsupported field or operator
+            RuntimeError: If the client has no database pool
         """
-        # Mock filtering logic
-        logger_info = f"Filtering students with criteria: {criteria}"
-        return ["12345", "67890"]  # Returns list of student IDs
+        if self.pool is None:
+            raise RuntimeError("SISClient needs a database pool to filter students")
+        # Compiled before the first next() so bad criteria fail at the call
+        where, params = compile_criteria(criteria, self.driver)
+        query = f"SELECT student_id FROM students WHERE {where} ORDER BY student_id"
+        if self.driver == "sqlite":
+            query = query.replace("%s", "?")
+        return self._stream(query, params, batch_size)
+
+    def _stream(self, query: str, params: List[Any], batch_size: int) -> Iterator[str]:
+        with self.pool.connection() as conn:
+            if self.driver == "postgresql":
+                cursor = conn.cursor(name=f"sis_cohort_{next(_cursor_ids)}")
+                cursor.itersize = batch_size
+            else:
+                cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    for row in rows:
+                        yield row[0]
+            finally:
+                cursor.close()
@@ -0,0 +1,171 @@
+"""
+Per-instance cache of student attributes and profiles.
+A student often produces a burst of events within seconds (e.g. several quiz
+attempts); the cache serves the repeats from memory, shares one upstream
+fetch among concurrent requests, and drops a student as soon as the SIS
+records a change for them.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable, Optional, Set
+
+from .cache import TTLCache
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+logger = logging.getLogger(__name__)
+
+# Kinds of cached lookups; a student change drops all of them
+ATTRIBUTES = "attributes"
+PROFILE = "profile"
+KINDS = (ATTRIBUTES, PROFILE)
+
+# How long change markers are kept (set a Firestore TTL policy on expires_at)
+CHANGE_RETENTION = timedelta(days=1)
+
+
+class StudentCache:
+    """
+    LRU + TTL cache of per-student lookups with single-flight loading.
+
+    Changes published by ``publish_student_changes`` (from update_sis)
+    reach other instances through ``watch``; without a listener, entries
+    are at most ``ttl_seconds`` stale.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_size: int = 10000):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl_seconds: Entry lifetime; 0 disables caching
+            max_size: Maximum number of cached lookups
+        """
+        self.cache = TTLCache(ttl_seconds, max_size=max_size)
+        # Upstreams seen so far: keys are (kind, source, student_id), so a
+        # student's entries can be dropped by key instead of by a scan
+        self._sources: Set[Hashable] = set()
+        self._watch = None
+
+    def get_attributes(
+        self,
+        student_id: str,
+        loader: Callable[[], Dict[str, Any]],
+        source: Hashable = None,
+        refresh: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Return a student's attributes, calling ``loader`` on a miss.
+
+        Args:
+            student_id: Student identifier
+            loader: Zero-argument callable fetching the attributes upstream
+            source: Identity of the upstream (e.g. LMS URL) when several exist
+            refresh: Ignore any cached value and fetch again
+
+        Returns:
+            The student's attributes
+        """
+        self._sources.add(source)
+        return self.cache.get_or_load((ATTRIBUTES, source, student_id), loader, refresh=refresh)
+
+    def get_profile(
+        self,
+        student_id: str,
+        loader: Callable[[], Any],
+        source: Hashable = None,
+        refresh: bool = False
+    ) -> Any:
+        """Return a student's profile, calling ``loader`` on a miss (see get_attributes)."""
+        self._sources.add(source)
+        return self.cache.get_or_load((PROFILE, source, student_id), loader, refresh=refresh)
+
+    def invalidate(self, student_id: Optional[str] = None) -> None:
+        """
+        Drop cached lookups.
+
+        Args:
+            student_id: Student to drop (every student if not provided)
+        """
+        if student_id is None:
+            self.cache.invalidate()
+            return
+        self.invalidate_many([student_id])
+
+    def invalidate_many(self, student_ids: Iterable[str]) -> int:
+        """
+        Drop the cached lookups of several students in one locked pass.
+
+        Args:
+            student_ids: Students to drop
+
+        Returns:
+            Number of entries dropped
+        """
+        sources = list(self._sources)
+        return self.cache.invalidate_many(
+            (kind, source, student_id)
+            for student_id in student_ids
+            for source in sources
+            for kind in KINDS
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters for metrics."""
+        return self.cache.stats()
+
+    def watch(self, collection: Any) -> None:
+        """
+        Drop students as soon as a change marker for them is written.
+
+        Args:
+            collection: Firestore collection of change markers
+        """
+        if self._watch is not None:
+            return
+        # Only changes from now on; older markers are already reflected
+        query = collection.where("changed_at", ">=", datetime.now(timezone.utc))
+        self._watch = query.on_snapshot(self._on_snapshot)
+        logger.info("Student cache snapshot listener started")
+
+    def unwatch(self) -> None:
+        """Stop the snapshot listener, if any."""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        self.invalidate_many([change.document.id for change in changes])
+
+
+def publish_student_changes(
+    db: "firestore.Client",
+    collection: str,
+    student_ids: Iterable[str]
+) -> int:
+    """
+    Record that the SIS changed some students, for every instance's cache.
+
+    Args:
+        db: Firestore client
+        collection: Name of the change marker collection
+        student_ids: Students whose data changed
+
+    Returns:
+        Number of change markers written
+    """
+    now = datetime.now(timezone.utc)
+    marker = {"changed_at": now, "expires_at": now + CHANGE_RETENTION}
+    ids = sorted(set(student_ids))
+    # Firestore batches hold at most 500 writes
+    for start in range(0, len(ids), 500):
+        batch = db.batch()
+        for student_id in ids[start:start + 500]:
+            batch.set(
+                db.collection(collection).document(student_id),
+                dict(marker, student_id=student_id)
+            )
+        batch.commit()
+    return len(ids)
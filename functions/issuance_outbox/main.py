@@ -0,0 +1,186 @@
+"""
+Cloud Function: Issuance Outbox
+Persists validated issuances in a durable outbox and drains it: each message
+is issued through call_acreditta and then recorded through update_sis, with
+retries, leasing and dead-lettering, at a rate Acreditta can sustain.
+"""
+
+import functions_framework
+from flask import Request, jsonify
+import logging
+import sys
+import os
+import math
+from typing import Any, Dict
+import requests
+
+# Add parent directory to path for common module imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common import (
+    Config,
+    BadgeIssueRequest,
+    OutboxMessage,
+    OutboxWorker,
+    PermanentError,
+    TTLCache,
+    get_outbox_store,
+    idempotency_key,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CALL_ACREDITTA_URL = os.environ.get("CALL_ACREDITTA_URL", "")
+UPDATE_SIS_URL = os.environ.get("UPDATE_SIS_URL", "")
+
+# Drain settings: Acreditta calls per second, concurrent messages, messages
+# leased per round and time budget of one drain invocation
+OUTBOX_RATE_LIMIT = float(os.environ.get("OUTBOX_RATE_LIMIT", "5"))
+OUTBOX_MAX_WORKERS = int(os.environ.get("OUTBOX_MAX_WORKERS", "4"))
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_DRAIN_SECONDS = float(os.environ.get("OUTBOX_DRAIN_SECONDS", "240"))
+
+# Timeout of each call to call_acreditta and update_sis
+OUTBOX_POST_TIMEOUT = float(os.environ.get("OUTBOX_POST_TIMEOUT_SECONDS", "60"))
+
+# A round leases OUTBOX_BATCH_SIZE messages at once and handles them
+# OUTBOX_MAX_WORKERS at a time, each making up to two calls: the lease must
+# outlast the slowest round, or another drain would lease the same message
+# while it is still in flight.
+OUTBOX_LEASE_SECONDS = float(os.environ.get(
+    "OUTBOX_LEASE_SECONDS",
+    math.ceil(OUTBOX_BATCH_SIZE / max(OUTBOX_MAX_WORKERS, 1)) * 2 * OUTBOX_POST_TIMEOUT + 60
+))
+
+# ID tokens for calling the other functions are valid for an hour
+_id_tokens = TTLCache(ttl_seconds=45 * 60)
+_session = requests.Session()
+
+
+def _auth_headers(url: str) -> Dict[str, str]:
+    """Authorization for calling another Cloud Function (none for local http URLs)."""
+    if not url.startswith("https://"):
+        return {}
+
+    def fetch() -> str:
+        import google.auth.transport.requests
+        import google.oauth2.id_token
+        return google.oauth2.id_token.fetch_id_token(google.auth.transport.requests.Request(), url)
+
+    return {"Authorization": f"Bearer {_id_tokens.get_or_load(url, fetch)}"}
+
+
+def _post(url: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    POST to another Cloud Function.
+    
+    Raises:
+        PermanentError: On a 4xx other than 429 (retrying would fail again)
+        requests.RequestException: On transient failures
+    """
+    response = _session.post(url, json=body, headers=_auth_headers(url), timeout=OUTBOX_POST_TIMEOUT)
+    if 400 <= response.status_code < 500 and response.status_code != 429:
+        raise PermanentError(f"{url} returned {response.status_code}: {response.text[:200]}")
+    response.raise_for_status()
+    return response.json()
+
+
+def process_issuance(message: OutboxMessage) -> None:
+    """
+    Issue the badge of an outbox message and record it in the SIS.
+    
+    The Acreditta response is checkpointed in ``message.state``, so a retry
+    after a SIS failure does not call Acreditta again (and a repeated call
+    would be deduplicated by the idempotency key anyway).
+    """
+    payload = message.payload
+    if "badge" not in message.state:
+        message.state["badge"] = _post(CALL_ACREDITTA_URL, {
+            k: v for k, v in payload.items() if k != "workflow_execution_id"
+        })
+        logger.info(f"Badge issued for outbox message {message.id}: {message.state['badge'].get('badge_id')}")
+    
+    badge = message.state["badge"]
+    message.state["sis"] = _post(UPDATE_SIS_URL, {
+        **payload,
+        "badge_id": badge["badge_id"],
+        "badge_url": badge["badge_url"],
+        "issued_at": badge["issued_at"],
+    })
+
+
+@functions_framework.http
+def enqueue_issuance(request: Request):
+    """
+    HTTP Cloud Function to persist a validated issuance in the outbox.
+    
+    Args:
+        request: Flask request object with the call_acreditta JSON body
+            (student_id, badge_template_id, badge_title, course_id,
+            evaluation_id, score, rule_id, metadata) plus an optional
+            workflow_execution_id
+    
+    Returns:
+        JSON response {"outbox_id": str, "queued": bool}; queued is False
+        when the same issuance was already in the outbox
+    """
+    try:
+        request_json = request.get_json(silent=True)
+        if not request_json:
+            return jsonify({"error": "Invalid JSON body"}), 400
+        
+        # Validate input using Pydantic
+        badge_request = BadgeIssueRequest(**{k: v for k, v in request_json.items() if k != "workflow_execution_id"})
+        payload = badge_request.model_dump(mode="json")
+        if request_json.get("workflow_execution_id"):
+            payload["workflow_execution_id"] = request_json["workflow_execution_id"]
+        
+        key = idempotency_key(badge_request.student_id, badge_request.rule_id, badge_request.evaluation_id)
+        queued = get_outbox_store(Config.from_env()).enqueue(key, payload)
+        logger.info(f"Issuance {key} {'queued' if queued else 'already in outbox'}")
+        
+        return jsonify({"outbox_id": key, "queued": queued}), 200
+        
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        return jsonify({"error": f"Validation error: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@functions_framework.http
+def drain_outbox(request: Request):
+    """
+    HTTP Cloud Function (Cloud Scheduler) to drain the outbox.
+    
+    Args:
+        request: Flask request object; optional JSON body with
+            "max_seconds" to override the time budget
+    
+    Returns:
+        JSON response with the drain counters and the messages per status
+    """
+    try:
+        if not CALL_ACREDITTA_URL or not UPDATE_SIS_URL:
+            return jsonify({"error": "CALL_ACREDITTA_URL and UPDATE_SIS_URL must be configured"}), 500
+        
+        request_json = request.get_json(silent=True) or {}
+        store = get_outbox_store(Config.from_env())
+        worker = OutboxWorker(
+            store,
+            process_issuance,
+            lease_seconds=OUTBOX_LEASE_SECONDS,
+            batch_size=OUTBOX_BATCH_SIZE,
+            max_workers=OUTBOX_MAX_WORKERS,
+            rate_limit=OUTBOX_RATE_LIMIT or None
+        )
+        stats = worker.drain(max_seconds=float(request_json.get("max_seconds", OUTBOX_DRAIN_SECONDS)))
+        
+        return jsonify({"drained": stats, "outbox": store.counts()}), 200
+        
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
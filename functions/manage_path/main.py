@@ -15,8 +15,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from common import (
     Config,
-    PedagogicalDBClient,
-    LearningPath
+    LearningPath,
+    get_pedagogical_db
 )
 
 # Configure logging
@@ -45,7 +45,7 @@ def manage_path(request: Request):
         }
 
         config = Config.from_env()
-        db = PedagogicalDBClient(config)
+        db = get_pedagogical_db(config)
 
         if request.method == 'GET':
             path_id = request.args.get('path_id')
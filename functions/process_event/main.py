@@ -0,0 +1,441 @@
+"""
+Cloud Function: Process Event
+Fused pipeline: validates a Moodle event, issues its badge and updates the
+SIS in one process, with the same results as the Cloud Workflow but without
+its three authenticated HTTP hops.
+"""
+
+import functions_framework
+from flask import Request, jsonify
+import base64
+import importlib.util
+import json
+import logging
+import sys
+import os
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Add parent directory to path for common module imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common import (
+    BadgeIssueRequest,
+    Config,
+    MoodleEvent,
+    PubSubBatchConsumer,
+    SISUpdateRequest,
+    ValidationRequest,
+    get_pubsub_publisher,
+    get_pubsub_subscriber,
+    parse_json_message,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pipeline statuses (the values returned by the Cloud Workflow)
+SUCCESS = "SUCCESS"
+NO_RULE_MATCHED = "NO_RULE_MATCHED"
+DUPLICATE = "DUPLICATE"
+VALIDATION_FAILED = "VALIDATION_FAILED"
+BADGE_ISSUANCE_FAILED = "BADGE_ISSUANCE_FAILED"
+SIS_UPDATE_FAILED = "SIS_UPDATE_FAILED"
+
+# Statuses worth a redelivery in batch consumption: rule lookups and
+# Acreditta calls fail transiently, and a failed issuance releases its claim.
+# After SIS_UPDATE_FAILED the badge exists, so a redelivery is a duplicate.
+RETRY_STATUSES = (VALIDATION_FAILED, BADGE_ISSUANCE_FAILED)
+
+# Batch consumption (Cloud Scheduler → consume_events): pull subscription,
+# topic receiving invalid messages, messages per batch and time budget
+EVENTS_SUBSCRIPTION = os.environ.get("EVENTS_SUBSCRIPTION", "moodle-events-batch")
+EVENTS_DEAD_LETTER_TOPIC = os.environ.get("EVENTS_DEAD_LETTER_TOPIC", "")
+CONSUMER_BATCH_SIZE = int(os.environ.get("CONSUMER_BATCH_SIZE", "100"))
+
+# The drain must end before the function timeout kills the instance: its
+# budget leaves a margin, and no batch is pulled unless CONSUMER_BATCH_SECONDS
+# (or the longest batch so far) still fits in it
+FUNCTION_TIMEOUT_SECONDS = float(os.environ.get("FUNCTION_TIMEOUT_SECONDS", "300"))
+CONSUMER_BATCH_SECONDS = float(os.environ.get("CONSUMER_BATCH_SECONDS", "60"))
+CONSUMER_DRAIN_SECONDS = float(os.environ.get("CONSUMER_DRAIN_SECONDS", FUNCTION_TIMEOUT_SECONDS - 30))
+
+
+def _function_dir(name: str) -> str:
+    """Directory of another function: bundled by prepare-functions, or its sibling."""
+    bundled = os.path.join(FUNCTION_DIR, name)
+    if os.path.isdir(bundled):
+        return bundled
+    return os.path.abspath(os.path.join(FUNCTION_DIR, '..', name))
+
+
+def _load_stage(name: str) -> ModuleType:
+    """
+    Import the main module of another function under a unique name.
+    
+    Each stage runs the very code deployed as its own function; its
+    directory is put on the path for its local modules (acreditta_handler,
+    sis_connector).
+    """
+    directory = _function_dir(name)
+    if directory not in sys.path:
+        sys.path.append(directory)
+    spec = importlib.util.spec_from_file_location(f"{name}_main", os.path.join(directory, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+validate_rule = _load_stage("validate_rule")
+call_acreditta = _load_stage("call_acreditta")
+update_sis = _load_stage("update_sis")
+
+
+@functions_framework.http
+def process_event(request: Request):
+    """
+    HTTP Cloud Function running the whole badge pipeline for one event.
+    
+    Args:
+        request: Flask request object with either a Pub/Sub push envelope
+            ({"message": {"data": base64 JSON event, "messageId": str}}),
+            a {"data": event} body as received by the workflow, or the
+            event itself:
+            - student_id: str
+            - course_id: str
+            - evaluation_id: str
+            - score: float
+            - timestamp: str (ISO format)
+    
+    Returns:
+        JSON response with the pipeline result ({"status": ..., ...}, the
+        same shape the workflow returns). Failed events are answered with
+        200 too, so Pub/Sub acknowledges them as it does for workflow
+        executions.
+    """
+    try:
+        request_json = request.get_json(silent=True)
+        if not request_json or not isinstance(request_json, dict):
+            return jsonify({"error": "Invalid JSON body"}), 400
+        
+        event, execution_id = unwrap_event(request_json)
+        result = run_pipeline(event, execution_id)
+        logger.info(f"Pipeline finished for student {result.get('student_id')}: {result['status']}")
+        
+        return jsonify(result), 200
+    
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        return jsonify({"error": f"Validation error: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+def unwrap_event(body: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Extract the event from a request body.
+    
+    Returns:
+        (event, execution ID recorded in the audit event: the Pub/Sub
+        message ID when there is one)
+    
+    Raises:
+        ValueError: If a Pub/Sub message does not carry a JSON object
+    """
+    message = body.get("message")
+    if isinstance(message, dict) and "data" in message:
+        try:
+            event = json.loads(base64.b64decode(message["data"]))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Pub/Sub message data is not base64 JSON: {str(e)}")
+        message_id = message.get("messageId") or message.get("message_id")
+        execution_id = f"pubsub-{message_id}" if message_id else None
+    elif isinstance(body.get("data"), dict):
+        event, execution_id = body["data"], None
+    else:
+        event, execution_id = body, None
+    if not isinstance(event, dict):
+        raise ValueError("event must be a JSON object")
+    return event, execution_id
+
+
+@contextmanager
+def _timed(timings: Optional[Dict[str, float]], stage: str) -> Iterator[None]:
+    """Record how long a stage took in ``timings`` (seconds), even if it failed."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = time.perf_counter() - started
+
+
+def run_pipeline(
+    event: Dict[str, Any],
+    execution_id: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """
+    Validate an event, issue its badge and record it in the SIS.
+    
+    Every stage runs the same code as its function (rule evaluation and
+    issuance dedupe, Acreditta issuance with claim settling, batched SIS
+    write and audit event), sharing this instance's clients. Badges are
+    always issued inline: the issuance outbox is only used by the workflow.
+    
+    Args:
+        event: Moodle event (student_id, course_id, evaluation_id, score,
+            timestamp)
+        execution_id: Identifier recorded as the audit event's
+            workflow_execution_id
+        timings: If provided, receives the seconds spent in each stage
+            that ran ("validate", "issue", "sis")
+    
+    Returns:
+        Result with "status" (SUCCESS, NO_RULE_MATCHED, DUPLICATE,
+        VALIDATION_FAILED, BADGE_ISSUANCE_FAILED or SIS_UPDATE_FAILED) and
+        the fields the workflow returns for that status
+    """
+    student_id = event.get("student_id")
+    
+    # 1. Validate
+    try:
+        with _timed(timings, "validate"):
+            validation_request = ValidationRequest(**event)
+            validation = validate_rule.validate_event(validation_request)
+    except Exception as e:
+        logger.warning(f"Validation failed for student {student_id}: {str(e)}")
+        return {"status": VALIDATION_FAILED, "error": str(e), "student_id": student_id}
+    
+    if validation.duplicate:
+        return {"status": DUPLICATE, "student_id": student_id, "rule_id": validation.rule_id}
+    if not validation.is_valid:
+        return {"status": NO_RULE_MATCHED, "student_id": student_id}
+    
+    # 2. Issue
+    try:
+        badge_request = BadgeIssueRequest(
+            student_id=validation_request.student_id,
+            badge_template_id=validation.badge_template_id,
+            badge_title=validation.badge_title,
+            course_id=validation_request.course_id,
+            evaluation_id=validation_request.evaluation_id,
+            score=validation_request.score,
+            rule_id=validation.rule_id
+        )
+        with _timed(timings, "issue"):
+            badge = call_acreditta.issue_badge(badge_request)
+    except Exception as e:
+        logger.warning(f"Badge issuance failed for student {student_id}: {str(e)}")
+        return {"status": BADGE_ISSUANCE_FAILED, "error": str(e), "student_id": student_id}
+    
+    # 3. Record in the SIS and audit log
+    try:
+        with _timed(timings, "sis"):
+            sis_response = update_sis.record_badge(SISUpdateRequest(
+                student_id=badge_request.student_id,
+                badge_id=badge.badge_id,
+                badge_url=badge.badge_url,
+                badge_template_id=badge_request.badge_template_id,
+                badge_title=badge_request.badge_title,
+                course_id=badge_request.course_id,
+                evaluation_id=badge_request.evaluation_id,
+                score=badge_request.score,
+                rule_id=badge_request.rule_id,
+                issued_at=badge.issued_at,
+                workflow_execution_id=execution_id
+            ))
+    except Exception as e:
+        logger.warning(f"SIS update failed for student {student_id}: {str(e)}")
+        return {
+            "status": SIS_UPDATE_FAILED,
+            "error": str(e),
+            "student_id": student_id,
+            "badge_id": badge.badge_id,
+        }
+    
+    return {
+        "status": SUCCESS,
+        "student_id": student_id,
+        "badge_id": badge.badge_id,
+        "badge_url": badge.badge_url,
+        "badge_title": badge_request.badge_title,
+        "issued_at": badge.issued_at.isoformat(),
+        "sis_updated": sis_response.updated,
+    }
+
+
+def run_batch(
+    events: List[Dict[str, Any]],
+    execution_ids: Optional[List[Optional[str]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run the pipeline for a batch of events, stage by stage.
+
+    Rules are fetched once per course (validate_batch), matched badges are
+    issued concurrently (issue_batch) and recorded in one SIS transaction
+    (update_batch). Each event gets the result run_pipeline would return.
+
+    Args:
+        events: Moodle events
+        execution_ids: Per-event identifiers recorded as the audit events'
+            workflow_execution_id
+
+    Returns:
+        One result per event, in input order
+    """
+    execution_ids = execution_ids or [None] * len(events)
+    results: List[Dict[str, Any]] = [None] * len(events)
+    
+    # 1. Validate
+    to_issue: List[Tuple[int, Dict[str, Any]]] = []
+    for i, (event, validation) in enumerate(zip(events, validate_rule.validate_batch(events))):
+        student_id = event.get("student_id")
+        if validation.error:
+            results[i] = {"status": VALIDATION_FAILED, "error": validation.error, "student_id": student_id}
+        elif validation.duplicate:
+            results[i] = {"status": DUPLICATE, "student_id": student_id, "rule_id": validation.rule_id}
+        elif not validation.is_valid:
+            results[i] = {"status": NO_RULE_MATCHED, "student_id": student_id}
+        else:
+            to_issue.append((i, {
+                "student_id": student_id,
+                "badge_template_id": validation.badge_template_id,
+                "badge_title": validation.badge_title,
+                "course_id": event["course_id"],
+                "evaluation_id": event["evaluation_id"],
+                "score": event["score"],
+                "rule_id": validation.rule_id,
+            }))
+    if not to_issue:
+        return results
+    
+    # 2. Issue
+    try:
+        issued = call_acreditta.issue_batch([badge for _, badge in to_issue])
+    except Exception as e:
+        logger.error(f"Batch issuance of {len(to_issue)} badges failed: {str(e)}", exc_info=True)
+        # Let the redelivered events claim their issuance again
+        call_acreditta.settle_issuances([(BadgeIssueRequest(**badge), None) for _, badge in to_issue])
+        for i, badge in to_issue:
+            results[i] = {"status": BADGE_ISSUANCE_FAILED, "error": str(e), "student_id": badge["student_id"]}
+        return results
+    
+    to_record = []
+    for (i, badge), result in zip(to_issue, issued):
+        if result.response is None:
+            results[i] = {"status": BADGE_ISSUANCE_FAILED, "error": result.error, "student_id": badge["student_id"]}
+        else:
+            to_record.append((i, badge, result.response))
+    if not to_record:
+        return results
+    
+    # 3. Record in the SIS and audit log
+    updates = [
+        dict(
+            badge,
+            badge_id=response.badge_id,
+            badge_url=response.badge_url,
+            issued_at=response.issued_at.isoformat(),
+            workflow_execution_id=execution_ids[i]
+        )
+        for i, badge, response in to_record
+    ]
+    try:
+        recorded = update_sis.update_batch(updates)
+    except Exception as e:
+        logger.error(f"Batch SIS update of {len(updates)} badges failed: {str(e)}", exc_info=True)
+        recorded = [None] * len(updates)
+    
+    for (i, badge, response), sis_result in zip(to_record, recorded):
+        if sis_result is None or sis_result.event_id is None:
+            results[i] = {
+                "status": SIS_UPDATE_FAILED,
+                "error": sis_result.error if sis_result else "SIS batch update failed",
+                "student_id": badge["student_id"],
+                "badge_id": response.badge_id,
+            }
+        else:
+            results[i] = {
+                "status": SUCCESS,
+                "student_id": badge["student_id"],
+                "badge_id": response.badge_id,
+                "badge_url": response.badge_url,
+                "badge_title": badge["badge_title"],
+                "issued_at": response.issued_at.isoformat(),
+                "sis_updated": sis_result.updated,
+            }
+    return results
+
+
+def parse_event_message(message: Any) -> Tuple[Dict[str, Any], str]:
+    """
+    Parse a Pub/Sub message carrying a MoodleEvent.
+
+    Returns:
+        (event as JSON-compatible dict, execution ID for its audit event)
+
+    Raises:
+        ValueError: If the message is not a valid MoodleEvent
+    """
+    event = MoodleEvent(**parse_json_message(message))
+    return event.model_dump(mode="json"), f"pubsub-{message.message_id}"
+
+
+@functions_framework.http
+def consume_events(request: Request):
+    """
+    HTTP Cloud Function (Cloud Scheduler) consuming Moodle events in batches
+    from a pull subscription.
+
+    Each batch of up to CONSUMER_BATCH_SIZE messages goes through run_batch.
+    Messages are then acknowledged one by one: done events are acked,
+    events whose status is in RETRY_STATUSES are nacked for redelivery, and
+    messages that are not valid MoodleEvents are published to
+    EVENTS_DEAD_LETTER_TOPIC and acked.
+
+    Args:
+        request: Flask request object; optional JSON body with
+            "max_seconds" to lower the time budget
+
+    Returns:
+        JSON response with the message counters and the events per status
+    """
+    try:
+        request_json = request.get_json(silent=True) or {}
+        config = Config.from_env()
+        statuses: Counter = Counter()
+        
+        def handle(items: List[Tuple[Dict[str, Any], str]]) -> List[bool]:
+            results = run_batch([event for event, _ in items], [execution_id for _, execution_id in items])
+            statuses.update(result["status"] for result in results)
+            return [result["status"] not in RETRY_STATUSES for result in results]
+        
+        consumer = PubSubBatchConsumer(
+            get_pubsub_subscriber(),
+            f"projects/{config.project_id}/subscriptions/{EVENTS_SUBSCRIPTION}",
+            handle,
+            parse=parse_event_message,
+            publisher=get_pubsub_publisher() if EVENTS_DEAD_LETTER_TOPIC else None,
+            dead_letter_topic=(
+                f"projects/{config.project_id}/topics/{EVENTS_DEAD_LETTER_TOPIC}"
+                if EVENTS_DEAD_LETTER_TOPIC else None
+            ),
+            max_messages=CONSUMER_BATCH_SIZE
+        )
+        max_seconds = min(float(request_json.get("max_seconds", CONSUMER_DRAIN_SECONDS)), CONSUMER_DRAIN_SECONDS)
+        stats = consumer.drain(max_seconds, batch_budget=CONSUMER_BATCH_SECONDS)
+        
+        return jsonify({"consumed": stats, "statuses": dict(statuses)}), 200
+        
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
@@ -9,16 +9,18 @@ import logging
 import sys
 import os
 from datetime import datetime
+from typing import Any, Dict
 
 # Add parent directory to path for common module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from common import (
     Config,
-    PedagogicalDBClient,
     RuleEvaluator,
-    MoodleClient,
+    get_pedagogical_db,
+    get_moodle_client,
     SimulationResult,
+    LearningPath,
     EvidenceVerifier
 )
 
@@ -26,6 +28,89 @@ from common import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def simulate_nodes(
+    path: LearningPath,
+    student_id: str,
+    student_attrs: Dict[str, Any],
+    mock_scores: Dict[str, Any],
+    evidence_verifier: EvidenceVerifier
+) -> SimulationResult:
+    """
+    Walk the nodes of a learning path and decide which ones a student unlocks.
+    
+    Args:
+        path: Learning path to simulate
+        student_id: Student identifier
+        student_attrs: Student attributes, exposed to rules as "attribute"
+        mock_scores: Simulated scores and completions, by reference or activity
+        evidence_verifier: Verifier of the evidence of competency nodes
+        
+    Returns:
+        SimulationResult with the unlocked nodes, issued badges and logs
+    """
+    unlocked_nodes = []
+    issued_badges = []
+    logs = []
+    # Compiled once per path version, not per node and request
+    node_rules = RuleEvaluator.compile_path(path)
+    
+    for node in path.nodes:
+        logs.append(f"--- Evaluando nodo: {node.label} ({node.id}) ---")
+        
+        facts = {
+            "score": mock_scores.get(node.reference_id, 0),
+            "course_id": node.reference_id,
+            "attribute": student_attrs,
+            **mock_scores # Include activity scores in facts
+        }
+        
+        # 1. Check Advancement Rules (Prerequisites)
+        requirements_met = True
+        if node.requirements:
+            requirements_met = node_rules[node.id](facts)
+            if requirements_met:
+                logs.append(f"  [OK] Requisitos de avance cumplidos.")
+            else:
+                logs.append(f"  [FAIL] Requisitos de avance NO cumplidos.")
+        else:
+            logs.append(f"  [INFO] Sin requisitos de avance.")
+
+        # 2. Check Evidence (for Competencies)
+        evidence_met = True
+        if node.type == "competency":
+            # Find mappings for this competency
+            mappings = [m for m in path.evidence_mappings if m.competency_id == node.id]
+            if mappings:
+                logs.append(f"  [INFO] Verificando {len(mappings)} evidencias...")
+                for m in mappings:
+                    is_valid = evidence_verifier.verify_evidence(m, student_id, facts)
+                    if is_valid:
+                        logs.append(f"    - Evidencia '{m.moodle_activity_id}' VALIDADA.")
+                    else:
+                        logs.append(f"    - Evidencia '{m.moodle_activity_id}' RECHAZADA.")
+                        evidence_met = False
+            else:
+                logs.append(f"  [WARN] Competencia sin evidencias mapeadas.")
+        
+        # 3. Final Decision
+        if requirements_met and evidence_met:
+            unlocked_nodes.append(node.id)
+            logs.append(f"  >> NODO DESBLOQUEADO <<")
+            if node.type == "competency":
+                issued_badges.append(f"Insignia: {node.label}")
+        else:
+            logs.append(f"  >> NODO BLOQUEADO <<")
+    
+    return SimulationResult(
+        path_id=path.id,
+        student_id=student_id,
+        unlocked_nodes=unlocked_nodes,
+        issued_badges=issued_badges,
+        logs=logs,
+        success=len(unlocked_nodes) > 0
+    )
+
+
 @functions_framework.http
 def simulate_path(request: Request):
     """
@@ -56,10 +141,10 @@ def simulate_path(request: Request):
         
         logger.info(f"Simulating path {path_id} for student {student_id}")
         
-        # Initialize clients
+        # Shared clients (created once per instance)
         config = Config.from_env()
-        pedagogical_db = PedagogicalDBClient(config)
-        moodle = MoodleClient(api_url="https://moodle.example.com", token="mock-token")
+        pedagogical_db = get_pedagogical_db(config)
+        moodle = get_moodle_client()
         evidence_verifier = EvidenceVerifier(moodle)
         
         # 1. Fetch the learning path
@@ -72,10 +157,6 @@ def simulate_path(request: Request):
         student_attrs = moodle.get_student_attributes(student_id)
         
         # 3. Simulation Logic
-        unlocked_nodes = []
-        issued_badges = []
-        logs = []
-        
         # Mocking some scores and completion for the simulation
         mock_scores = request_json.get('mock_scores', {
             "MATH101": 95,
@@ -83,61 +164,7 @@ def simulate_path(request: Request):
             "activity_completed_a1": True
         })
         
-        for node in path.nodes:
-            logs.append(f"--- Evaluando nodo: {node.label} ({node.id}) ---")
-            
-            facts = {
-                "score": mock_scores.get(node.reference_id, 0),
-                "course_id": node.reference_id,
-                "attribute": student_attrs,
-                **mock_scores # Include activity scores in facts
-            }
-            
-            # 1. Check Advancement Rules (Prerequisites)
-            requirements_met = True
-            if node.requirements:
-                requirements_met = RuleEvaluator.evaluate(node.requirements, facts)
-                if requirements_met:
-                    logs.append(f"  [OK] Requisitos de avance cumplidos.")
-                else:
-                    logs.append(f"  [FAIL] Requisitos de avance NO cumplidos.")
-            else:
-                logs.append(f"  [INFO] Sin requisitos de avance.")
-
-            # 2. Check Evidence (for Competencies)
-            evidence_met = True
-            if node.type == "competency":
-                # Find mappings for this competency
-                mappings = [m for m in path.evidence_mappings if m.competency_id == node.id]
-                if mappings:
-                    logs.append(f"  [INFO] Verificando {len(mappings)} evidencias...")
-                    for m in mappings:
-                        is_valid = evidence_verifier.verify_evidence(m, student_id, facts)
-                        if is_valid:
-                            logs.append(f"    - Evidencia '{m.moodle_activity_id}' VALIDADA.")
-                        else:
-                            logs.append(f"    - Evidencia '{m.moodle_activity_id}' RECHAZADA.")
-                            evidence_met = False
-                else:
-                    logs.append(f"  [WARN] Competencia sin evidencias mapeadas.")
-            
-            # 3. Final Decision
-            if requirements_met and evidence_met:
-                unlocked_nodes.append(node.id)
-                logs.append(f"  >> NODO DESBLOQUEADO <<")
-                if node.type == "competency":
-                    issued_badges.append(f"Insignia: {node.label}")
-            else:
-                logs.append(f"  >> NODO BLOQUEADO <<")
-
-        result = SimulationResult(
-            path_id=path_id,
-            student_id=student_id,
-            unlocked_nodes=unlocked_nodes,
-            issued_badges=issued_badges,
-            logs=logs,
-            success=len(unlocked_nodes) > 0
-        )
+        result = simulate_nodes(path, student_id, student_attrs, mock_scores, evidence_verifier)
         
         return (jsonify(result.model_dump(mode="json")), 200, headers)
         
@@ -9,25 +9,104 @@ import logging
 import sys
 import os
 from datetime import datetime
+from typing import Any, Iterable, List, Optional
 import uuid
 
 # Add parent directory to path for common module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from common import (
+    AUDIT_COMMIT_TIMEOUT,
     Config,
     SISUpdateRequest,
     SISUpdateResponse,
+    SISUpdateResult,
     AuditEvent,
-    FirestoreClient,
+    MicroBatcher,
+    get_firestore_client,
+    get_firestore_db,
+    get_or_create,
     get_secret,
+    get_student_cache,
+    publish_student_changes,
 )
-from sis_connector import SISConnector
+from sis_connector import BadgeRow, SISConnector
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SIS connection pool bounds per instance
+SIS_POOL_MIN = int(os.environ.get("SIS_POOL_MIN", "1"))
+SIS_POOL_MAX = int(os.environ.get("SIS_POOL_MAX", "4"))
+
+# Longest wait for a pooled connection and longest SIS statement
+SIS_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get("SIS_ACQUIRE_TIMEOUT_SECONDS", "10"))
+SIS_STATEMENT_TIMEOUT_SECONDS = float(os.environ.get("SIS_STATEMENT_TIMEOUT_SECONDS", "20"))
+
+# Concurrent requests of an instance are written to the SIS together: a
+# batch is flushed when it holds SIS_BATCH_SIZE updates or its oldest update
+# has waited SIS_BATCH_MAX_WAIT_MS. Bulk requests take up to
+# SIS_MAX_BULK_UPDATES updates in one transaction.
+SIS_BATCH_SIZE = int(os.environ.get("SIS_BATCH_SIZE", "100"))
+SIS_BATCH_MAX_WAIT_MS = float(os.environ.get("SIS_BATCH_MAX_WAIT_MS", "20"))
+SIS_MAX_BULK_UPDATES = int(os.environ.get("SIS_MAX_BULK_UPDATES", "2000"))
+
+# Longest time a single update waits for its batch: the batch wait, then a
+# connection and the statement for the batch ahead of it and for its own.
+# Past it the update is reported as skipped instead of holding the request.
+SIS_UPDATE_TIMEOUT_SECONDS = (
+    SIS_BATCH_MAX_WAIT_MS / 1000
+    + 2 * (SIS_ACQUIRE_TIMEOUT_SECONDS + SIS_STATEMENT_TIMEOUT_SECONDS)
+)
+
+
+def get_sis_connector(refresh_secrets: bool = False) -> SISConnector:
+    """
+    Get the shared SIS connector (and its connection pool) for this instance.
+    
+    Args:
+        refresh_secrets: Re-read the credentials from Secret Manager (e.g.
+            after they were rotated and the database rejected them)
+    
+    Returns:
+        SISConnector whose pooled connections are reused across invocations
+    """
+    sis_user = get_secret(os.environ.get("SIS_USER_SECRET_ID", "sis-db-user"), refresh=refresh_secrets)
+    sis_pass = get_secret(os.environ.get("SIS_PASS_SECRET_ID", "sis-db-pass"), refresh=refresh_secrets)
+    sis_host = os.environ.get("SIS_DB_HOST", "")
+    sis_db = os.environ.get("SIS_DB_NAME", "sis_production")
+    sis_port = int(os.environ.get("SIS_DB_PORT", "5432"))
+    driver = os.environ.get("SIS_DB_DRIVER", "postgresql")
+    return get_or_create(
+        ("sis", driver, sis_host, sis_port, sis_db, sis_user, sis_pass),
+        lambda: SISConnector(
+            host=sis_host,
+            database=sis_db,
+            user=sis_user,
+            password=sis_pass,
+            port=sis_port,
+            driver=driver,
+            min_connections=SIS_POOL_MIN,
+            max_connections=SIS_POOL_MAX,
+            acquire_timeout=SIS_ACQUIRE_TIMEOUT_SECONDS,
+            statement_timeout=SIS_STATEMENT_TIMEOUT_SECONDS
+        )
+    )
+
+
+def get_sis_batcher() -> MicroBatcher:
+    """Get the per-instance batcher coalescing single SIS updates."""
+    return get_or_create(
+        ("sis_batcher",),
+        lambda: MicroBatcher(
+            update_student_badges,
+            max_batch_size=SIS_BATCH_SIZE,
+            max_wait_seconds=SIS_BATCH_MAX_WAIT_MS / 1000,
+            name="sis-batcher"
+        )
+    )
+
 
 @functions_framework.http
 def update_sis(request: Request):
@@ -47,9 +126,12 @@ def update_sis(request: Request):
             - rule_id: str
             - issued_at: str (ISO format)
             - workflow_execution_id: str (optional)
+        or, in bulk mode, a list of such objects (either the body itself
+        or under an "updates" key).
     
     Returns:
-        JSON response with SISUpdateResponse
+        JSON response with SISUpdateResponse, or {"results": [...]} with one
+        SISUpdateResult per input update in bulk mode
     """
     try:
         # Parse request
@@ -57,79 +139,23 @@ def update_sis(request: Request):
         if not request_json:
             return jsonify({"error": "Invalid JSON body"}), 400
         
+        if isinstance(request_json, list) or "updates" in request_json:
+            updates = request_json if isinstance(request_json, list) else request_json["updates"]
+            if not isinstance(updates, list):
+                return jsonify({"error": "Validation error: 'updates' must be a list"}), 400
+            if len(updates) > SIS_MAX_BULK_UPDATES:
+                return jsonify({"error": f"Validation error: batch exceeds {SIS_MAX_BULK_UPDATES} updates"}), 400
+            
+            logger.info(f"Updating SIS with batch of {len(updates)} badges")
+            results = update_batch(updates)
+            return jsonify({"results": [r.model_dump(mode="json") for r in results]}), 200
+        
         logger.info(f"Updating SIS for request: {request_json}")
         
         # Validate input using Pydantic
         sis_request = SISUpdateRequest(**request_json)
         
-        # Initialize Firestore client for audit logging
-        config = Config.from_env()
-        db_client = FirestoreClient(config)
-        
-        # Get SIS database credentials from Secret Manager
-        sis_user = get_secret(os.environ.get("SIS_USER_SECRET_ID", "sis-db-user"))
-        sis_pass = get_secret(os.environ.get("SIS_PASS_SECRET_ID", "sis-db-pass"))
-        sis_host = os.environ.get("SIS_DB_HOST", "")
-        sis_db = os.environ.get("SIS_DB_NAME", "sis_production")
-        
-        # Initialize SIS connector
-        sis = SISConnector(
-            host=sis_host,
-            database=sis_db,
-            user=sis_user,
-            password=sis_pass
-        )
-        
-        # Update SIS database
-        sis_updated = False
-        if sis_host:  # Only update if SIS host is configured
-            try:
-                sis.update_student_badge(
-                    student_id=sis_request.student_id,
-                    badge_id=sis_request.badge_id,
-                    badge_url=sis_request.badge_url,
-                    badge_title=sis_request.badge_title
-                )
-                sis_updated = True
-                logger.info(f"SIS updated for student {sis_request.student_id}")
-            except Exception as e:
-                logger.warning(f"SIS update failed: {str(e)}")
-                # Continue to log audit event even if SIS update fails
-        else:
-            logger.info("SIS host not configured, skipping SIS update")
-        
-        # Create audit event
-        event_id = str(uuid.uuid4())
-        audit_event = AuditEvent(
-            event_id=event_id,
-            event_type="badge_issued",
-            student_id=sis_request.student_id,
-            badge_id=sis_request.badge_id,
-            badge_template_id=sis_request.badge_template_id,
-            course_id=sis_request.course_id,
-            evaluation_id=sis_request.evaluation_id,
-            score=sis_request.score,
-            rule_id=sis_request.rule_id,
-            workflow_execution_id=sis_request.workflow_execution_id,
-            timestamp=datetime.now(),
-            metadata={
-                "badge_url": sis_request.badge_url,
-                "badge_title": sis_request.badge_title,
-                "issued_at": sis_request.issued_at.isoformat(),
-                "sis_updated": sis_updated
-            }
-        )
-        
-        # Log audit event to Firestore
-        logged_event_id = db_client.log_event(audit_event)
-        logger.info(f"Audit event logged: {logged_event_id}")
-        
-        # Prepare response
-        response = SISUpdateResponse(
-            updated=sis_updated,
-            event_id=event_id,
-            message="SIS updated and event logged successfully" if sis_updated else "Event logged (SIS update skipped)"
-        )
+        response = record_badge(sis_request)
         
         return jsonify(response.model_dump(mode="json")), 200
         
@@ -139,3 +165,192 @@ def update_sis(request: Request):
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+def record_badge(sis_request: SISUpdateRequest) -> SISUpdateResponse:
+    """
+    Record one issued badge in the SIS (if configured) and log its audit
+    event. A failed SIS write is reported in the response, not raised.
+    
+    Args:
+        sis_request: Validated SIS update request
+    
+    Returns:
+        SISUpdateResponse for the request
+    """
+    # Initialize Firestore client for audit logging
+    config = Config.from_env()
+    db_client = get_firestore_client(config)
+    
+    # Update SIS database
+    sis_updated = False
+    if os.environ.get("SIS_DB_HOST"):  # Only update if SIS host is configured
+        try:
+            future = get_sis_batcher().submit(_badge_row(sis_request))
+            try:
+                error = future.result(timeout=SIS_UPDATE_TIMEOUT_SECONDS)
+            except TimeoutError:
+                error = f"no SIS response after {SIS_UPDATE_TIMEOUT_SECONDS:g}s"
+            sis_updated = error is None
+            if sis_updated:
+                logger.info(f"SIS updated for student {sis_request.student_id}")
+            else:
+                logger.warning(f"SIS update skipped: {error}")
+        except Exception as e:
+            logger.warning(f"SIS update failed: {str(e)}")
+            # Continue to log audit event even if SIS update fails
+    else:
+        logger.info("SIS host not configured, skipping SIS update")
+    
+    # Log audit event to Firestore
+    audit_event = _audit_event(sis_request, sis_updated)
+    logged_event_id = db_client.log_event(audit_event)
+    logger.info(f"Audit event logged: {logged_event_id}")
+    
+    return SISUpdateResponse(
+        updated=sis_updated,
+        event_id=audit_event.event_id,
+        message="SIS updated and event logged successfully" if sis_updated else "Event logged (SIS update skipped)"
+    )
+
+
+def update_student_badges(rows: List[BadgeRow]) -> List[Optional[str]]:
+    """
+    Record badges in the SIS in one transaction, retrying once with fresh
+    credentials if the database rejected the cached ones.
+    
+    Returns:
+        One entry per row: None if recorded, otherwise the reason it was not
+    """
+    try:
+        results = get_sis_connector().update_student_badges(rows)
+    except Exception as e:
+        if not SISConnector.is_auth_error(e):
+            raise
+        logger.warning("SIS rejected the credentials, refreshing them from Secret Manager")
+        results = get_sis_connector(refresh_secrets=True).update_student_badges(rows)
+    
+    notify_student_changes(row[0] for row, error in zip(rows, results) if error is None)
+    return results
+
+
+def notify_student_changes(student_ids: Iterable[str]) -> None:
+    """
+    Drop changed students from the student caches of every instance.
+    
+    Failures are logged only: cached entries then expire after their TTL.
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+    config = Config.from_env()
+    get_student_cache(config).invalidate_many(student_ids)
+    try:
+        publish_student_changes(
+            get_firestore_db(config.project_id),
+            config.firestore_collection_student_changes,
+            student_ids
+        )
+    except Exception as e:
+        logger.warning(f"Could not publish student changes: {str(e)}")
+
+
+def update_batch(updates: List[Any]) -> List[SISUpdateResult]:
+    """
+    Record a batch of badges in the SIS and log an audit event for each.
+    
+    Malformed entries and per-row failures produce a SISUpdateResult with
+    ``error`` set instead of failing the whole batch.
+    
+    Args:
+        updates: Raw SIS update payloads
+    
+    Returns:
+        One SISUpdateResult per input, in input order
+    """
+    results: List[SISUpdateResult] = [None] * len(updates)
+    valid = []
+    for i, raw in enumerate(updates):
+        try:
+            valid.append((i, SISUpdateRequest(**raw)))
+        except (TypeError, ValueError) as e:
+            raw = raw if isinstance(raw, dict) else {}
+            results[i] = SISUpdateResult(
+                student_id=str(raw.get("student_id", "")),
+                badge_id=str(raw.get("badge_id", "")),
+                error=f"Validation error: {str(e)}"
+            )
+    if not valid:
+        return results
+    
+    if os.environ.get("SIS_DB_HOST"):
+        try:
+            errors = update_student_badges([_badge_row(request) for _, request in valid])
+        except Exception as e:
+            logger.warning(f"SIS bulk update failed: {str(e)}")
+            errors = [str(e)] * len(valid)
+    else:
+        logger.info("SIS host not configured, skipping SIS update")
+        errors = ["SIS host not configured"] * len(valid)
+    
+    # Submit every audit event first so they share commits, then wait for each
+    db_client = get_firestore_client(Config.from_env())
+    audit_events = [_audit_event(request, error is None) for (_, request), error in zip(valid, errors)]
+    futures = []
+    for audit_event in audit_events:
+        try:
+            futures.append(db_client.log_event_async(audit_event))
+        except Exception as e:  # e.g. the audit buffer stayed full
+            futures.append(e)
+    
+    for (i, request), error, audit_event, future in zip(valid, errors, audit_events, futures):
+        sis_updated = error is None
+        try:
+            if isinstance(future, Exception):
+                raise future
+            future.result(timeout=AUDIT_COMMIT_TIMEOUT)
+            event_id = audit_event.event_id
+        except Exception as e:
+            logger.error(f"Audit event failed for student {request.student_id}: {str(e)}")
+            event_id = None
+            error = error or f"Audit event failed: {str(e)}"
+        results[i] = SISUpdateResult(
+            student_id=request.student_id,
+            badge_id=request.badge_id,
+            updated=sis_updated,
+            event_id=event_id,
+            error=error
+        )
+    return results
+
+
+def _badge_row(sis_request: SISUpdateRequest) -> BadgeRow:
+    return (
+        sis_request.student_id,
+        sis_request.badge_id,
+        sis_request.badge_url,
+        sis_request.badge_title
+    )
+
+
+def _audit_event(sis_request: SISUpdateRequest, sis_updated: bool) -> AuditEvent:
+    """Build the badge_issued audit event for an SIS update."""
+    return AuditEvent(
+        event_id=str(uuid.uuid4()),
+        event_type="badge_issued",
+        student_id=sis_request.student_id,
+        badge_id=sis_request.badge_id,
+        badge_template_id=sis_request.badge_template_id,
+        course_id=sis_request.course_id,
+        evaluation_id=sis_request.evaluation_id,
+        score=sis_request.score,
+        rule_id=sis_request.rule_id,
+        workflow_execution_id=sis_request.workflow_execution_id,
+        timestamp=datetime.now(),
+        metadata={
+            "badge_url": sis_request.badge_url,
+            "badge_title": sis_request.badge_title,
+            "issued_at": sis_request.issued_at.isoformat(),
+            "sis_updated": sis_updated
+        }
+    )
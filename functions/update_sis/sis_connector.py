@@ -4,67 +4,170 @@ Manages connections to the legacy Student Information System database.
 """
 
 import logging
-from typing import Optional, Dict, Any
+import sqlite3
+import sys
+import os
+from typing import Optional, Dict, Any, List, Tuple
 from contextlib import contextmanager
 
+# Add parent directory to path for common module imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.db_pool import ConnectionPool
+
 logger = logging.getLogger(__name__)
 
+# Tables written by the CCA system. The SQLite stand-in creates them with
+# create_schema(); in PostgreSQL they are managed by the SIS team.
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS students (
+        student_id TEXT PRIMARY KEY,
+        first_name TEXT,
+        last_name TEXT,
+        email TEXT,
+        age INTEGER,
+        grade TEXT,
+        gpa REAL,
+        scholarship_status BOOLEAN DEFAULT FALSE,
+        program TEXT,
+        last_badge_date TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_badges (
+        student_id TEXT NOT NULL,
+        badge_id TEXT NOT NULL,
+        badge_url TEXT,
+        badge_title TEXT,
+        awarded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (student_id, badge_id)
+    )
+    """,
+)
+
+SUPPORTED_DRIVERS = ("postgresql", "sqlite")
+
+# Student ids per lookup in bulk updates (SQLite allows 999 parameters)
+BULK_LOOKUP_CHUNK = 500
+
+# (student_id, badge_id, badge_url, badge_title)
+BadgeRow = Tuple[str, str, str, str]
+
+INSERT_BADGE_SQL = (
+    "INSERT INTO student_badges (student_id, badge_id, badge_url, badge_title) "
+    "VALUES %s ON CONFLICT (student_id, badge_id) DO NOTHING"
+)
+
 
 class SISConnector:
     """
     Connector for legacy SIS database.
     
-    Note: This is a stub implementation. Replace with actual database
-    connection logic based on your SIS database type (MySQL, PostgreSQL, Oracle, etc.)
+    Connections come from a pool kept for the life of the connector, so a
+    connector shared across invocations (see update_sis.get_sis_connector)
+    pays the connection setup once per instance. PostgreSQL is used in
+    production; the "sqlite" driver (database = file path) is a local
+    stand-in with the same tables.
     """
     
-    def __init__(self, host: str, database: str, user: str, password: str, port: int = 5432):
+    def __init__(
+        self,
+        host: str,
+        database: str,
+        user: str,
+        password: str,
+        port: int = 5432,
+        driver: str = "postgresql",
+        min_connections: int = 1,
+        max_connections: int = 4,
+        acquire_timeout: float = 30.0,
+        statement_timeout: float = 30.0
+    ):
         """
         Initialize SIS database connector.
         
         Args:
             host: Database host
-            database: Database name
+            database: Database name (file path for sqlite)
             user: Database user
             password: Database password
             port: Database port (default: 5432 for PostgreSQL)
+            driver: "postgresql" or "sqlite"
+            min_connections: Connections kept open once the connector is used
+            max_connections: Maximum concurrent connections
+            acquire_timeout: Seconds to wait for a free pooled connection
+            statement_timeout: Seconds a statement may run (PostgreSQL
+                statement_timeout; the lock wait on SQLite)
         """
+        if driver not in SUPPORTED_DRIVERS:
+            raise ValueError(f"Unsupported SIS driver: {driver}")
         self.host = host
         self.database = database
         self.user = user
         self.password = password
         self.port = port
-        self.connection = None
+        self.driver = driver
+        self.statement_timeout = statement_timeout
+        self.pool = ConnectionPool(
+            self._connect,
+            min_size=min_connections,
+            max_size=max_connections,
+            acquire_timeout=acquire_timeout
+        )
+    
+    def _connect(self):
+        """Open a new database connection (called by the pool)."""
+        logger.info(f"Connecting to SIS database: {self.host}/{self.database}")
+        
+        if self.driver == "sqlite":
+            return sqlite3.connect(self.database, timeout=self.statement_timeout, check_same_thread=False)
+        
+        import psycopg2
+        return psycopg2.connect(
+            host=self.host,
+            dbname=self.database,
+            user=self.user,
+            password=self.password,
+            port=self.port,
+            connect_timeout=10,
+            options=f"-c statement_timeout={int(self.statement_timeout * 1000)}",
+            application_name="cca-update-sis"
+        )
+    
+    def _sql(self, query: str) -> str:
+        """Adapt a query written with %s placeholders to the driver's paramstyle."""
+        return query.replace("%s", "?") if self.driver == "sqlite" else query
     
     @contextmanager
     def get_connection(self):
         """
         Context manager for database connections.
         
+        Borrows a pooled connection; commits on success, rolls back on error.
+        
         Yields:
             Database connection object
         """
-        # TODO: Replace with actual database connection
-        # Example for PostgreSQL:
-        # import psycopg2
-        # conn = psycopg2.connect(
-        #     host=self.host,
-        #     database=self.database,
-        #     user=self.user,
-        #     password=self.password,
-        #     port=self.port
-        # )
-        
-        logger.info(f"Connecting to SIS database: {self.host}/{self.database}")
-        
-        # Stub implementation
-        conn = None
-        
-        try:
+        with self.pool.connection() as conn:
             yield conn
-        finally:
-            if conn:
-                conn.close()
+    
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.pool.close()
+    
+    @staticmethod
+    def is_auth_error(error: Exception) -> bool:
+        """Whether a connection error means the credentials were rejected."""
+        message = str(error).lower()
+        return "authentication failed" in message
+    
+    def create_schema(self) -> None:
+        """Create the CCA tables if missing (local stand-in only)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for statement in SCHEMA:
+                cursor.execute(statement)
     
     def update_student_badge(
         self,
@@ -76,78 +179,180 @@ class SISConnector:
         """
         Update student record with badge information.
         
+        Recording the same badge twice is a no-op.
+        
         Args:
             student_id: Student identifier
             badge_id: Badge identifier
             badge_url: URL to badge
             badge_title: Badge title
-            
+        
         Returns:
-            True if update successful
+            True if update successful, False if the student does not exist
         """
         logger.info(f"Updating SIS for student {student_id} with badge {badge_id}")
         
-        # TODO: Implement actual database update
-        # Example SQL:
-        # UPDATE students
-        # SET badges = array_append(badges, %s),
-        #     last_badge_date = NOW()
-        # WHERE student_id = %s
-        
-        # Stub implementation - simulate successful update
-        logger.info(f"SIS update simulated for student {student_id}")
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self._sql(
+                    "UPDATE students SET last_badge_date = CURRENT_TIMESTAMP WHERE student_id = %s"
+                ),
+                (student_id,)
+            )
+            if cursor.rowcount == 0:
+                logger.warning(f"Student {student_id} not found in SIS")
+                return False
+            cursor.execute(
+                self._sql(INSERT_BADGE_SQL % "(%s, %s, %s, %s)"),
+                (student_id, badge_id, badge_url, badge_title)
+            )
         return True
     
+    def update_student_badges(self, rows: List[BadgeRow]) -> List[Optional[str]]:
+        """
+        Record many badges in one transaction.
+        
+        Missing students are looked up in chunks, the students table is
+        updated with one statement and the badges are inserted in bulk
+        (execute_values on PostgreSQL, executemany on SQLite). If the bulk
+        write fails, rows are retried one by one inside savepoints so a bad
+        row only fails itself.
+        
+        Args:
+            rows: (student_id, badge_id, badge_url, badge_title) tuples
+        
+        Returns:
+            One entry per row, in order: None if recorded, otherwise the
+            reason it was not
+        """
+        if not rows:
+            return []
+        logger.info(f"Updating SIS with {len(rows)} badges")
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            existing = self._existing_students(cursor, {row[0] for row in rows})
+            results: List[Optional[str]] = [
+                None if row[0] in existing else f"Student {row[0]} not found in SIS"
+                for row in rows
+            ]
+            found = [row for row, error in zip(rows, results) if error is None]
+            if not found:
+                return results
+            
+            cursor.execute("SAVEPOINT bulk_badges")
+            try:
+                self._mark_badge_dates(cursor, sorted({row[0] for row in found}))
+                self._insert_badges(cursor, found)
+                cursor.execute("RELEASE SAVEPOINT bulk_badges")
+            except Exception as e:
+                logger.warning(f"Bulk SIS update failed, retrying row by row: {str(e)}")
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_badges")
+                for i, row in enumerate(rows):
+                    if results[i] is None:
+                        results[i] = self._update_row(cursor, row)
+        
+        failed = sum(1 for error in results if error is not None)
+        logger.info(f"SIS bulk update: {len(rows) - failed} recorded, {failed} failed")
+        return results
+    
+    def _existing_students(self, cursor, student_ids) -> set:
+        """Return which of ``student_ids`` exist in the students table."""
+        ids = sorted(student_ids)
+        existing = set()
+        for start in range(0, len(ids), BULK_LOOKUP_CHUNK):
+            chunk = ids[start:start + BULK_LOOKUP_CHUNK]
+            cursor.execute(
+                self._sql(
+                    "SELECT student_id FROM students WHERE student_id IN (%s)"
+                    % ", ".join(["%s"] * len(chunk))
+                ),
+                tuple(chunk)
+            )
+            existing.update(row[0] for row in cursor.fetchall())
+        return existing
+    
+    def _mark_badge_dates(self, cursor, student_ids: List[str]) -> None:
+        for start in range(0, len(student_ids), BULK_LOOKUP_CHUNK):
+            chunk = student_ids[start:start + BULK_LOOKUP_CHUNK]
+            cursor.execute(
+                self._sql(
+                    "UPDATE students SET last_badge_date = CURRENT_TIMESTAMP WHERE student_id IN (%s)"
+                    % ", ".join(["%s"] * len(chunk))
+                ),
+                tuple(chunk)
+            )
+    
+    def _insert_badges(self, cursor, rows: List[BadgeRow]) -> None:
+        if self.driver == "sqlite":
+            cursor.executemany(self._sql(INSERT_BADGE_SQL % "(%s, %s, %s, %s)"), rows)
+            return
+        from psycopg2.extras import execute_values
+        execute_values(cursor, INSERT_BADGE_SQL, rows, page_size=1000)
+    
+    def _update_row(self, cursor, row: BadgeRow) -> Optional[str]:
+        """Record one badge inside its own savepoint; return the error, if any."""
+        cursor.execute("SAVEPOINT badge_row")
+        try:
+            self._mark_badge_dates(cursor, [row[0]])
+            cursor.execute(self._sql(INSERT_BADGE_SQL % "(%s, %s, %s, %s)"), row)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT badge_row")
+            logger.warning(f"SIS update failed for student {row[0]}: {str(e)}")
+            return str(e)
+        cursor.execute("RELEASE SAVEPOINT badge_row")
+        return None
+    
     def get_student_info(self, student_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve student information from SIS.
         
         Args:
             student_id: Student identifier
-            
+        
         Returns:
             Student information dictionary or None if not found
         """
         logger.info(f"Fetching student info for {student_id}")
         
-        # TODO: Implement actual database query
-        # Example SQL:
-        # SELECT * FROM students WHERE student_id = %s
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self._sql("SELECT student_id, first_name, last_name, email FROM students WHERE student_id = %s"),
+                (student_id,)
+            )
+            row = cursor.fetchone()
         
-        # Stub implementation
+        if row is None:
+            return None
         return {
-            "student_id": student_id,
-            "name": "Student Name",
-            "email": f"{student_id}@university.edu"
+            "student_id": row[0],
+            "name": " ".join(part for part in row[1:3] if part),
+            "email": row[3]
         }
     
-    def execute_transaction(self, queries: list) -> bool:
+    def execute_transaction(self, queries: List[Tuple[str, tuple]]) -> bool:
         """
         Execute multiple queries in a transaction.
         
         Args:
-            queries: List of SQL query tuples (query, params)
-            
+            queries: List of SQL query tuples (query, params), with %s placeholders
+        
         Returns:
             True if transaction successful
+        
+        Raises:
+            Exception: The database error; the transaction is rolled back
         """
-        with self.get_connection() as conn:
-            if not conn:
-                logger.warning("No database connection available")
-                return False
-            
-            # TODO: Implement transaction logic
-            # cursor = conn.cursor()
-            # try:
-            #     for query, params in queries:
-            #         cursor.execute(query, params)
-            #     conn.commit()
-            #     return True
-            # except Exception as e:
-            #     conn.rollback()
-            #     logger.error(f"Transaction failed: {str(e)}")
-            #     raise
-            
-            # Stub implementation
-            logger.info(f"Transaction simulated with {len(queries)} queries")
-            return True
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                for query, params in queries:
+                    cursor.execute(self._sql(query), params)
+        except Exception as e:
+            logger.error(f"Transaction failed: {str(e)}")
+            raise
+        
+        logger.info(f"Transaction committed with {len(queries)} queries")
+        return True
@@ -8,6 +8,11 @@ from flask import Request, jsonify
 import logging
 import sys
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ValidationError
 
 # Add parent directory to path for common module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -16,13 +21,150 @@ from common import (
     Config,
     ValidationRequest,
     ValidationResult,
-    FirestoreClient,
+    EmissionRule,
+    IssuanceDedupe,
+    MoodleClient,
+    get_firestore_client,
+    get_issuance_dedupe,
+    get_moodle_client,
+    get_pedagogical_db,
+    AdvancementRule,
+    Condition,
+    LazyFacts,
+    DEFAULT_COST_MODEL,
+    LearningPath,
+    PathNode,
+    RuleDependencyIndex,
+    event_fields,
 )
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Maximum number of events accepted in a single batch call
+MAX_BATCH_SIZE = int(os.environ.get("VALIDATE_MAX_BATCH_SIZE", "500"))
+
+# How often the requirements of published learning paths are reloaded (0 = never load them)
+PATH_RULES_TTL_SECONDS = float(os.environ.get("PATH_RULES_TTL_SECONDS", "300"))
+
+# Example of a hardcoded advanced rule for demonstration. The requirements
+# of published learning paths are loaded next to it (see refresh_path_rules).
+DEMO_RULE = AdvancementRule(
+    id="adv-rule-001",
+    name="Excellence for Scholarship Students",
+    conditions=[
+        Condition(field="score", operator=">=", value=90),
+        Condition(field="attribute.becado", operator="==", value=True)
+    ]
+)
+
+# Advanced rules indexed by the fact fields they read, so an event only
+# evaluates the rules that depend on what it changed. Student attributes are
+# the expensive facts, so they are checked last.
+ADVANCED_RULES = RuleDependencyIndex(cost_model=DEFAULT_COST_MODEL)
+ADVANCED_RULES.add_rule(
+    DEMO_RULE,
+    metadata={
+        "badge_template_id": "excellence-scholar-badge",
+        "badge_title": "Excelencia Académica (Becado)",
+        "reason": "Met score >= 90 and has scholarship",
+    }
+)
+
+_path_rules_loaded_at: Optional[float] = None
+_path_rules_lock = threading.Lock()
+
+
+def path_rule_metadata(path: LearningPath, node: PathNode) -> Optional[Dict[str, Any]]:
+    """
+    Badge issued when a node's requirements are met.
+    
+    Nodes opt in by naming the template in their metadata data
+    ("badge_template_id", optionally "badge_title").
+    
+    Returns:
+        Metadata for ADVANCED_RULES, or None if the node issues no badge
+    """
+    data = node.metadata.data if node.metadata else {}
+    template_id = data.get("badge_template_id")
+    if not template_id:
+        return None
+    return {
+        "badge_template_id": template_id,
+        "badge_title": data.get("badge_title") or node.label,
+        "reason": f"Met the requirements of '{node.label}' in learning path {path.name}",
+    }
+
+
+def load_path_rules(paths: List[LearningPath]) -> int:
+    """
+    Register the requirements of badge-issuing path nodes in ADVANCED_RULES.
+    
+    Each node is indexed under its reference_id (the course it guards).
+    Rules of reloaded paths are replaced in place, and rules of nodes or
+    paths that are gone are dropped, so lookups never see a gap.
+    
+    Args:
+        paths: Published learning paths
+        
+    Returns:
+        Number of rules registered
+    """
+    count = 0
+    loaded = set()
+    for path in paths:
+        keep = set()
+        for node in path.nodes:
+            metadata = path_rule_metadata(path, node) if node.requirements else None
+            if metadata is None:
+                continue
+            dependent = ADVANCED_RULES.add_rule(
+                node.requirements,
+                course_id=node.reference_id,
+                path_id=path.id,
+                node_id=node.id,
+                metadata=metadata
+            )
+            keep.add(dependent.key)
+            count += 1
+        ADVANCED_RULES.remove_path(path.id, keep=keep)
+        loaded.add(path.id)
+    for path_id in ADVANCED_RULES.path_ids() - loaded:
+        ADVANCED_RULES.remove_path(path_id)
+    return count
+
+
+def refresh_path_rules(config: Config) -> None:
+    """
+    Load the rules of published learning paths on first use, then again
+    every PATH_RULES_TTL_SECONDS.
+    
+    One thread reloads while the others keep using the current rules. A
+    failed load is logged and retried after the TTL.
+    """
+    global _path_rules_loaded_at
+    if PATH_RULES_TTL_SECONDS <= 0:
+        return
+    loaded_at = _path_rules_loaded_at
+    if loaded_at is not None and time.monotonic() - loaded_at < PATH_RULES_TTL_SECONDS:
+        return
+    # The first load is waited for; later refreshes are not
+    if not _path_rules_lock.acquire(blocking=loaded_at is None):
+        return
+    try:
+        if _path_rules_loaded_at is not loaded_at:
+            return  # Another thread just loaded them
+        try:
+            paths = get_pedagogical_db(config).list_learning_paths(status="published")
+            count = load_path_rules(paths)
+            logger.info(f"Loaded {count} advanced rules from {len(paths)} learning paths")
+        except Exception as e:
+            logger.error(f"Could not load learning path rules: {str(e)}", exc_info=True)
+        _path_rules_loaded_at = time.monotonic()
+    finally:
+        _path_rules_lock.release()
+
 
 @functions_framework.http
 def validate_rule(request: Request):
@@ -36,9 +178,12 @@ def validate_rule(request: Request):
             - evaluation_id: str
             - score: float
             - timestamp: str (ISO format)
+        or, in batch mode, a list of such objects (either the body itself
+        or under an "events" key).
     
     Returns:
-        JSON response with ValidationResult
+        JSON response with ValidationResult, or {"results": [...]} with one
+        ValidationResult per input event in batch mode
     """
     try:
         # Parse request
@@ -46,85 +191,245 @@ def validate_rule(request: Request):
         if not request_json:
             return jsonify({"error": "Invalid JSON body"}), 400
         
+        if isinstance(request_json, list) or "events" in request_json:
+            events = request_json if isinstance(request_json, list) else request_json["events"]
+            if not isinstance(events, list):
+                return jsonify({"error": "Validation error: 'events' must be a list"}), 400
+            if len(events) > MAX_BATCH_SIZE:
+                return jsonify({"error": f"Validation error: batch exceeds {MAX_BATCH_SIZE} events"}), 400
+            
+            logger.info(f"Validating rule batch of {len(events)} events")
+            results = validate_batch(events)
+            return jsonify({"results": [r.model_dump(mode="json") for r in results]}), 200
+        
         logger.info(f"Validating rule for request: {request_json}")
         
         # Validate input using Pydantic
         validation_request = ValidationRequest(**request_json)
+        result = validate_event(validation_request)
         
-        # Initialize clients
-        config = Config.from_env()
-        db_client = FirestoreClient(config)
-        moodle_client = MoodleClient(api_url="https://moodle.example.com", token="mock-token")
+        return jsonify(result.model_dump(mode="json")), 200
         
-        # 1. Check for legacy simple rules first
-        matching_rule = db_client.get_matching_rule(
-            course_id=validation_request.course_id,
-            evaluation_id=validation_request.evaluation_id,
-            score=validation_request.score
-        )
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        return jsonify({"error": f"Validation error: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+def validate_event(validation_request: ValidationRequest) -> ValidationResult:
+    """
+    Validate a single event: evaluate its course rules and claim the
+    issuance of the matched rule.
+    
+    The emission rule comes from get_matching_rule: the rule index when it
+    is enabled, otherwise two limit(1) Firestore queries, so a course's
+    rules are never read in full for one event.
+    
+    Args:
+        validation_request: Validated request
         
-        if matching_rule:
-            logger.info(f"Found matching legacy rule: {matching_rule.rule_id}")
-            result = ValidationResult(
-                is_valid=True,
-                rule_id=matching_rule.rule_id,
-                badge_template_id=matching_rule.badge_template_id,
-                badge_title=matching_rule.badge_title,
-                reason=f"Score {validation_request.score} meets minimum {matching_rule.min_score}"
+    Returns:
+        ValidationResult for the request
+    """
+    # Shared clients (created once per instance)
+    config = Config.from_env()
+    db_client = get_firestore_client(config)
+    moodle_client = get_moodle_client()
+    refresh_path_rules(config)
+    
+    matching_rule = db_client.get_matching_rule(
+        validation_request.course_id,
+        validation_request.evaluation_id,
+        validation_request.score
+    )
+    result = evaluate_request(validation_request, matching_rule, moodle_client)
+    return deduplicate(validation_request, result, get_issuance_dedupe(config))
+
+
+def validate_batch(events: List[Any]) -> List[ValidationResult]:
+    """
+    Validate a batch of events with one rule fetch per course.
+    
+    Malformed events and per-event failures produce a ValidationResult with
+    ``error`` set instead of failing the whole batch.
+    
+    Args:
+        events: Raw event payloads
+        
+    Returns:
+        One ValidationResult per input event, in input order
+    """
+    results: List[ValidationResult] = [None] * len(events)
+    by_course: Dict[str, List[Tuple[int, ValidationRequest]]] = OrderedDict()
+    
+    for i, item in enumerate(events):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("event must be a JSON object")
+            validation_request = ValidationRequest(**item)
+        except (ValidationError, ValueError, TypeError) as e:
+            results[i] = ValidationResult(
+                is_valid=False,
+                reason="Malformed event",
+                error=f"Validation error: {str(e)}"
             )
-            return jsonify(result.model_dump(mode="json")), 200
+            continue
+        by_course.setdefault(validation_request.course_id, []).append((i, validation_request))
+    
+    if by_course:
+        config = Config.from_env()
+        db_client = get_firestore_client(config)
+        moodle_client = get_moodle_client()
+        dedupe = get_issuance_dedupe(config)
+        refresh_path_rules(config)
+    
+    for course_id, items in by_course.items():
+        try:
+            course_rules = db_client.get_course_rules(course_id)
+        except Exception as e:
+            logger.error(f"Rule fetch failed for course {course_id}: {str(e)}", exc_info=True)
+            for i, _ in items:
+                results[i] = ValidationResult(
+                    is_valid=False,
+                    reason="Rule lookup failed",
+                    error=f"Internal server error: {str(e)}"
+                )
+            continue
+        
+        for i, validation_request in items:
+            try:
+                matching_rule = course_rules.match(validation_request.evaluation_id, validation_request.score)
+                result = evaluate_request(validation_request, matching_rule, moodle_client)
+                results[i] = deduplicate(validation_request, result, dedupe)
+            except Exception as e:
+                logger.error(f"Validation failed for event {i}: {str(e)}", exc_info=True)
+                results[i] = ValidationResult(
+                    is_valid=False,
+                    reason="Validation failed",
+                    error=f"Internal server error: {str(e)}"
+                )
+    
+    return results
 
-        # 2. Check for advanced pedagogical rules
-        # Fetch student attributes (SIS Connector)
-        student_attrs = moodle_client.get_student_attributes(validation_request.student_id)
+
+def deduplicate(
+    validation_request: ValidationRequest,
+    result: ValidationResult,
+    dedupe: Optional[IssuanceDedupe]
+) -> ValidationResult:
+    """
+    Claim the issuance of a matched rule, turning repeats into duplicates.
+    
+    Regrades, webhook retries and Pub/Sub redeliveries of an event that
+    already led (or is leading) to a badge come back with ``duplicate`` set
+    and ``is_valid`` False, so the workflow stops before Acreditta and SIS.
+    If the claim cannot be checked the event goes through: Acreditta's
+    idempotency key still prevents a second badge.
+    
+    Args:
+        validation_request: Validated request
+        result: Result of evaluate_request
+        dedupe: Issuance deduplicator (None when disabled)
         
-        # Prepare facts for evaluation
-        facts = {
-            "score": validation_request.score,
+    Returns:
+        ``result``, or a duplicate result
+    """
+    if dedupe is None or not result.is_valid:
+        return result
+    
+    key = IssuanceDedupe.key(
+        validation_request.student_id,
+        validation_request.course_id,
+        validation_request.evaluation_id,
+        result.rule_id
+    )
+    try:
+        existing = dedupe.claim(key, {
+            "student_id": validation_request.student_id,
             "course_id": validation_request.course_id,
             "evaluation_id": validation_request.evaluation_id,
-            "attribute": student_attrs
-        }
-        
-        # Query for advanced rules in Firestore (this is a simplified example)
-        # In a real scenario, we would query a specific collection for LearningPath rules
-        pedagogical_db = PedagogicalDBClient(config)
-        # For demonstration, let's assume we search for rules linked to this course
-        # This part is illustrative of how the RuleEvaluator would be used
-        
-        logger.info(f"Evaluating advanced rules with facts: {facts}")
+            "rule_id": result.rule_id,
+        })
+    except Exception as e:
+        logger.warning(f"Issuance dedupe unavailable, not deduplicating: {str(e)}")
+        return result
+    if existing is None:
+        return result
+    
+    logger.info(f"Duplicate issuance for student {validation_request.student_id}, rule {result.rule_id}")
+    return result.model_copy(update={
+        "is_valid": False,
+        "duplicate": True,
+        "reason": f"Badge already {existing.get('status', 'claimed')} for this evaluation and rule"
+    })
+
+
+def evaluate_request(
+    validation_request: ValidationRequest,
+    matching_rule: Optional[EmissionRule],
+    moodle_client: MoodleClient
+) -> ValidationResult:
+    """
+    Evaluate legacy and advanced rules for a single validation request.
+    
+    Args:
+        validation_request: Validated request
+        matching_rule: Emission rule matched for the request's course,
+            evaluation and score (None if none applies)
+        moodle_client: Client used to fetch student attributes
         
-        # Example of a hardcoded advanced rule for demonstration
-        demo_rule = AdvancementRule(
-            id="adv-rule-001",
-            name="Excellence for Scholarship Students",
-            conditions=[
-                Condition(field="score", operator=">=", value=90),
-                Condition(field="attribute.becado", operator="==", value=True)
-            ]
+    Returns:
+        ValidationResult for the request
+    """
+    # 1. Check for legacy simple rules first
+    if matching_rule:
+        logger.info(f"Found matching legacy rule: {matching_rule.rule_id}")
+        return ValidationResult(
+            is_valid=True,
+            rule_id=matching_rule.rule_id,
+            badge_template_id=matching_rule.badge_template_id,
+            badge_title=matching_rule.badge_title,
+            reason=f"Score {validation_request.score} meets minimum {matching_rule.min_score}"
         )
-        
-        if RuleEvaluator.evaluate(demo_rule, facts):
-            logger.info("Advanced rule matched!")
-            result = ValidationResult(
+
+    # 2. Check for advanced pedagogical rules
+    # Student attributes (SIS Connector) are fetched only if a rule reads them
+    # The graded evaluation is also exposed as the activity facts that path
+    # requirements read (see event_fields)
+    student_id = validation_request.student_id
+    evaluation_id = validation_request.evaluation_id
+    facts = LazyFacts(
+        {
+            "score": validation_request.score,
+            "course_id": validation_request.course_id,
+            "evaluation_id": evaluation_id,
+            f"activity_score_{evaluation_id}": validation_request.score,
+            f"activity_completed_{evaluation_id}": True,
+        },
+        {"attribute": lambda: moodle_client.get_student_attributes(student_id)}
+    )
+    
+    logger.info(f"Evaluating advanced rules with facts: {facts}")
+    
+    affected = ADVANCED_RULES.affected(
+        validation_request.course_id,
+        event_fields(validation_request.evaluation_id)
+    )
+    for dependent in affected:
+        if dependent.check(facts):
+            logger.info(f"Advanced rule matched: {dependent.rule.id}")
+            return ValidationResult(
                 is_valid=True,
-                rule_id=demo_rule.id,
-                badge_template_id="excellence-scholar-badge",
-                badge_title="Excelencia Académica (Becado)",
-                reason="Met score >= 90 and has scholarship"
-            )
-        else:
-            logger.info("No matching rule found (legacy or advanced)")
-            result = ValidationResult(
-                is_valid=False,
-                reason="No rule matched the criteria"
+                rule_id=dependent.rule.id,
+                badge_template_id=dependent.metadata.get("badge_template_id"),
+                badge_title=dependent.metadata.get("badge_title"),
+                reason=dependent.metadata.get("reason", f"Met advanced rule {dependent.rule.name}")
             )
-        
-        return jsonify(result.model_dump(mode="json")), 200
-        
-    except ValueError as e:
-        logger.error(f"Validation error: {str(e)}")
-        return jsonify({"error": f"Validation error: {str(e)}"}), 400
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+    
+    logger.info("No matching rule found (legacy or advanced)")
+    return ValidationResult(
+        is_valid=False,
+        reason="No rule matched the criteria"
+    )
@@ -50,6 +50,36 @@ resource "google_pubsub_topic" "moodle_events" {
   depends_on = [google_project_service.required_apis]
 }
 
+# Invalid Moodle events, and events that kept failing in batch consumption
+resource "google_pubsub_topic" "moodle_events_dead_letter" {
+  name = "moodle-evaluation-events-dead-letter"
+  
+  labels = {
+    environment = var.environment
+    component   = "cca"
+  }
+  
+  depends_on = [google_project_service.required_apis]
+}
+
+# Keeps dead-lettered events for inspection and replay
+resource "google_pubsub_subscription" "moodle_events_dead_letter" {
+  name  = "moodle-events-dead-letter"
+  topic = google_pubsub_topic.moodle_events_dead_letter.name
+  
+  message_retention_duration = "604800s"
+  ack_deadline_seconds       = 60
+  
+  expiration_policy {
+    ttl = ""
+  }
+  
+  labels = {
+    environment = var.environment
+    component   = "cca"
+  }
+}
+
 # Firestore Database (Native Mode)
 resource "google_firestore_database" "cca_database" {
   name        = "(default)"
@@ -59,6 +89,88 @@ resource "google_firestore_database" "cca_database" {
   depends_on = [google_project_service.required_apis]
 }
 
+# Composite index for get_matching_rule: equality on active/course_id/evaluation_id,
+# min_score <= score, ordered by min_score desc (document ID breaks ties), limit 1
+resource "google_firestore_index" "rules_matching" {
+  database   = google_firestore_database.cca_database.name
+  collection = "reglas_emision"
+  
+  fields {
+    field_path = "active"
+    order      = "ASCENDING"
+  }
+  
+  fields {
+    field_path = "course_id"
+    order      = "ASCENDING"
+  }
+  
+  fields {
+    field_path = "evaluation_id"
+    order      = "ASCENDING"
+  }
+  
+  fields {
+    field_path = "min_score"
+    order      = "DESCENDING"
+  }
+  
+  fields {
+    field_path = "__name__"
+    order      = "DESCENDING"
+  }
+}
+
+# Issuance outbox: leasing queries pending messages by availability and
+# expired leases by lease end
+resource "google_firestore_index" "outbox_pending" {
+  database   = google_firestore_database.cca_database.name
+  collection = "outbox_emision"
+  
+  fields {
+    field_path = "status"
+    order      = "ASCENDING"
+  }
+  
+  fields {
+    field_path = "available_at"
+    order      = "ASCENDING"
+  }
+}
+
+resource "google_firestore_index" "outbox_expired_leases" {
+  database   = google_firestore_database.cca_database.name
+  collection = "outbox_emision"
+  
+  fields {
+    field_path = "status"
+    order      = "ASCENDING"
+  }
+  
+  fields {
+    field_path = "leased_until"
+    order      = "ASCENDING"
+  }
+}
+
+# Shared badge verification cache: Firestore deletes expired entries
+resource "google_firestore_field" "verification_cache_ttl" {
+  database   = google_firestore_database.cca_database.name
+  collection = "cache_verificacion"
+  field      = "expires_at"
+  
+  ttl_config {}
+}
+
+# Student change markers written by update_sis for the student caches
+resource "google_firestore_field" "student_changes_ttl" {
+  database   = google_firestore_database.cca_database.name
+  collection = "cambios_estudiante"
+  field      = "expires_at"
+  
+  ttl_config {}
+}
+
 # Secret Manager Secrets
 resource "google_secret_manager_secret" "acreditta_api_key" {
   secret_id = "acreditta-api-key"
@@ -172,6 +284,18 @@ data "archive_file" "update_sis_source" {
   output_path = "${path.module}/../../build/update_sis.zip"
 }
 
+data "archive_file" "issuance_outbox_source" {
+  type        = "zip"
+  source_dir  = "${path.module}/../../functions/issuance_outbox"
+  output_path = "${path.module}/../../build/issuance_outbox.zip"
+}
+
+data "archive_file" "process_event_source" {
+  type        = "zip"
+  source_dir  = "${path.module}/../../functions/process_event"
+  output_path = "${path.module}/../../build/process_event.zip"
+}
+
 # Upload function source to Cloud Storage
 resource "google_storage_bucket_object" "validate_rule_source" {
   name   = "validate_rule-${data.archive_file.validate_rule_source.output_md5}.zip"
@@ -191,6 +315,18 @@ resource "google_storage_bucket_object" "update_sis_source" {
   source = data.archive_file.update_sis_source.output_path
 }
 
+resource "google_storage_bucket_object" "issuance_outbox_source" {
+  name   = "issuance_outbox-${data.archive_file.issuance_outbox_source.output_md5}.zip"
+  bucket = google_storage_bucket.function_source.name
+  source = data.archive_file.issuance_outbox_source.output_path
+}
+
+resource "google_storage_bucket_object" "process_event_source" {
+  name   = "process_event-${data.archive_file.process_event_source.output_md5}.zip"
+  bucket = google_storage_bucket.function_source.name
+  source = data.archive_file.process_event_source.output_path
+}
+
 # Cloud Function 1: Validate Rule
 resource "google_cloudfunctions2_function" "validate_rule" {
   name        = "cca-validate-rule"
@@ -295,6 +431,8 @@ resource "google_cloudfunctions2_function" "update_sis" {
     max_instance_count    = var.function_max_instances
     min_instance_count    = var.function_min_instances
     available_memory      = var.function_memory
+    available_cpu         = "1"
+    max_instance_request_concurrency = var.update_sis_concurrency
     timeout_seconds       = var.function_timeout
     service_account_email = google_service_account.cca_functions.email
     
@@ -317,6 +455,232 @@ resource "google_cloudfunctions2_function" "update_sis" {
   depends_on = [google_project_service.required_apis]
 }
 
+# Cloud Function 4: Enqueue Issuance (issuance_mode = "outbox")
+resource "google_cloudfunctions2_function" "enqueue_issuance" {
+  name        = "cca-enqueue-issuance"
+  location    = var.region
+  description = "Persists validated issuances in the outbox"
+  
+  build_config {
+    runtime     = var.function_runtime
+    entry_point = "enqueue_issuance"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.issuance_outbox_source.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = var.function_max_instances
+    min_instance_count    = var.function_min_instances
+    available_memory      = var.function_memory
+    timeout_seconds       = var.function_timeout
+    service_account_email = google_service_account.cca_functions.email
+    
+    environment_variables = {
+      GCP_PROJECT_ID = var.project_id
+      ENVIRONMENT    = var.environment
+    }
+  }
+  
+  labels = {
+    environment = var.environment
+    component   = "cca"
+    function    = "enqueue-issuance"
+  }
+  
+  depends_on = [google_project_service.required_apis]
+}
+
+# Cloud Function 5: Drain Outbox (single instance: the rate limit is per instance)
+resource "google_cloudfunctions2_function" "drain_outbox" {
+  name        = "cca-drain-outbox"
+  location    = var.region
+  description = "Issues queued badges and updates the SIS at a sustainable rate"
+  
+  build_config {
+    runtime     = var.function_runtime
+    entry_point = "drain_outbox"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.issuance_outbox_source.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = 1
+    min_instance_count    = 0
+    available_memory      = var.function_memory
+    timeout_seconds       = 300
+    service_account_email = google_service_account.cca_functions.email
+    
+    environment_variables = {
+      GCP_PROJECT_ID       = var.project_id
+      ENVIRONMENT          = var.environment
+      CALL_ACREDITTA_URL   = google_cloudfunctions2_function.call_acreditta.service_config[0].uri
+      UPDATE_SIS_URL       = google_cloudfunctions2_function.update_sis.service_config[0].uri
+      OUTBOX_RATE_LIMIT    = var.outbox_rate_limit
+      OUTBOX_DRAIN_SECONDS = 240
+    }
+  }
+  
+  labels = {
+    environment = var.environment
+    component   = "cca"
+    function    = "drain-outbox"
+  }
+  
+  depends_on = [google_project_service.required_apis]
+}
+
+# Cloud Function 6: Process Event (pipeline_mode = "fused")
+resource "google_cloudfunctions2_function" "process_event" {
+  name        = "cca-process-event"
+  location    = var.region
+  description = "Validates, issues and records a badge in one process (fused pipeline)"
+  
+  build_config {
+    runtime     = var.function_runtime
+    entry_point = "process_event"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.process_event_source.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = var.function_max_instances
+    min_instance_count    = var.function_min_instances
+    available_memory      = var.function_memory
+    available_cpu         = "1"
+    max_instance_request_concurrency = var.process_event_concurrency
+    timeout_seconds       = var.function_timeout
+    service_account_email = google_service_account.cca_functions.email
+    
+    environment_variables = {
+      GCP_PROJECT_ID      = var.project_id
+      ENVIRONMENT         = var.environment
+      ACREDITTA_API_URL   = var.acreditta_api_url
+      ACREDITTA_SECRET_ID = google_secret_manager_secret.acreditta_api_key.secret_id
+      SIS_DB_HOST         = var.sis_db_host
+      SIS_DB_NAME         = var.sis_db_name
+      SIS_USER_SECRET_ID  = google_secret_manager_secret.sis_db_user.secret_id
+      SIS_PASS_SECRET_ID  = google_secret_manager_secret.sis_db_pass.secret_id
+      # Sizes the Acreditta connection pool
+      FUNCTION_CONCURRENCY = var.process_event_concurrency
+    }
+  }
+  
+  labels = {
+    environment = var.environment
+    component   = "cca"
+    function    = "process-event"
+  }
+  
+  depends_on = [google_project_service.required_apis]
+}
+
+# Cloud Function 7: Consume Events (pipeline_mode = "batch")
+resource "google_cloudfunctions2_function" "consume_events" {
+  name        = "cca-consume-events"
+  location    = var.region
+  description = "Pulls Moodle events in batches and runs the fused pipeline on each batch"
+  
+  build_config {
+    runtime     = var.function_runtime
+    entry_point = "consume_events"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.process_event_source.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = var.function_max_instances
+    min_instance_count    = 0
+    available_memory      = var.function_memory
+    timeout_seconds       = 300
+    service_account_email = google_service_account.cca_functions.email
+    
+    environment_variables = {
+      GCP_PROJECT_ID           = var.project_id
+      ENVIRONMENT              = var.environment
+      ACREDITTA_API_URL        = var.acreditta_api_url
+      ACREDITTA_SECRET_ID      = google_secret_manager_secret.acreditta_api_key.secret_id
+      SIS_DB_HOST              = var.sis_db_host
+      SIS_DB_NAME              = var.sis_db_name
+      SIS_USER_SECRET_ID       = google_secret_manager_secret.sis_db_user.secret_id
+      SIS_PASS_SECRET_ID       = google_secret_manager_secret.sis_db_pass.secret_id
+      EVENTS_SUBSCRIPTION      = "moodle-events-batch"
+      EVENTS_DEAD_LETTER_TOPIC = google_pubsub_topic.moodle_events_dead_letter.name
+      CONSUMER_BATCH_SIZE      = var.consumer_batch_size
+      CONSUMER_BATCH_SECONDS   = 60
+      # Same as timeout_seconds; the drain budget keeps a margin below it
+      FUNCTION_TIMEOUT_SECONDS = 300
+    }
+  }
+  
+  labels = {
+    environment = var.environment
+    component   = "cca"
+    function    = "consume-events"
+  }
+  
+  depends_on = [google_project_service.required_apis]
+}
+
+resource "google_cloud_scheduler_job" "consume_events" {
+  count            = var.pipeline_mode == "batch" ? 1 : 0
+  name             = "cca-consume-events"
+  region           = var.region
+  description      = "Consumes Moodle events in batches"
+  schedule         = var.consumer_schedule
+  attempt_deadline = "320s"
+  
+  http_target {
+    http_method = "POST"
+    uri         = google_cloudfunctions2_function.consume_events.service_config[0].uri
+    
+    oidc_token {
+      service_account_email = google_service_account.cca_functions.email
+    }
+  }
+  
+  depends_on = [google_project_service.required_apis]
+}
+
+resource "google_cloud_scheduler_job" "drain_outbox" {
+  count            = var.issuance_mode == "outbox" ? 1 : 0
+  name             = "cca-drain-outbox"
+  region           = var.region
+  description      = "Drains the badge issuance outbox"
+  schedule         = var.outbox_drain_schedule
+  attempt_deadline = "320s"
+  
+  http_target {
+    http_method = "POST"
+    uri         = google_cloudfunctions2_function.drain_outbox.service_config[0].uri
+    
+    oidc_token {
+      service_account_email = google_service_account.cca_functions.email
+    }
+  }
+  
+  depends_on = [google_project_service.required_apis]
+}
+
 # IAM permissions for functions
 resource "google_project_iam_member" "functions_firestore_user" {
   project = var.project_id
@@ -330,6 +694,12 @@ resource "google_project_iam_member" "functions_pubsub_publisher" {
   member  = "serviceAccount:${google_service_account.cca_functions.email}"
 }
 
+resource "google_project_iam_member" "functions_pubsub_subscriber" {
+  project = var.project_id
+  role    = "roles/pubsub.subscriber"
+  member  = "serviceAccount:${google_service_account.cca_functions.email}"
+}
+
 # Cloud Workflow
 resource "google_workflows_workflow" "cca_badge_issue_flow" {
   name            = "cca-badge-issue-flow"
@@ -340,12 +710,18 @@ resource "google_workflows_workflow" "cca_badge_issue_flow" {
   source_contents = replace(
     replace(
       replace(
-        file("${path.module}/workflow.yaml"),
-        "VALIDATE_RULE_URL_PLACEHOLDER", google_cloudfunctions2_function.validate_rule.service_config[0].uri
+        replace(
+          replace(
+            file("${path.module}/workflow.yaml"),
+            "VALIDATE_RULE_URL_PLACEHOLDER", google_cloudfunctions2_function.validate_rule.service_config[0].uri
+          ),
+          "CALL_ACREDITTA_URL_PLACEHOLDER", google_cloudfunctions2_function.call_acreditta.service_config[0].uri
+        ),
+        "UPDATE_SIS_URL_PLACEHOLDER", google_cloudfunctions2_function.update_sis.service_config[0].uri
       ),
-      "CALL_ACREDITTA_URL_PLACEHOLDER", google_cloudfunctions2_function.call_acreditta.service_config[0].uri
+      "ENQUEUE_ISSUANCE_URL_PLACEHOLDER", google_cloudfunctions2_function.enqueue_issuance.service_config[0].uri
     ),
-    "UPDATE_SIS_URL_PLACEHOLDER", google_cloudfunctions2_function.update_sis.service_config[0].uri
+    "ISSUANCE_MODE_PLACEHOLDER", var.issuance_mode
   )
   
   labels = {
@@ -357,17 +733,23 @@ resource "google_workflows_workflow" "cca_badge_issue_flow" {
     google_project_service.required_apis,
     google_cloudfunctions2_function.validate_rule,
     google_cloudfunctions2_function.call_acreditta,
-    google_cloudfunctions2_function.update_sis
+    google_cloudfunctions2_function.update_sis,
+    google_cloudfunctions2_function.enqueue_issuance
   ]
 }
 
-# Pub/Sub subscription to trigger workflow
+# Pub/Sub subscription to trigger workflow (or process_event in fused mode)
 resource "google_pubsub_subscription" "workflow_trigger" {
+  count = var.pipeline_mode == "batch" ? 0 : 1
   name  = "moodle-events-workflow-trigger"
   topic = google_pubsub_topic.moodle_events.name
   
   push_config {
-    push_endpoint = "https://workflowexecutions.googleapis.com/v1/${google_workflows_workflow.cca_badge_issue_flow.id}/executions"
+    push_endpoint = (
+      var.pipeline_mode == "fused"
+      ? google_cloudfunctions2_function.process_event.service_config[0].uri
+      : "https://workflowexecutions.googleapis.com/v1/${google_workflows_workflow.cca_badge_issue_flow.id}/executions"
+    )
     
     oidc_token {
       service_account_email = google_service_account.cca_functions.email
@@ -387,6 +769,50 @@ resource "google_pubsub_subscription" "workflow_trigger" {
   }
 }
 
+# Pull subscription consumed in batches by consume_events (pipeline_mode = "batch")
+resource "google_pubsub_subscription" "moodle_events_batch" {
+  count = var.pipeline_mode == "batch" ? 1 : 0
+  name  = "moodle-events-batch"
+  topic = google_pubsub_topic.moodle_events.name
+  
+  # Long enough for a whole batch, issuance included
+  ack_deadline_seconds = 600
+  
+  retry_policy {
+    minimum_backoff = "10s"
+    maximum_backoff = "600s"
+  }
+  
+  # Events nacked this many times are moved to the dead-letter topic
+  dead_letter_policy {
+    dead_letter_topic     = google_pubsub_topic.moodle_events_dead_letter.id
+    max_delivery_attempts = var.consumer_max_delivery_attempts
+  }
+  
+  labels = {
+    environment = var.environment
+    component   = "cca"
+  }
+}
+
+# The Pub/Sub service agent forwards undeliverable events to the dead-letter topic
+data "google_project" "current" {
+  project_id = var.project_id
+}
+
+resource "google_pubsub_topic_iam_member" "dead_letter_publisher" {
+  topic  = google_pubsub_topic.moodle_events_dead_letter.name
+  role   = "roles/pubsub.publisher"
+  member = "serviceAccount:service-${data.google_project.current.number}@gcp-sa-pubsub.iam.gserviceaccount.com"
+}
+
+resource "google_pubsub_subscription_iam_member" "batch_dead_letter_subscriber" {
+  count        = var.pipeline_mode == "batch" ? 1 : 0
+  subscription = google_pubsub_subscription.moodle_events_batch[0].name
+  role         = "roles/pubsub.subscriber"
+  member       = "serviceAccount:service-${data.google_project.current.number}@gcp-sa-pubsub.iam.gserviceaccount.com"
+}
+
 # IAM for workflow invocation
 resource "google_project_iam_member" "workflow_invoker" {
   project = var.project_id
@@ -417,3 +843,35 @@ resource "google_cloudfunctions2_function_iam_member" "update_sis_invoker" {
   role           = "roles/cloudfunctions.invoker"
   member         = "serviceAccount:${google_service_account.cca_functions.email}"
 }
+
+resource "google_cloudfunctions2_function_iam_member" "enqueue_issuance_invoker" {
+  project        = google_cloudfunctions2_function.enqueue_issuance.project
+  location       = google_cloudfunctions2_function.enqueue_issuance.location
+  cloud_function = google_cloudfunctions2_function.enqueue_issuance.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cca_functions.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "drain_outbox_invoker" {
+  project        = google_cloudfunctions2_function.drain_outbox.project
+  location       = google_cloudfunctions2_function.drain_outbox.location
+  cloud_function = google_cloudfunctions2_function.drain_outbox.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cca_functions.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "process_event_invoker" {
+  project        = google_cloudfunctions2_function.process_event.project
+  location       = google_cloudfunctions2_function.process_event.location
+  cloud_function = google_cloudfunctions2_function.process_event.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cca_functions.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "consume_events_invoker" {
+  project        = google_cloudfunctions2_function.consume_events.project
+  location       = google_cloudfunctions2_function.consume_events.location
+  cloud_function = google_cloudfunctions2_function.consume_events.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cca_functions.email}"
+}
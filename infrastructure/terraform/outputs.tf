@@ -33,6 +33,21 @@ output "update_sis_function_url" {
   value       = google_cloudfunctions2_function.update_sis.service_config[0].uri
 }
 
+output "process_event_function_url" {
+  description = "URL of the process_event Cloud Function (fused pipeline)"
+  value       = google_cloudfunctions2_function.process_event.service_config[0].uri
+}
+
+output "consume_events_function_url" {
+  description = "URL of the consume_events Cloud Function (batch consumption)"
+  value       = google_cloudfunctions2_function.consume_events.service_config[0].uri
+}
+
+output "dead_letter_topic_name" {
+  description = "Pub/Sub topic receiving invalid and undeliverable Moodle events"
+  value       = google_pubsub_topic.moodle_events_dead_letter.name
+}
+
 output "service_account_email" {
   description = "Email of the service account used by functions"
   value       = google_service_account.cca_functions.email
@@ -77,3 +92,8 @@ output "deployment_instructions" {
        gcloud workflows execute ${google_workflows_workflow.cca_badge_issue_flow.name} --location=${var.region}
   EOT
 }
+
+output "enqueue_issuance_function_url" {
+  description = "URL of the enqueue_issuance Cloud Function"
+  value       = google_cloudfunctions2_function.enqueue_issuance.service_config[0].uri
+}
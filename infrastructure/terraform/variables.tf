@@ -68,3 +68,62 @@ variable "sis_db_name" {
   type        = string
   default     = "sis_production"
 }
+
+variable "issuance_mode" {
+  description = "How the workflow issues badges: \"sync\" (call Acreditta and SIS inline) or \"outbox\" (enqueue, drained on a schedule)"
+  type        = string
+  default     = "sync"
+}
+
+variable "pipeline_mode" {
+  description = "Where Moodle events are processed: \"workflow\" (Cloud Workflow calling one function per stage), \"fused\" (process_event runs every stage in one function per event) or \"batch\" (consume_events pulls events in batches on a schedule). Badges are always issued inline outside \"workflow\""
+  type        = string
+  default     = "workflow"
+  
+  validation {
+    condition     = contains(["workflow", "fused", "batch"], var.pipeline_mode)
+    error_message = "pipeline_mode must be \"workflow\", \"fused\" or \"batch\"."
+  }
+}
+
+variable "process_event_concurrency" {
+  description = "Concurrent requests per process_event instance (SIS writes and audit events of concurrent events are batched together)"
+  type        = number
+  default     = 16
+}
+
+variable "consumer_batch_size" {
+  description = "Moodle events pulled and processed per batch by consume_events"
+  type        = number
+  default     = 100
+}
+
+variable "consumer_schedule" {
+  description = "Cloud Scheduler cron for consuming Moodle events in batch mode"
+  type        = string
+  default     = "* * * * *"
+}
+
+variable "consumer_max_delivery_attempts" {
+  description = "Deliveries of a failing event before it is moved to the dead-letter topic (5-100)"
+  type        = number
+  default     = 10
+}
+
+variable "update_sis_concurrency" {
+  description = "Concurrent requests per update_sis instance (SIS writes and audit events of concurrent requests are batched together)"
+  type        = number
+  default     = 16
+}
+
+variable "outbox_rate_limit" {
+  description = "Acreditta calls per second made when draining the issuance outbox"
+  type        = number
+  default     = 5
+}
+
+variable "outbox_drain_schedule" {
+  description = "Cloud Scheduler cron for draining the issuance outbox"
+  type        = string
+  default     = "* * * * *"
+}
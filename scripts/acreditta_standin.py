@@ -0,0 +1,300 @@
+"""
+Local stand-in for the Acreditta badge API, for load and fault testing.
+
+Serves the endpoints used by AcredittaAPIHandler (issue, batch issue, verify,
+revoke) with configurable latency distributions, random server errors and
+429 throttling, so concurrency and retry behavior can be exercised without
+the real service. Issuance honors idempotency keys: a repeated key returns
+the original badge.
+
+Latency specs (milliseconds):
+    fixed:50            always 50 ms
+    uniform:20,80       uniform between 20 and 80 ms
+    normal:50,10        mean 50 ms, standard deviation 10 ms (clipped at 0)
+    lognormal:50,0.5    median 50 ms, sigma 0.5 (long tail)
+    exp:50              exponential with mean 50 ms
+
+Usage:
+    python scripts/acreditta_standin.py --port 8081 --latency lognormal:50,0.5
+    python scripts/acreditta_standin.py --error-rate 0.05 --rate-limit 100
+    python scripts/acreditta_standin.py --no-batch   # behave as if /badges/issue/batch did not exist
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+
+def parse_latency(spec: Union[float, str], rng: random.Random) -> Callable[[], float]:
+    """
+    Build a latency sampler.
+
+    Args:
+        spec: Seconds (number) or a distribution spec in milliseconds (see module docs)
+        rng: Random generator used by the sampler
+
+    Returns:
+        Zero-argument callable returning a latency in seconds
+    """
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    ms = 1000.0
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / ms
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1]) / ms
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(0.0, rng.gauss(values[0], values[1])) / ms
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: rng.lognormvariate(mu, values[1]) / ms
+    if kind == "exp" and len(values) == 1:
+        return lambda: rng.expovariate(1.0 / values[0]) / ms
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+class StandinServer(ThreadingHTTPServer):
+    """HTTP server holding the stand-in settings, faults and issued badges."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        latency: Union[float, str] = 0.05,
+        batch: bool = True,
+        error_rate: float = 0.0,
+        rate_limit: Optional[float] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            address: (host, port) to bind
+            latency: Seconds, or a latency distribution spec
+            batch: Whether to serve the batch issuance endpoint
+            error_rate: Probability of answering 500/503 instead of handling a call
+            rate_limit: Calls per second accepted before answering 429
+            seed: Seed for latencies and injected errors
+        """
+        super().__init__(address, StandinHandler)
+        self.rng = random.Random(seed)
+        self.sample_latency = parse_latency(latency, self.rng)
+        self.batch = batch
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.badges: Dict[str, Dict[str, Any]] = {}
+        self.by_idempotency_key: Dict[str, Dict[str, Any]] = {}
+        self.calls = 0
+        self.statuses: Counter = Counter()
+        self.lock = threading.Lock()
+        self._tokens = rate_limit or 0.0
+        self._tokens_updated = time.monotonic()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def issue(self, payload: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        key = payload.get("idempotency_key") or key
+        with self.lock:
+            if key and key in self.by_idempotency_key:
+                return self.by_idempotency_key[key]
+        badge_id = f"badge-{uuid.uuid4().hex[:12]}"
+        badge = {
+            "badge_id": badge_id,
+            "badge_url": f"{self.url}/badges/{badge_id}",
+            "issued_at": datetime.now(timezone.utc).isoformat(),
+            "status": "issued",
+            "recipient": payload.get("recipient", {}),
+        }
+        with self.lock:
+            if key:
+                badge = self.by_idempotency_key.setdefault(key, badge)
+            self.badges[badge["badge_id"]] = badge
+        return badge
+
+    def admit(self) -> Tuple[Optional[int], Optional[float]]:
+        """
+        Decide whether a call is throttled or fails.
+
+        Returns:
+            (status, retry_after): (None, None) to handle the call normally,
+            (429, seconds) when over the rate limit, (500/503, None) for an
+            injected error
+        """
+        with self.lock:
+            self.calls += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.rate_limit,
+                    self._tokens + (now - self._tokens_updated) * self.rate_limit
+                )
+                self._tokens_updated = now
+                if self._tokens < 1:
+                    return 429, (1 - self._tokens) / self.rate_limit
+                self._tokens -= 1
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return self.rng.choice((500, 503)), None
+            return None, None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call counters: total calls, responses by status, badges issued."""
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "statuses": dict(self.statuses),
+                "badges": len(self.badges),
+            }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the Acreditta endpoints."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: StandinServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # Keep benchmark output readable
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode()
+        with self.server.lock:
+            self.server.statuses[status] += 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _begin(self) -> bool:
+        """Apply latency and faults; return False if a fault response was sent."""
+        status, retry_after = self.server.admit()
+        if status == 429:
+            # Fractional seconds (non-standard) keep load tests short
+            self._send(429, {"error": "Too many requests"}, {"Retry-After": f"{retry_after:.3f}"})
+            return False
+        time.sleep(self.server.sample_latency())
+        if status is not None:
+            self._send(status, {"error": "Injected failure"})
+            return False
+        return True
+
+    def do_POST(self) -> None:
+        payload = self._read_json()
+        parts = self.path.strip("/").split("/")
+
+        if parts == ["badges", "issue"]:
+            if self._begin():
+                self._send(200, self.server.issue(payload, self.headers.get("Idempotency-Key")))
+        elif parts == ["badges", "issue", "batch"] and self.server.batch:
+            if self._begin():
+                results = [self.server.issue(badge) for badge in payload.get("badges", [])]
+                self._send(200, {"results": results})
+        elif len(parts) == 3 and parts[0] == "badges" and parts[2] == "revoke":
+            if self._begin():
+                with self.server.lock:
+                    badge = self.server.badges.get(parts[1])
+                    if badge:
+                        badge["status"] = "revoked"
+                self._send(200 if badge else 404, {"revoked": bool(badge)})
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_GET(self) -> None:
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "badges" and parts[2] == "verify":
+            if self._begin():
+                badge = self.server.badges.get(parts[1])
+                if badge:
+                    self._send(200, {"valid": badge["status"] == "issued", **badge})
+                else:
+                    self._send(404, {"valid": False, "error": "Badge not found"})
+        else:
+            self._send(404, {"error": "Not found"})
+
+
+def start_standin(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: Union[float, str] = 0.05,
+    batch: bool = True,
+    error_rate: float = 0.0,
+    rate_limit: Optional[float] = None,
+    seed: Optional[int] = None
+) -> StandinServer:
+    """
+    Start a stand-in server in a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 = any free port)
+        latency: Seconds each call takes, or a latency distribution spec
+        batch: Whether to serve the batch issuance endpoint
+        error_rate: Probability of an injected 500/503
+        rate_limit: Calls per second accepted before answering 429
+        seed: Seed for latencies and injected errors
+
+    Returns:
+        The running server; call ``shutdown()`` when done
+    """
+    server = StandinServer(
+        (host, port), latency=latency, batch=batch,
+        error_rate=error_rate, rate_limit=rate_limit, seed=seed
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the stand-in latency/fault options to a command-line parser."""
+    parser.add_argument("--latency", default="fixed:50", help="Latency distribution spec (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 500/503")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Calls/s before answering 429")
+    parser.add_argument("--no-batch", action="store_true", help="Do not serve /badges/issue/batch")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Acreditta API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandinServer(
+        (args.host, args.port), latency=args.latency, batch=not args.no_batch,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed
+    )
+    print(f"Acreditta stand-in listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
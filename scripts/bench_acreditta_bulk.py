@@ -0,0 +1,91 @@
+"""
+Benchmark of bulk badge issuance against a local Acreditta stand-in.
+
+Compares the sequential loop of issue_badge calls with
+AcredittaAPIHandler.issue_badges, over the batch endpoint and over
+concurrent single calls.
+
+Usage:
+    python scripts/bench_acreditta_bulk.py
+    python scripts/bench_acreditta_bulk.py --badges 2000 --latency-ms 50 --workers 8 16 32
+    python scripts/bench_acreditta_bulk.py --rate-limit 100
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions', 'call_acreditta')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from acreditta_handler import AcredittaAPIHandler  # noqa: E402
+from acreditta_standin import start_standin  # noqa: E402
+from common import BadgeIssueRequest  # noqa: E402
+
+
+def make_requests(count: int) -> List[BadgeIssueRequest]:
+    return [
+        BadgeIssueRequest(
+            student_id=f"S{i:05d}",
+            badge_template_id="excellence-badge",
+            badge_title="Excellence in Mathematics",
+            course_id="MATH101",
+            evaluation_id="final_exam",
+            score=95.0,
+            rule_id="rule-001",
+        )
+        for i in range(count)
+    ]
+
+
+def timed(label: str, count: int, run: Callable[[], int]) -> None:
+    start = time.perf_counter()
+    failed = run()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<34} {elapsed:8.2f} s  {count / elapsed:9.1f} badges/s  {failed} failed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk issuance benchmark")
+    parser.add_argument("--badges", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--rate-limit", type=float, default=None, help="Calls per second")
+    parser.add_argument("--sequential-sample", type=int, default=100,
+                        help="Badges issued sequentially (the rate is extrapolated)")
+    args = parser.parse_args()
+
+    badges = make_requests(args.badges)
+    print(f"{args.badges} badges, {args.latency_ms:.0f} ms per Acreditta call")
+
+    server = start_standin(latency=args.latency_ms / 1000, batch=False)
+    try:
+        handler = AcredittaAPIHandler(server.url, "bench-key", batch_size=0)
+        sample = badges[:args.sequential_sample]
+        timed(f"sequential ({len(sample)} badges)", len(sample),
+              lambda: sum(1 for b in sample if not handler.issue_badge(b)))
+
+        for workers in args.workers:
+            handler = AcredittaAPIHandler(server.url, "bench-key", max_connections=workers, batch_size=0)
+            timed(f"concurrent, {workers} workers", len(badges), lambda: sum(
+                1 for r in handler.issue_badges(badges, max_workers=workers, rate_limit=args.rate_limit)
+                if r.error
+            ))
+    finally:
+        server.shutdown()
+
+    server = start_standin(latency=args.latency_ms / 1000, batch=True)
+    try:
+        handler = AcredittaAPIHandler(server.url, "bench-key")
+        timed(f"batch endpoint ({handler.batch_size}/call)", len(badges), lambda: sum(
+            1 for r in handler.issue_badges(badges, rate_limit=args.rate_limit) if r.error
+        ))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,531 @@
+"""
+CPU benchmarks of the common package hot paths.
+
+Times rule evaluation on deep nested rules, rule matching against an
+in-memory Firestore holding 10k rules, Open Badges package generation,
+pydantic construction of the event models, the simulate_path node loop
+on a large learning path and cohort rule evaluation over columnar facts. Each benchmark is calibrated to run for at least
+``--min-time`` seconds per round; the fastest round is kept (least noise).
+Save a report with ``--json`` and compare later runs against it.
+
+Usage:
+    python scripts/bench_hot_paths.py
+    python scripts/bench_hot_paths.py rule_evaluator models --repeat 7
+    python scripts/bench_hot_paths.py --json bench_baseline.json
+    python scripts/bench_hot_paths.py --baseline bench_baseline.json --tolerance 0.25
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions'))
+sys.path.insert(0, FUNCTIONS_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pydantic  # noqa: E402
+
+from common import (  # noqa: E402
+    AdvancementRule,
+    AuditEvent,
+    BadgeService,
+    Competency,
+    CompetencyLevel,
+    Condition,
+    Config,
+    EvidenceMapping,
+    EvidenceType,
+    EvidenceVerifier,
+    FirestoreClient,
+    LearningPath,
+    MoodleEvent,
+    PathNode,
+    RuleEvaluator,
+    RuleOperator,
+)
+from firestore_standin import FirestoreStandin  # noqa: E402
+
+# Name -> setup returning (callable to time, operations per call)
+BENCHMARKS: Dict[str, Callable[[], Tuple[Callable[[], Any], int]]] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark setup under ``name``."""
+    def register(setup: Callable[[], Tuple[Callable[[], Any], int]]):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# --- Fixtures ---------------------------------------------------------------
+
+# Leaf conditions cycled through deep rules: cheap and nested field reads,
+# met and unmet, so both AND and OR nodes short-circuit part of the time
+_LEAVES = [
+    ("score", ">=", 60),
+    ("attribute.programa", "==", "ING"),
+    ("attribute.semestre", ">=", 12),
+    ("attribute.becado", "==", True),
+    ("activity_score_q1", ">", 70),
+    ("attribute.tags", "contains", "honores"),
+]
+
+_STUDENT_ATTRIBUTES = {"programa": "ING", "semestre": 6, "becado": True, "tags": ["deportes"]}
+
+
+def deep_rule(
+    depth: int,
+    branching: int,
+    rule_id: str = "deep",
+    _counter: Optional[List[int]] = None
+) -> AdvancementRule:
+    """
+    Build a rule nested ``depth`` levels, alternating AND and OR.
+
+    Args:
+        depth: Levels of AdvancementRule above the leaf conditions
+        branching: Children per rule
+        rule_id: ID of the root rule (children get suffixed IDs)
+    """
+    counter = _counter if _counter is not None else [0]
+    children: List[Any] = []
+    for i in range(branching):
+        if depth > 1:
+            children.append(deep_rule(depth - 1, branching, f"{rule_id}.{i}", counter))
+        else:
+            field, operator, value = _LEAVES[counter[0] % len(_LEAVES)]
+            counter[0] += 1
+            children.append(Condition(field=field, operator=operator, value=value))
+    operator = RuleOperator.AND if depth % 2 == 0 else RuleOperator.OR
+    return AdvancementRule(id=rule_id, name=rule_id, logic_operator=operator, conditions=children)
+
+
+def rule_facts() -> Dict[str, Any]:
+    return {"score": 85, "course_id": "MATH101", "activity_score_q1": 65, "attribute": _STUDENT_ATTRIBUTES}
+
+
+def seed_rules(db: FirestoreStandin, courses: int, rules_per_course: int) -> List[Tuple[str, str, float]]:
+    """
+    Write ``courses * rules_per_course`` active rules and return lookups.
+
+    Each course has 10 evaluations with bound rules at increasing thresholds,
+    plus course-wide rules.
+
+    Returns:
+        (course_id, evaluation_id, score) lookups spread over the courses
+    """
+    collection = db.collection("reglas_emision")
+    now = datetime.now(timezone.utc)
+    batch = db.batch()
+    for c in range(courses):
+        for r in range(rules_per_course):
+            course_wide = r % 5 == 0
+            batch.set(collection.document(f"rule-{c:04d}-{r:03d}"), {
+                "course_id": f"C{c:04d}",
+                "evaluation_id": None if course_wide else f"eval-{r % 10}",
+                "min_score": float((r * 7) % 100),
+                "badge_template_id": f"badge-{c}-{r}",
+                "badge_title": f"Badge {c}-{r}",
+                "active": r % 13 != 0,
+                "created_at": now,
+                "updated_at": now,
+            })
+            if len(batch) == 500:
+                batch.commit()
+                batch = db.batch()
+    batch.commit()
+    return [(f"C{i % courses:04d}", f"eval-{i % 10}", float((i * 37) % 101)) for i in range(1000)]
+
+
+def large_path(nodes: int, mappings_per_competency: int = 3) -> Tuple[LearningPath, Dict[str, Any]]:
+    """
+    Build a learning path where every third node is a competency.
+
+    Returns:
+        (path, mock scores with a score or completion per activity)
+    """
+    now = datetime.now(timezone.utc)
+    path_nodes, mappings, mock_scores = [], [], {}
+    for i in range(nodes):
+        if i % 3 == 2:
+            node_id = f"comp-{i}"
+            path_nodes.append(PathNode(
+                id=node_id,
+                type="competency",
+                reference_id=node_id,
+                label=f"Competencia {i}"
+            ))
+            for j in range(mappings_per_competency):
+                activity_id = f"a{i}_{j}"
+                activity_type = (EvidenceType.QUIZ, EvidenceType.ASSIGNMENT, EvidenceType.FORUM)[j % 3]
+                mappings.append(EvidenceMapping(
+                    id=f"map-{i}-{j}",
+                    moodle_activity_id=activity_id,
+                    moodle_activity_type=activity_type,
+                    competency_id=node_id
+                ))
+                mock_scores[f"activity_score_{activity_id}"] = (i * 13 + j * 29) % 100
+                mock_scores[f"activity_completed_{activity_id}"] = (i + j) % 4 != 0
+        else:
+            course_id = f"C{i:04d}"
+            path_nodes.append(PathNode(
+                id=f"course-{i}",
+                type="course",
+                reference_id=course_id,
+                label=f"Curso {i}",
+                requirements=deep_rule(3, 3, f"req-{i}")
+            ))
+            mock_scores[course_id] = (i * 17) % 100
+    path = LearningPath(
+        id="bench-path",
+        name="Bench path",
+        description="Synthetic path for benchmarks",
+        nodes=path_nodes,
+        edges=[{"from": a.id, "to": b.id} for a, b in zip(path_nodes, path_nodes[1:])],
+        evidence_mappings=mappings,
+        created_by="bench",
+        created_at=now,
+        updated_at=now
+    )
+    return path, mock_scores
+
+
+def load_simulate_path():
+    """Load simulate_path/main.py under its own name (every function has a main.py)."""
+    spec = importlib.util.spec_from_file_location(
+        "simulate_path_main", os.path.join(FUNCTIONS_DIR, "simulate_path", "main.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# --- Benchmarks -------------------------------------------------------------
+
+@benchmark("rule_evaluator.evaluate_deep")
+def bench_evaluate_deep():
+    """RuleEvaluator.evaluate on a 6-level rule with 729 conditions."""
+    rule, facts = deep_rule(6, 3), rule_facts()
+    return lambda: RuleEvaluator.evaluate(rule, facts), 1
+
+
+@benchmark("rule_evaluator.compiled_deep")
+def bench_compiled_deep():
+    """The same rule compiled once, then called."""
+    compiled, facts = RuleEvaluator.compile(deep_rule(6, 3)), rule_facts()
+    return lambda: compiled(facts), 1
+
+
+@benchmark("database.get_matching_rule.indexed")
+def bench_matching_rule_indexed():
+    """get_matching_rule over 10k rules (200 courses), rule index warm."""
+    db = FirestoreStandin()
+    lookups = seed_rules(db, 200, 50)
+    client = FirestoreClient(Config(project_id="bench-indexed", environment="bench", audit_async=False), db=db)
+    for course_id, evaluation_id, score in lookups:
+        client.get_matching_rule(course_id, evaluation_id, score)
+
+    def run():
+        for course_id, evaluation_id, score in lookups:
+            client.get_matching_rule(course_id, evaluation_id, score)
+    return run, len(lookups)
+
+
+@benchmark("database.get_matching_rule.query")
+def bench_matching_rule_query():
+    """get_matching_rule over 10k rules with the rule index off (two queries per lookup)."""
+    db = FirestoreStandin()
+    lookups = seed_rules(db, 200, 50)[:5]
+    config = Config(project_id="bench-query", environment="bench", rule_cache_ttl_seconds=0, audit_async=False)
+    client = FirestoreClient(config, db=db)
+
+    def run():
+        for course_id, evaluation_id, score in lookups:
+            client.get_matching_rule(course_id, evaluation_id, score)
+    return run, len(lookups)
+
+
+@benchmark("badge_service.complete_package")
+def bench_badge_package():
+    """BadgeService.generate_complete_badge_package with 20 evidences."""
+    service = BadgeService("https://cid.example.edu/issuers/cid", "CID", "https://cid.example.edu")
+    competency = Competency(
+        id="comp-python",
+        name="Programación en Python",
+        description="Resuelve problemas con Python",
+        taxonomy_id="tax-1",
+        level=CompetencyLevel.ADVANCED
+    )
+    mappings = [
+        EvidenceMapping(
+            id=f"map-{i}",
+            moodle_activity_id=f"act-{i}",
+            moodle_activity_type=list(EvidenceType)[i % len(EvidenceType)],
+            competency_id=competency.id,
+            rubric_criteria="Nivel avanzado"
+        )
+        for i in range(20)
+    ]
+    narratives = [f"Completó la actividad act-{i} con distinción." for i in range(15)]
+
+    def run():
+        service.generate_complete_badge_package(competency, "student@example.edu", mappings, narratives)
+    return run, 1
+
+
+@benchmark("models.moodle_event")
+def bench_moodle_event():
+    """MoodleEvent validated from a decoded Pub/Sub payload."""
+    payload = {
+        "student_id": "12345",
+        "course_id": "MATH101",
+        "evaluation_id": "final_exam",
+        "score": 95.5,
+        "timestamp": "2024-01-15T10:30:00Z",
+        "metadata": {"moodle_user_id": 789, "attempt": 2},
+    }
+    return lambda: MoodleEvent(**payload), 1
+
+
+@benchmark("models.audit_event")
+def bench_audit_event():
+    """AuditEvent construction, as update_sis builds it."""
+    timestamp = datetime.now(timezone.utc)
+    return lambda: AuditEvent(
+        event_id="evt-12345-final_exam",
+        student_id="12345",
+        badge_id="badge-abc123",
+        badge_template_id="excellence-badge",
+        course_id="MATH101",
+        evaluation_id="final_exam",
+        score=95.5,
+        rule_id="rule-001",
+        workflow_execution_id="pubsub-1234567890",
+        timestamp=timestamp,
+        metadata={"badge_title": "Excellence", "sis_updated": True}
+    ), 1
+
+
+@benchmark("models.audit_event_dump")
+def bench_audit_event_dump():
+    """AuditEvent.model_dump(mode="json"), as FirestoreClient.log_event serializes it."""
+    event = AuditEvent(
+        event_id="evt-12345-final_exam",
+        student_id="12345",
+        badge_id="badge-abc123",
+        badge_template_id="excellence-badge",
+        course_id="MATH101",
+        evaluation_id="final_exam",
+        score=95.5,
+        rule_id="rule-001",
+        timestamp=datetime.now(timezone.utc),
+        metadata={"badge_title": "Excellence", "sis_updated": True}
+    )
+    return lambda: event.model_dump(mode="json"), 1
+
+
+@benchmark("simulate_path.nodes")
+def bench_simulate_nodes():
+    """simulate_nodes on a 600-node path (200 competencies, 600 evidences)."""
+    simulate_path = load_simulate_path()
+    logging.getLogger().setLevel(logging.WARNING)
+    path, mock_scores = large_path(600)
+    verifier = EvidenceVerifier(None)
+
+    def run():
+        simulate_path.simulate_nodes(path, "ghost-student-001", _STUDENT_ATTRIBUTES, mock_scores, verifier)
+    return run, 1
+
+
+def cohort_columns(size: int) -> Dict[str, Any]:
+    """Columnar facts for ``size`` students: numeric, string, bool and object columns."""
+    import numpy as np
+
+    rows = np.arange(size)
+    tags = np.empty(size, dtype=object)
+    tags[::5] = [["honores"]] * len(tags[::5])
+    return {
+        "score": (rows * 7) % 101,
+        "activity_score_q1": ((rows * 13) % 100).astype(float),
+        "attribute": {
+            "programa": np.array(["ING", "MED", "DER"])[rows % 3],
+            "semestre": (rows % 10) + 1,
+            "becado": rows % 4 == 0,
+            "tags": tags,
+        },
+    }
+
+
+def row_facts(columns: Dict[str, Any], row: int) -> Dict[str, Any]:
+    """The facts dict RuleEvaluator would get for one row of ``cohort_columns``."""
+    facts: Dict[str, Any] = {}
+    for key, column in columns.items():
+        if isinstance(column, dict):
+            facts[key] = row_facts(column, row)
+            continue
+        value = column[row]
+        if value is not None:
+            facts[key] = value.item() if hasattr(value, "item") else value
+    return facts
+
+
+def check_cohort(rules: List[Any], size: int = 300) -> None:
+    """
+    Check that CohortEvaluator matches RuleEvaluator.evaluate row by row.
+
+    Raises:
+        AssertionError: Naming the first rule whose results differ.
+    """
+    from common.cohort_evaluator import CohortEvaluator
+
+    columns = cohort_columns(size)
+    evaluator = CohortEvaluator(columns)
+    for rule in rules:
+        expected = [i for i in range(size) if RuleEvaluator.evaluate(rule, row_facts(columns, i))]
+        actual = evaluator.matching_indices(rule).tolist()
+        assert actual == expected, f"CohortEvaluator differs from RuleEvaluator for {rule!r}"
+
+
+@benchmark("cohort_evaluator.mask_deep")
+def bench_cohort_mask():
+    """CohortEvaluator on the 729-condition rule over 10k students (per student)."""
+    from common.cohort_evaluator import CohortEvaluator
+
+    # Mixed types must give the scalar results (False for ==, True for !=)
+    check_cohort([
+        Condition(field="attribute.programa", operator="==", value=5),
+        Condition(field="attribute.programa", operator="!=", value=5),
+        Condition(field="activity_score_q1", operator="==", value="x"),
+        Condition(field="activity_score_q1", operator="!=", value="x"),
+        Condition(field="attribute.becado", operator="==", value=1),
+        Condition(field="attribute.semestre", operator="!=", value=[3]),
+        Condition(field="attribute.tags", operator="contains", value="honores"),
+        deep_rule(4, 3),
+    ])
+    evaluator = CohortEvaluator(cohort_columns(10_000))
+    rule = deep_rule(6, 3)
+    return lambda: evaluator.mask(rule), evaluator.size
+
+
+# --- Runner -----------------------------------------------------------------
+
+def measure(run: Callable[[], Any], ops: int, repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    Time ``run`` in rounds of at least ``min_time`` seconds.
+
+    Returns:
+        {"min_us", "median_us": time per operation, "number": calls per
+         round, "rounds": repeat}
+    """
+    run()  # Warm-up (lazy imports, caches)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+
+    per_op = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        per_op.append((time.perf_counter() - start) / (number * ops) * 1e6)
+    return {
+        "min_us": round(min(per_op), 3),
+        "median_us": round(statistics.median(per_op), 3),
+        "number": number,
+        "ops_per_call": ops,
+        "rounds": repeat,
+    }
+
+
+def select(patterns: List[str]) -> List[str]:
+    """Benchmarks whose name starts with one of ``patterns`` (all if none)."""
+    if not patterns:
+        return list(BENCHMARKS)
+    return [name for name in BENCHMARKS if any(name.startswith(p) for p in patterns)]
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Return a message for every benchmark slower than baseline * (1 + tolerance)."""
+    regressions = []
+    for name, result in results.items():
+        previous: Optional[Dict] = baseline.get(name)
+        if not previous:
+            continue
+        limit = previous["min_us"] * (1 + tolerance)
+        if result["min_us"] > limit:
+            regressions.append(
+                f"{name}: {result['min_us']:.2f} us > {limit:.2f} us "
+                f"(baseline {previous['min_us']:.2f} us)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CPU benchmarks of the common package hot paths")
+    parser.add_argument("benchmarks", nargs="*", help="Benchmark name prefixes to run (default: all)")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark; the fastest is kept")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per round")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    names = select(args.benchmarks)
+    if not names:
+        print(f"ERROR no benchmark matches {' '.join(args.benchmarks)} (see --list)", file=sys.stderr)
+        return 1
+    if args.list:
+        for name in names:
+            print(f"{name:<36} {BENCHMARKS[name].__doc__}")
+        return 0
+
+    baseline: Dict[str, Dict] = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["benchmarks"]
+
+    results = {}
+    for name in names:
+        run, ops = BENCHMARKS[name]()
+        results[name] = measure(run, ops, args.repeat, args.min_time)
+        line = f"  {name:<36} {results[name]['min_us']:12.2f} us  (median {results[name]['median_us']:.2f})"
+        if name in baseline:
+            change = results[name]["min_us"] / baseline[name]["min_us"] - 1
+            line += f"  {change:+.1%} vs baseline"
+        print(line)
+
+    if args.json_path:
+        report = {
+            "python": platform.python_version(),
+            "pydantic": pydantic.VERSION,
+            "machine": platform.machine(),
+            "benchmarks": results,
+        }
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json_path}")
+
+    if args.baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,10 @@ Write-Host "=== CCA Function Cleanup ===" -ForegroundColor Cyan
 Write-Host ""
 
 # List of Cloud Functions
-$Functions = @("validate_rule", "call_acreditta", "update_sis")
+$Functions = @("validate_rule", "call_acreditta", "update_sis", "issuance_outbox", "process_event")
+
+# Functions bundled into process_event (fused pipeline mode)
+$PipelineStages = @("validate_rule", "call_acreditta", "update_sis")
 
 # Clean each function
 foreach ($Function in $Functions) {
@@ -23,6 +26,17 @@ foreach ($Function in $Functions) {
     }
 }
 
+# Clean pipeline stages bundled into process_event
+foreach ($Stage in $PipelineStages) {
+    $StageDir = Join-Path (Join-Path $FunctionsDir "process_event") $Stage
+    
+    if (Test-Path $StageDir) {
+        Write-Host "Removing $Stage from: process_event" -ForegroundColor Yellow
+        Remove-Item -Path $StageDir -Recurse -Force
+        Write-Host "  Removed" -ForegroundColor Green
+    }
+}
+
 # Clean build directory
 if (Test-Path $BuildDir) {
     Write-Host "Cleaning build directory..." -ForegroundColor Yellow
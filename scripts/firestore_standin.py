@@ -0,0 +1,305 @@
+"""
+In-memory stand-in for the Firestore client, for replays and load tests.
+
+Implements the part of ``google.cloud.firestore.Client`` the CCA functions
+use: documents (get, create, set with merge, update and delete with
+``last_update_time`` preconditions), write batches, and collection queries
+with where/order_by/limit. Every RPC can be given a latency distribution
+(the specs of acreditta_standin), and calls are counted per kind.
+
+Not supported: transactions and snapshot listeners (keep RULE_CACHE_LISTEN
+and STUDENT_CACHE_LISTEN off).
+
+Usage:
+    from firestore_standin import FirestoreStandin
+    from common import get_or_create
+    db = FirestoreStandin(latency="lognormal:4,0.5")
+    get_or_create(("firestore", project_id), lambda: db)  # before any client is built
+"""
+
+import copy
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud import firestore
+
+from acreditta_standin import parse_latency
+
+# Query operators -> predicate(document value, query value)
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a is not None and a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a is not None and a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+_MISSING = object()
+
+
+class WriteOption:
+    """Precondition of a write: the document is unchanged since ``last_update_time``."""
+
+    def __init__(self, last_update_time: Any):
+        self.last_update_time = last_update_time
+
+
+class DocumentSnapshot:
+    """Read-only copy of a document."""
+
+    def __init__(self, reference: "DocumentReference", data: Optional[Dict[str, Any]], update_time: Any):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class DocumentReference:
+    """Reference to one document of a collection."""
+
+    def __init__(self, collection: "CollectionReference", doc_id: str):
+        self.parent = collection
+        self.id = doc_id
+        self._client = collection._client
+
+    @property
+    def path(self) -> str:
+        return f"{self.parent.id}/{self.id}"
+
+    def get(self, **kwargs) -> DocumentSnapshot:
+        self._client._rpc("get")
+        with self._client._lock:
+            return self._client._snapshot(self)
+
+    def create(self, document_data: Dict[str, Any]) -> None:
+        self._client._rpc("create")
+        with self._client._lock:
+            self._client._apply("create", self, document_data)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._client._rpc("set")
+        with self._client._lock:
+            self._client._apply("set", self, document_data, merge=merge)
+
+    def update(self, field_updates: Dict[str, Any], option: Optional[WriteOption] = None) -> None:
+        self._client._rpc("update")
+        with self._client._lock:
+            self._client._apply("update", self, field_updates, option=option)
+
+    def delete(self, option: Optional[WriteOption] = None) -> None:
+        self._client._rpc("delete")
+        with self._client._lock:
+            self._client._apply("delete", self, None, option=option)
+
+
+class Query:
+    """Filtered, ordered and limited view of a collection."""
+
+    def __init__(
+        self,
+        collection: "CollectionReference",
+        filters: Tuple = (),
+        orders: Tuple = (),
+        limit: Optional[int] = None
+    ):
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, filter: Any = None) -> "Query":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in OPERATORS:
+            raise ValueError(f"Unsupported query operator: {op_string}")
+        return Query(self._collection, self._filters + ((field_path, op_string, value),),
+                     self._orders, self._limit)
+
+    def order_by(self, field_path: str, direction: str = firestore.Query.ASCENDING) -> "Query":
+        return Query(self._collection, self._filters,
+                     self._orders + ((field_path, direction),), self._limit)
+
+    def limit(self, count: int) -> "Query":
+        return Query(self._collection, self._filters, self._orders, count)
+
+    def stream(self, **kwargs) -> Iterator[DocumentSnapshot]:
+        client = self._collection._client
+        client._rpc("query")
+        with client._lock:
+            # Filter before copying: only matching documents are snapshotted
+            snapshots = [
+                client._snapshot(self._collection.document(doc_id))
+                for doc_id, (data, _) in client._docs.get(self._collection.id, {}).items()
+                if self._matches(doc_id, data)
+            ]
+        for field, direction in reversed(self._orders):
+            snapshots.sort(
+                key=lambda s: _sort_key(s.id if field == "__name__" else s.get(field)),
+                reverse=direction == firestore.Query.DESCENDING
+            )
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        return iter(snapshots)
+
+    def get(self, **kwargs) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+    def on_snapshot(self, callback: Callable) -> Any:
+        raise NotImplementedError("The Firestore stand-in does not support snapshot listeners")
+
+    def _matches(self, doc_id: str, data: Dict[str, Any]) -> bool:
+        for field, op, value in self._filters:
+            current = doc_id if field == "__name__" else data.get(field, _MISSING)
+            if current is _MISSING or not OPERATORS[op](current, value):
+                return False
+        return True
+
+
+class CollectionReference(Query):
+    """A top-level collection."""
+
+    def __init__(self, client: "FirestoreStandin", collection_id: str):
+        self._client = client
+        self.id = collection_id
+        super().__init__(self)
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self, document_id or uuid.uuid4().hex)
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return None, ref
+
+
+class WriteBatch:
+    """Writes committed together, in one RPC."""
+
+    def __init__(self, client: "FirestoreStandin"):
+        self._client = client
+        self._writes: List[Tuple] = []
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> None:
+        self._writes.append(("create", reference, document_data, {}))
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append(("set", reference, document_data, {"merge": merge}))
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any],
+               option: Optional[WriteOption] = None) -> None:
+        self._writes.append(("update", reference, field_updates, {"option": option}))
+
+    def delete(self, reference: DocumentReference, option: Optional[WriteOption] = None) -> None:
+        self._writes.append(("delete", reference, None, {"option": option}))
+
+    def commit(self) -> List[Any]:
+        self._client._rpc("commit")
+        with self._client._lock:
+            # Check every precondition first: a batch applies all writes or none
+            for kind, reference, _, kwargs in self._writes:
+                self._client._check(kind, reference, kwargs.get("option"))
+            for kind, reference, data, kwargs in self._writes:
+                self._client._apply(kind, reference, data, **kwargs)
+            self._client.batched_writes += len(self._writes)
+        writes, self._writes = self._writes, []
+        return [None] * len(writes)
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+
+class FirestoreStandin:
+    """
+    Thread-safe in-memory Firestore.
+
+    Args:
+        latency: Seconds or a latency spec in ms (see acreditta_standin),
+            waited outside the lock on every RPC
+        seed: Seed of the latency sampler
+    """
+
+    def __init__(self, latency: Union[float, str] = 0.0, seed: Optional[int] = None):
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Dict[str, Tuple[Dict[str, Any], Any]]] = {}
+        self._clock = itertools.count(1)
+        self._latency = parse_latency(latency, random.Random(seed))
+        self.calls: Counter = Counter()
+        self.batched_writes = 0
+
+    def collection(self, collection_id: str) -> CollectionReference:
+        return CollectionReference(self, collection_id)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def write_option(self, last_update_time: Any = None, **kwargs) -> WriteOption:
+        return WriteOption(last_update_time)
+
+    def stats(self) -> Dict[str, Any]:
+        """RPCs per kind, writes committed in batches and documents per collection."""
+        with self._lock:
+            documents = {name: len(docs) for name, docs in self._docs.items()}
+        return {"calls": dict(self.calls), "batched_writes": self.batched_writes, "documents": documents}
+
+    def _rpc(self, kind: str) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+        delay = self._latency()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _snapshot(self, reference: DocumentReference) -> DocumentSnapshot:
+        data, update_time = self._docs.get(reference.parent.id, {}).get(reference.id, (None, None))
+        return DocumentSnapshot(reference, copy.deepcopy(data), update_time)
+
+    def _check(self, kind: str, reference: DocumentReference, option: Optional[WriteOption]) -> None:
+        current = self._docs.get(reference.parent.id, {}).get(reference.id)
+        if kind == "create" and current is not None:
+            raise AlreadyExists(f"Document already exists: {reference.path}")
+        if kind == "update" and current is None:
+            raise NotFound(f"No document to update: {reference.path}")
+        if option is not None and (current is None or current[1] != option.last_update_time):
+            raise FailedPrecondition(f"Document changed since it was read: {reference.path}")
+
+    def _apply(self, kind: str, reference: DocumentReference, data: Optional[Dict[str, Any]],
+               merge: bool = False, option: Optional[WriteOption] = None) -> None:
+        self._check(kind, reference, option)
+        docs = self._docs.setdefault(reference.parent.id, {})
+        if kind == "delete":
+            docs.pop(reference.id, None)
+            return
+        values = copy.deepcopy({k: _resolve(v) for k, v in data.items()})
+        if kind == "update" or merge:
+            values = {**docs.get(reference.id, ({}, None))[0], **values}
+        docs[reference.id] = (values, next(self._clock))
+
+
+def _resolve(value: Any) -> Any:
+    """Replace SERVER_TIMESTAMP with the current time, as Firestore does."""
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    return value
+
+
+def _sort_key(value: Any) -> Tuple:
+    # Firestore orders null first, then by type; enough for homogeneous fields
+    return (value is not None, value if value is not None else 0)
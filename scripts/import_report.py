@@ -0,0 +1,154 @@
+"""
+Import-time report for the Cloud Function entry points.
+
+Runs ``python -X importtime`` on each function's main module in a fresh
+interpreter and reports the import cost per top-level package, plus which
+``common`` submodules got loaded. Use it to catch cold-start regressions.
+
+Usage:
+    python scripts/import_report.py
+    python scripts/import_report.py validate_rule update_sis --top 15
+    python scripts/import_report.py --json import_baseline.json
+    python scripts/import_report.py --baseline import_baseline.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions'))
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def list_functions() -> List[str]:
+    """Return the function directories that have a main.py entry point."""
+    return sorted(
+        name for name in os.listdir(FUNCTIONS_DIR)
+        if os.path.isfile(os.path.join(FUNCTIONS_DIR, name, "main.py"))
+    )
+
+
+def measure(function: str) -> Dict:
+    """
+    Import a function's main module once and parse the importtime output.
+
+    Returns:
+        {"total_ms": float, "modules": {top-level package: ms spent in it},
+         "common_modules": [loaded common submodules]}
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.join(FUNCTIONS_DIR, function),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        last_line = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        raise RuntimeError(f"{function}: import failed: {last_line}")
+
+    # importtime prints each module after its children; the "main" entry at
+    # depth 0 closes the subtree of everything the entry point imported.
+    subtree: List[tuple] = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = (len(indent) - 1) // 2
+        subtree.append((int(self_us), int(cumulative_us), name))
+        if depth == 0:
+            if name == "main":
+                break
+            subtree = []
+
+    total_us = subtree[-1][1] if subtree else 0
+    modules: Dict[str, float] = {}
+    common_modules = []
+    for self_us, _, name in subtree:
+        # Attribute each module's own time to its top-level package
+        package = name.split(".")[0]
+        modules[package] = modules.get(package, 0.0) + self_us / 1000
+        if name.startswith("common."):
+            common_modules.append(name)
+
+    return {
+        "total_ms": round(total_us / 1000, 2),
+        "modules": {k: round(v, 2) for k, v in modules.items()},
+        "common_modules": sorted(common_modules),
+    }
+
+
+def measure_best(function: str, repeat: int) -> Dict:
+    """Measure ``repeat`` times and keep the fastest run (least noise)."""
+    runs = [measure(function) for _ in range(repeat)]
+    return min(runs, key=lambda r: r["total_ms"])
+
+
+def print_report(function: str, report: Dict, top: int) -> None:
+    print(f"=== {function}: {report['total_ms']:.1f} ms ===")
+    ranked = sorted(report["modules"].items(), key=lambda kv: kv[1], reverse=True)
+    for name, ms in ranked[:top]:
+        print(f"  {ms:9.1f} ms  {name}")
+    print(f"  common submodules loaded: {', '.join(report['common_modules']) or 'none'}")
+    print()
+
+
+def compare(reports: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Return a message for every function slower than baseline * (1 + tolerance)."""
+    regressions = []
+    for function, report in reports.items():
+        previous: Optional[Dict] = baseline.get(function)
+        if not previous:
+            continue
+        limit = previous["total_ms"] * (1 + tolerance)
+        if report["total_ms"] > limit:
+            regressions.append(
+                f"{function}: {report['total_ms']:.1f} ms > {limit:.1f} ms "
+                f"(baseline {previous['total_ms']:.1f} ms)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-module import cost of each Cloud Function")
+    parser.add_argument("functions", nargs="*", help="Functions to measure (default: all)")
+    parser.add_argument("--top", type=int, default=10, help="Modules listed per function")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per function; the fastest is kept")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    reports = {}
+    failed = False
+    for function in args.functions or list_functions():
+        try:
+            reports[function] = measure_best(function, args.repeat)
+        except RuntimeError as e:
+            print(f"ERROR {e}", file=sys.stderr)
+            failed = True
+            continue
+        print_report(function, reports[function], args.top)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Report written to {args.json_path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(reports, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        failed = failed or bool(regressions)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
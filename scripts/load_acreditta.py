@@ -0,0 +1,152 @@
+"""
+Load driver for AcredittaAPIHandler.
+
+Pushes N badge requests through the handler against the local Acreditta
+stand-in (started in-process with the given faults) or an already running
+server, and reports throughput, latency percentiles, errors and how many
+calls and badges the server saw. Latencies include the handler's retries.
+
+Usage:
+    python scripts/load_acreditta.py --requests 2000 --concurrency 32
+    python scripts/load_acreditta.py --latency lognormal:50,0.6 --error-rate 0.05 --rate-limit 200
+    python scripts/load_acreditta.py --mode bulk --requests 2000 --no-batch
+    python scripts/load_acreditta.py --url http://127.0.0.1:8081 --json load_report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions', 'call_acreditta')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from acreditta_handler import AcredittaAPIHandler  # noqa: E402
+from acreditta_standin import add_fault_arguments, start_standin  # noqa: E402
+from common import BadgeIssueRequest, CircuitBreaker, RetryPolicy  # noqa: E402
+
+
+def make_requests(count: int) -> List[BadgeIssueRequest]:
+    """Build ``count`` badge requests for distinct students."""
+    return [
+        BadgeIssueRequest(
+            student_id=f"S{i:05d}",
+            badge_template_id="excellence-badge",
+            badge_title="Excellence in Mathematics",
+            course_id="MATH101",
+            evaluation_id="final_exam",
+            score=95.0,
+            rule_id="rule-001",
+        )
+        for i in range(count)
+    ]
+
+
+def percentiles(samples: List[float], points=(50, 90, 95, 99)) -> Dict[str, float]:
+    """Return the requested percentiles (nearest rank) and the max, in ms."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {
+        f"p{p}": round(ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] * 1000, 2)
+        for p in points
+    }
+    result["max"] = round(ordered[-1] * 1000, 2)
+    return result
+
+
+def run_single(handler: AcredittaAPIHandler, badges: List[BadgeIssueRequest], concurrency: int) -> Dict[str, Any]:
+    """Issue each badge with its own issue_badge call from a thread pool."""
+    latencies: List[float] = []
+    errors: Counter = Counter()
+
+    def issue(badge: BadgeIssueRequest) -> None:
+        start = time.perf_counter()
+        try:
+            handler.issue_badge(badge)
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors[type(e).__name__] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(issue, badges))
+    return {"ok": len(latencies), "errors": dict(errors), "latency_ms": percentiles(latencies)}
+
+
+def run_bulk(handler: AcredittaAPIHandler, badges: List[BadgeIssueRequest], concurrency: int) -> Dict[str, Any]:
+    """Issue every badge with a single issue_badges call."""
+    results = handler.issue_badges(badges, max_workers=concurrency)
+    errors = Counter(r.error.split(":")[0] for r in results if r.error)
+    return {"ok": sum(1 for r in results if not r.error), "errors": dict(errors)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load driver for the Acreditta handler")
+    parser.add_argument("--requests", type=int, default=1000, help="Badge requests to send")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mode", choices=("single", "bulk"), default="single")
+    parser.add_argument("--url", help="Use a running server instead of an in-process stand-in")
+    parser.add_argument("--max-attempts", type=int, default=4, help="Handler attempts per call")
+    parser.add_argument("--base-delay", type=float, default=0.1, help="Handler backoff base (s)")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server = start_standin(
+            latency=args.latency, batch=not args.no_batch, error_rate=args.error_rate,
+            rate_limit=args.rate_limit, seed=args.seed
+        )
+        url = server.url
+
+    handler = AcredittaAPIHandler(
+        url, "load-test-key",
+        max_connections=args.concurrency,
+        batch_size=100 if args.mode == "bulk" and not args.no_batch else 0,
+        retry_policy=RetryPolicy(max_attempts=args.max_attempts, base_delay=args.base_delay),
+        circuit_breaker=CircuitBreaker("acreditta-load", failure_threshold=max(5, args.concurrency))
+    )
+    badges = make_requests(args.requests)
+
+    start = time.perf_counter()
+    run = run_single if args.mode == "single" else run_bulk
+    report = run(handler, badges, args.concurrency)
+    elapsed = time.perf_counter() - start
+
+    report.update({
+        "mode": args.mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(args.requests / elapsed, 1),
+    })
+    if server:
+        report["server"] = server.stats()
+        server.shutdown()
+
+    print(f"{report['mode']}: {args.requests} requests, concurrency {args.concurrency}")
+    print(f"  elapsed      {report['elapsed_s']:.2f} s")
+    print(f"  throughput   {report['throughput_per_s']:.1f} badges/s")
+    print(f"  ok / failed  {report['ok']} / {args.requests - report['ok']}  {report['errors'] or ''}")
+    if report.get("latency_ms"):
+        print("  latency ms   " + "  ".join(f"{k}={v}" for k, v in report["latency_ms"].items()))
+    if server:
+        stats = report["server"]
+        print(f"  server       {stats['calls']} calls, statuses {stats['statuses']}, {stats['badges']} badges issued")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json_path}")
+    return 0 if report["ok"] == args.requests else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -56,6 +56,34 @@ function Copy-CommonModule {
     Write-Host "  ✓ Complete" -ForegroundColor Green
 }
 
+# Function to bundle the stage functions into the fused pipeline function
+function Copy-PipelineStages {
+    param(
+        [string]$FunctionName,
+        [string[]]$Stages
+    )
+    
+    $FunctionDir = Join-Path $FunctionsDir $FunctionName
+    
+    Write-Host "Bundling pipeline stages into: $FunctionName" -ForegroundColor Yellow
+    
+    foreach ($Stage in $Stages) {
+        $TargetStageDir = Join-Path $FunctionDir $Stage
+        
+        # Remove existing stage copy if it exists
+        if (Test-Path $TargetStageDir) {
+            Remove-Item -Path $TargetStageDir -Recurse -Force
+        }
+        
+        # Copy the stage's Python modules (its main.py and local helpers)
+        Write-Host "  - Copying $Stage..." -ForegroundColor Gray
+        New-Item -ItemType Directory -Path $TargetStageDir -Force | Out-Null
+        Copy-Item -Path (Join-Path (Join-Path $FunctionsDir $Stage) "*.py") -Destination $TargetStageDir -Force
+    }
+    
+    Write-Host "  ✓ Complete" -ForegroundColor Green
+}
+
 # Clean build directory if requested
 if ($Clean) {
     Write-Host "Cleaning build directory..." -ForegroundColor Yellow
@@ -74,7 +102,10 @@ if (-not (Test-Path $CommonDir)) {
 }
 
 # List of Cloud Functions
-$Functions = @("validate_rule", "call_acreditta", "update_sis")
+$Functions = @("validate_rule", "call_acreditta", "update_sis", "issuance_outbox", "process_event")
+
+# Functions run in-process by process_event (fused pipeline mode)
+$PipelineStages = @("validate_rule", "call_acreditta", "update_sis")
 
 # Process each function
 foreach ($Function in $Functions) {
@@ -88,6 +119,8 @@ foreach ($Function in $Functions) {
     Copy-CommonModule -FunctionName $Function
 }
 
+Copy-PipelineStages -FunctionName "process_event" -Stages $PipelineStages
+
 Write-Host ""
 Write-Host "=== Preparation Complete ===" -ForegroundColor Green
 Write-Host "Functions are ready for deployment!" -ForegroundColor Green
@@ -0,0 +1,367 @@
+"""
+Replay harness for the badge pipeline.
+
+Streams captured Moodle events (JSONL) through the fused pipeline of
+process_event (validate_rule → call_acreditta → update_sis, the same code
+the functions run) against local stand-ins: an in-memory Firestore
+(firestore_standin), the Acreditta stand-in over HTTP and a SQLite SIS.
+Events are dispatched on their recorded timeline sped up by --speedup
+(0 = as fast as possible) with at most --concurrency events in flight, and
+the report gives events/s, per-stage latency percentiles, statuses and an
+error breakdown.
+
+Each line holds an event ({"student_id", "course_id", "evaluation_id",
+"score", "timestamp"}), a workflow argument ({"data": event}) or a Pub/Sub
+push envelope. Every course gets a course-wide rule at --min-score unless
+--rules gives the rule documents; every student in the file exists in the
+SIS.
+
+Usage:
+    python scripts/replay_events.py events.jsonl --concurrency 32 --speedup 60
+    python scripts/replay_events.py events.jsonl --latency lognormal:80,0.5 --error-rate 0.02
+    python scripts/replay_events.py events.jsonl --firestore-latency lognormal:5,0.4 --json replay_report.json
+    python scripts/replay_events.py events.jsonl --synthesize 20000   # write a synthetic day first
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions'))
+sys.path.insert(0, FUNCTIONS_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from acreditta_standin import add_fault_arguments, start_standin  # noqa: E402
+from firestore_standin import FirestoreStandin  # noqa: E402
+from load_acreditta import percentiles  # noqa: E402
+from common import Config, get_or_create  # noqa: E402
+
+PROJECT_ID = "cca-replay"
+STAGES = ("validate", "issue", "sis", "total")
+
+# Courses and evaluations of synthesized events
+SYNTHETIC_COURSES = ("MATH101", "PHYS201", "CHEM110", "HIST150", "PROG100")
+SYNTHETIC_EVALUATIONS = ("quiz_1", "quiz_2", "midterm", "project", "final_exam")
+
+
+class StandinSecrets:
+    """Secret Manager stand-in: every secret has the same value."""
+
+    def __init__(self, value: str = "replay"):
+        self.value = value
+
+    def get_secret(self, secret_id: str, version: str = "latest") -> str:
+        return self.value
+
+
+def load_pipeline() -> ModuleType:
+    """
+    Import process_event's main module. Must run after setup_environment:
+    the stage modules read their settings at import.
+    """
+    spec = importlib.util.spec_from_file_location(
+        "process_event_main", os.path.join(FUNCTIONS_DIR, "process_event", "main.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_events(
+    path: str,
+    unwrap: Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Optional[str]]],
+    limit: Optional[int] = None
+) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Stream the events of a JSONL capture.
+
+    Args:
+        path: JSONL file
+        unwrap: process_event's unwrap_event
+        limit: Stop after this many events
+
+    Yields:
+        The event of each non-empty line (unwrapped from {"data": ...} or a
+        Pub/Sub envelope), or None for a line that is not a JSON object
+    """
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            try:
+                body = json.loads(line)
+                yield unwrap(body)[0] if isinstance(body, dict) else None
+            except ValueError:
+                yield None
+
+
+def synthesize_events(path: str, count: int, students: int, seed: Optional[int] = None) -> None:
+    """
+    Write a synthetic day of events: uniform arrivals over 24 hours, normal
+    scores, and about 5% regrades (the same evaluation sent again).
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 12, 3, tzinfo=timezone.utc)
+    offsets = sorted(rng.uniform(0, 86400) for _ in range(count))
+    sent: List[Dict[str, Any]] = []
+    with open(path, "w", encoding="utf-8") as f:
+        for offset in offsets:
+            if sent and rng.random() < 0.05:
+                event = dict(rng.choice(sent), score=round(min(100.0, rng.gauss(85, 8)), 1))
+            else:
+                event = {
+                    "student_id": f"S{rng.randrange(students):06d}",
+                    "course_id": rng.choice(SYNTHETIC_COURSES),
+                    "evaluation_id": rng.choice(SYNTHETIC_EVALUATIONS),
+                    "score": round(max(0.0, min(100.0, rng.gauss(72, 15))), 1),
+                }
+                sent.append(event)
+            event["timestamp"] = (start + timedelta(seconds=offset)).isoformat()
+            f.write(json.dumps(event) + "\n")
+
+
+def _event_time(event: Optional[Dict[str, Any]]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(event["timestamp"]).replace("Z", "+00:00")).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def scan(path: str, unwrap: Callable, limit: Optional[int]) -> Tuple[int, set, set]:
+    """Count the events and collect the students and courses of a capture."""
+    count, students, courses = 0, set(), set()
+    for event in read_events(path, unwrap, limit):
+        count += 1
+        if event:
+            if event.get("student_id") is not None:
+                students.add(str(event["student_id"]))
+            if event.get("course_id") is not None:
+                courses.add(str(event["course_id"]))
+    return count, students, courses
+
+
+def setup_environment(args: argparse.Namespace, acreditta_url: str, sis_path: str) -> FirestoreStandin:
+    """Point the functions at the stand-ins (before load_pipeline)."""
+    os.environ.update({
+        "GCP_PROJECT_ID": PROJECT_ID,
+        "ACREDITTA_API_URL": acreditta_url,
+        "SIS_DB_DRIVER": "sqlite",
+        "SIS_DB_HOST": "localhost",
+        "SIS_DB_NAME": sis_path,
+        "DEDUPE_ENABLED": "false" if args.no_dedupe else "true",
+        "RULE_CACHE_LISTEN": "false",
+        "STUDENT_CACHE_LISTEN": "false",
+        # The replay is one instance serving --concurrency requests
+        "FUNCTION_CONCURRENCY": str(args.concurrency),
+    })
+    db = FirestoreStandin(latency=args.firestore_latency, seed=args.seed)
+    get_or_create(("firestore", PROJECT_ID), lambda: db)
+    get_or_create(("secret_manager", PROJECT_ID), StandinSecrets)
+    return db
+
+
+def seed_rules(db: FirestoreStandin, courses: set, rules_path: Optional[str], min_score: float) -> int:
+    """Write the emission rules: those of --rules, or one per course."""
+    collection = db.collection(Config.from_env().firestore_collection_rules)
+    if rules_path:
+        with open(rules_path, encoding="utf-8") as f:
+            rules = json.load(f)
+    else:
+        rules = [
+            {
+                "rule_id": f"replay-{course}",
+                "course_id": course,
+                "evaluation_id": None,
+                "min_score": min_score,
+                "badge_template_id": f"{course.lower()}-excellence",
+                "badge_title": f"{course} Excellence",
+            }
+            for course in sorted(courses)
+        ]
+    for rule in rules:
+        rule = dict(rule)
+        rule_id = rule.pop("rule_id")
+        rule.setdefault("active", True)
+        collection.document(rule_id).set(rule)
+    return len(rules)
+
+
+def seed_students(update_sis: Any, students: set) -> None:
+    """Create the SIS tables and one row per student of the capture."""
+    connector = update_sis.get_sis_connector()
+    connector.create_schema()
+    with connector.get_connection() as conn:
+        conn.cursor().executemany(
+            "INSERT OR IGNORE INTO students (student_id) VALUES (?)",
+            [(student_id,) for student_id in sorted(students)]
+        )
+
+
+class Recorder:
+    """Thread-safe collector of pipeline results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.lag: List[float] = []
+
+    def record(self, result: Dict[str, Any], timings: Dict[str, float]) -> None:
+        with self._lock:
+            self.statuses[result["status"]] += 1
+            if result.get("error"):
+                message = str(result["error"]).splitlines()[0][:120]
+                self.errors[f"{result['status']}: {message}"] += 1
+            for stage, seconds in timings.items():
+                self.latencies[stage].append(seconds)
+
+
+def replay(path: str, limit: Optional[int], pipeline: ModuleType, concurrency: int,
+           speedup: float, recorder: Recorder) -> None:
+    """
+    Dispatch the events of a capture to the pipeline's run_pipeline.
+
+    With ``speedup`` > 0, an event recorded t seconds after the first one is
+    started t / speedup seconds after the replay began (or as soon as a
+    worker is free, the delay being recorded as lag).
+    """
+    slots = threading.BoundedSemaphore(concurrency)
+    first_time: Optional[float] = None
+    started = time.perf_counter()
+
+    def process(index: int, event: Optional[Dict[str, Any]]) -> None:
+        try:
+            timings: Dict[str, float] = {}
+            begin = time.perf_counter()
+            if event is None:
+                result = {"status": "VALIDATION_FAILED", "error": "Line is not a JSON object"}
+            else:
+                result = pipeline.run_pipeline(event, f"replay-{index}", timings)
+            timings["total"] = time.perf_counter() - begin
+            recorder.record(result, timings)
+        except Exception as e:
+            recorder.record({"status": "HARNESS_ERROR", "error": f"{type(e).__name__}: {e}"}, {})
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index, event in enumerate(read_events(path, pipeline.unwrap_event, limit)):
+            due = None
+            event_time = _event_time(event)
+            if speedup > 0 and event_time is not None:
+                if first_time is None:
+                    first_time = event_time
+                due = started + max(0.0, event_time - first_time) / speedup
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            slots.acquire()
+            if due is not None:
+                recorder.lag.append(max(0.0, time.perf_counter() - due))
+            pool.submit(process, index, event)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay captured Moodle events through the badge pipeline")
+    parser.add_argument("events", help="JSONL file of Moodle events")
+    parser.add_argument("--concurrency", type=int, default=16, help="Events in flight")
+    parser.add_argument("--speedup", type=float, default=0.0,
+                        help="Replay the recorded timeline this many times faster (0 = as fast as possible)")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N events")
+    parser.add_argument("--rules", help="JSON list of emission rule documents (with rule_id)")
+    parser.add_argument("--min-score", type=float, default=80.0, help="Threshold of the default per-course rules")
+    parser.add_argument("--firestore-latency", default="fixed:0", help="Firestore RPC latency spec (ms)")
+    parser.add_argument("--sis-db", help="SQLite file for the SIS (a temporary file by default)")
+    parser.add_argument("--no-dedupe", action="store_true", help="Disable issuance deduplication")
+    parser.add_argument("--synthesize", type=int, metavar="N",
+                        help="First write N synthetic events to the events file")
+    parser.add_argument("--students", type=int, default=5000, help="Distinct students of synthesized events")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    if args.synthesize:
+        synthesize_events(args.events, args.synthesize, args.students, args.seed)
+        print(f"Wrote {args.synthesize} synthetic events to {args.events}")
+
+    server = start_standin(
+        latency=args.latency, batch=not args.no_batch, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, seed=args.seed
+    )
+    sis_path = args.sis_db or os.path.join(tempfile.mkdtemp(prefix="cca-replay-"), "sis.db")
+    db = setup_environment(args, server.url, sis_path)
+    process_event = load_pipeline()
+
+    count, students, courses = scan(args.events, process_event.unwrap_event, args.limit)
+    rules = seed_rules(db, courses, args.rules, args.min_score)
+    seed_students(process_event.update_sis, students)
+    # Count only the replay's own Firestore calls
+    db.calls.clear()
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    replay(args.events, args.limit, process_event, args.concurrency, args.speedup, recorder)
+    elapsed = time.perf_counter() - start
+    audit_flushed = process_event.update_sis.get_firestore_client().flush_events(30)
+
+    report = {
+        "events": count,
+        "students": len(students),
+        "courses": len(courses),
+        "rules": rules,
+        "concurrency": args.concurrency,
+        "speedup": args.speedup,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(count / elapsed, 1) if elapsed else 0.0,
+        "statuses": dict(recorder.statuses.most_common()),
+        "errors": dict(recorder.errors.most_common(20)),
+        "latency_ms": {stage: percentiles(recorder.latencies[stage]) for stage in STAGES if recorder.latencies[stage]},
+        "schedule_lag_ms": percentiles(recorder.lag),
+        "audit_flushed": audit_flushed,
+        "acreditta": server.stats(),
+        "firestore": db.stats(),
+    }
+    server.shutdown()
+
+    print(f"Replayed {count} events ({len(students)} students, {len(courses)} courses), "
+          f"concurrency {args.concurrency}, speedup {args.speedup or 'max'}")
+    print(f"  elapsed      {report['elapsed_s']:.2f} s")
+    print(f"  throughput   {report['events_per_s']:.1f} events/s")
+    print("  statuses     " + "  ".join(f"{k}={v}" for k, v in report["statuses"].items()))
+    for stage, values in report["latency_ms"].items():
+        print(f"  {stage:<12} " + "  ".join(f"{k}={v}" for k, v in values.items()))
+    if report["schedule_lag_ms"]:
+        print("  lag ms       " + "  ".join(f"{k}={v}" for k, v in report["schedule_lag_ms"].items()))
+    for error, n in report["errors"].items():
+        print(f"  error        {n:>6}  {error}")
+    stats = report["acreditta"]
+    print(f"  acreditta    {stats['calls']} calls, statuses {stats['statuses']}, {stats['badges']} badges issued")
+    print(f"  firestore    {report['firestore']['calls']}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json_path}")
+    return 0 if "HARNESS_ERROR" not in recorder.statuses else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())